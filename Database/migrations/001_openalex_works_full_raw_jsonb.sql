@@ -0,0 +1,25 @@
+-- 001: store openalex_works.full_raw as native jsonb instead of text.
+--
+-- Reports no longer re-parse the document on every read ((full_raw)::jsonb
+-- becomes a no-op cast, so existing queries keep working), and jsonb's
+-- binary form is TOAST-compressed, which shrinks the table on disk and in
+-- shared_buffers.
+--
+-- Rewrites the table under an ACCESS EXCLUSIVE lock: stop ingestion and
+-- chunking first. Capture the before/after numbers with
+--   python utils/CompactMetadata.py --db
+-- before and after running:
+--   psql -h 192.168.0.11 -U mike -d raglab -f 001_openalex_works_full_raw_jsonb.sql
+
+\timing on
+
+BEGIN;
+
+-- jsonb rejects the \u0000 escape that some publisher metadata contains
+ALTER TABLE openalex_works
+    ALTER COLUMN full_raw TYPE jsonb
+    USING replace(full_raw, '\u0000', '')::jsonb;
+
+COMMIT;
+
+VACUUM (ANALYZE) openalex_works;
@@ -0,0 +1,16 @@
+-- 002: PDF integrity stats recorded by Ingestion stage 02 (adapters/validate_pdf.py).
+--
+-- Written by 03_upload_pdfs_and_json.py from the validation manifest; NULL
+-- for works uploaded without validation (e.g. 01 --direct). The chunker
+-- reads them to skip re-checking files that already passed.
+--
+-- Adding nullable columns without defaults is metadata-only (no rewrite).
+
+BEGIN;
+
+ALTER TABLE openalex_works
+    ADD COLUMN IF NOT EXISTS pdf_pages integer,
+    ADD COLUMN IF NOT EXISTS pdf_text_ratio real,
+    ADD COLUMN IF NOT EXISTS pdf_text_chars_per_page integer;
+
+COMMIT;
@@ -0,0 +1,21 @@
+-- 003: lease columns for the chunking work queue (Ingestion/core/chunk_queue.py).
+--
+-- Chunking workers (09_chunk_pdfs_and_insert_chunks.py, one process per core,
+-- on one or more VMs) claim works with FOR UPDATE SKIP LOCKED and set
+-- chunking_status = 'processing' plus a lease. A lease that expires (worker
+-- crashed or VM lost) is claimed again by the next worker.
+--
+-- Adding nullable columns is metadata-only; the partial index is built
+-- CONCURRENTLY, so this can run while ingestion is live (not in a transaction).
+
+ALTER TABLE openalex_works
+    ADD COLUMN IF NOT EXISTS chunk_lease_owner text,
+    ADD COLUMN IF NOT EXISTS chunk_lease_expires timestamptz,
+    ADD COLUMN IF NOT EXISTS chunk_attempts integer NOT NULL DEFAULT 0;
+
+-- Only queue-eligible rows are indexed, so the claim stays an index scan
+-- however many works are already chunked
+CREATE INDEX CONCURRENTLY IF NOT EXISTS openalex_works_chunk_queue_idx
+    ON openalex_works (id)
+    WHERE pdf_key IS NOT NULL
+      AND (chunking_status IS NULL OR chunking_status IN ('pending', 'processing'));
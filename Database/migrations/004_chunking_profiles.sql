@@ -0,0 +1,99 @@
+-- 004: chunking profiles that coexist side by side (Ingestion/core/chunking_profiles.py).
+--
+-- A profile pins everything that decides what a chunk is: splitter, token
+-- budget/overlap (or char sizes for the legacy splitter) and extractor
+-- version. Each profile has its own chunks (chunks.profile_id), its own queue
+-- state (work_chunk_status) and its own Qdrant collection, so a new profile is
+-- built in the background while retrieval keeps reading the active one.
+-- Switching is a pointer flip (chunking_profiles.active + the Qdrant alias),
+-- see utils/ChunkingProfiles.py.
+--
+-- Existing chunks (900/200-character langchain splits) become the 'legacy'
+-- profile, which stays active until another profile is built and activated.
+-- 'legacy' can't be built any more: create a token profile
+-- (utils/ChunkingProfiles.py create) before the next 09 run, which then builds
+-- it by default.
+--
+-- After applying, create the Qdrant alias retrieval reads (openalex-active) on
+-- the legacy collection:  python utils/ChunkingProfiles.py init
+-- Existing openalex_works.chunking_status / lease columns are copied into
+-- work_chunk_status for it; those columns are no longer written.
+--
+-- Adding profile_id with a constant default is metadata-only (no rewrite), the
+-- foreign key is validated without blocking writers and the chunks index is
+-- built CONCURRENTLY, so this can run while ingestion is live (not in a
+-- transaction).
+
+CREATE TABLE IF NOT EXISTS chunking_profiles (
+    id                text PRIMARY KEY,
+    splitter          text NOT NULL CHECK (splitter IN ('chars', 'tokens')),
+    tokenizer         text,
+    max_tokens        integer,           -- model sequence length, special tokens included
+    overlap_tokens    integer,
+    chunk_chars       integer,           -- legacy 'chars' splitter only
+    overlap_chars     integer,
+    extractor         text NOT NULL,     -- core/text_cache.py EXTRACTOR
+    qdrant_collection text NOT NULL UNIQUE,
+    active            boolean NOT NULL DEFAULT false,
+    created_at        timestamptz NOT NULL DEFAULT now()
+);
+
+-- At most one profile serves retrieval
+CREATE UNIQUE INDEX IF NOT EXISTS chunking_profiles_one_active_idx
+    ON chunking_profiles (active) WHERE active;
+
+INSERT INTO chunking_profiles (id, splitter, chunk_chars, overlap_chars, extractor, qdrant_collection, active)
+VALUES ('legacy', 'chars', 900, 200, 'pymupdf-text-v1', 'openalex', true)
+ON CONFLICT (id) DO NOTHING;
+
+ALTER TABLE chunks
+    ADD COLUMN IF NOT EXISTS profile_id text NOT NULL DEFAULT 'legacy';
+-- Rows that exist keep 'legacy'; new writers must say which profile they build
+ALTER TABLE chunks ALTER COLUMN profile_id DROP DEFAULT;
+
+ALTER TABLE chunks
+    ADD CONSTRAINT chunks_profile_id_fkey FOREIGN KEY (profile_id)
+    REFERENCES chunking_profiles (id) NOT VALID;
+ALTER TABLE chunks VALIDATE CONSTRAINT chunks_profile_id_fkey;
+
+-- Per-profile queue state (replaces openalex_works.chunking_status / chunk_lease_*).
+-- Rows go with their work: a work deleted and later harvested again is queued afresh.
+CREATE TABLE IF NOT EXISTS work_chunk_status (
+    work_id        text NOT NULL REFERENCES openalex_works (id) ON DELETE CASCADE,
+    profile_id     text NOT NULL REFERENCES chunking_profiles (id) ON DELETE CASCADE,
+    status         text NOT NULL,    -- pending | processing | success | failed | shared | no_text
+    lease_owner    text,
+    lease_expires  timestamptz,
+    attempts       integer NOT NULL DEFAULT 0,
+    updated_at     timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (profile_id, work_id)
+);
+
+-- Claimable rows only (re-queued or leased), so reclaiming stays an index scan
+CREATE INDEX IF NOT EXISTS work_chunk_status_open_idx
+    ON work_chunk_status (profile_id, work_id)
+    WHERE status IN ('pending', 'processing');
+
+INSERT INTO work_chunk_status (work_id, profile_id, status, lease_owner, lease_expires, attempts)
+SELECT id, 'legacy', chunking_status, chunk_lease_owner, chunk_lease_expires, chunk_attempts
+FROM openalex_works
+WHERE pdf_key IS NOT NULL AND chunking_status IS NOT NULL AND chunking_status <> 'pending'
+ON CONFLICT DO NOTHING;
+
+-- Databases that created work_chunk_status before it had the foreign key:
+-- drop rows of works deleted since, then add it
+DELETE FROM work_chunk_status s
+WHERE NOT EXISTS (SELECT 1 FROM openalex_works w WHERE w.id = s.work_id);
+ALTER TABLE work_chunk_status DROP CONSTRAINT IF EXISTS work_chunk_status_work_id_fkey;
+ALTER TABLE work_chunk_status
+    ADD CONSTRAINT work_chunk_status_work_id_fkey FOREIGN KEY (work_id)
+    REFERENCES openalex_works (id) ON DELETE CASCADE NOT VALID;
+ALTER TABLE work_chunk_status VALIDATE CONSTRAINT work_chunk_status_work_id_fkey;
+
+-- Deleting a work finds its queue rows (one per profile) without a scan
+CREATE INDEX IF NOT EXISTS work_chunk_status_work_idx
+    ON work_chunk_status (work_id);
+
+-- Embedding and per-profile cleanup read chunks by profile
+CREATE INDEX CONCURRENTLY IF NOT EXISTS chunks_profile_work_idx
+    ON chunks (profile_id, work_id);
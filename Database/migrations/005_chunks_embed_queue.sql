@@ -0,0 +1,20 @@
+-- 005: lease columns + partial index for the embedding work queue (Ingestion/core/embed_queue.py).
+--
+-- Embed clients (10_CreateEmbeddings.py, any number, on any VM) claim
+-- unembedded chunks of one profile in id order with FOR UPDATE SKIP LOCKED
+-- and a lease. A lease that expires (client crashed) is claimed again.
+--
+-- The index only holds unembedded chunks, so a claim reads the backlog and
+-- nothing else: its cost stays flat as the embedded share of chunks grows,
+-- and the index shrinks as the backlog drains.
+--
+-- Adding nullable columns is metadata-only; the index is built CONCURRENTLY,
+-- so this can run while ingestion is live (not in a transaction).
+
+ALTER TABLE chunks
+    ADD COLUMN IF NOT EXISTS embed_lease_owner text,
+    ADD COLUMN IF NOT EXISTS embed_lease_expires timestamptz;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS chunks_unembedded_idx
+    ON chunks (profile_id, id)
+    WHERE NOT embedded;
@@ -1,25 +1,242 @@
 # embed_server.py
-from fastapi import FastAPI
+# Several replicas can run side by side (one per GPU/core group, or per VM):
+#   PORT=8001 python embed_server.py
+# and are listed for Ingestion in EMBED_ENDPOINTS (Ingestion/core/embed_pool.py).
+#
+# /embed answers JSON {"embeddings": [[...]]} unless the client sends
+# Accept: application/x-embeddings-f32, in which case the body is binary:
+#   <uint32 n><uint32 dim> (little-endian) followed by n*dim little-endian float32.
+# Both carry the same float32 values the model produced.
+#
+# Requests don't call the model themselves. They queue a job with the
+# BatchEngine and await it, so the event loop stays free; one inference
+# thread drains the queue, packing texts from nearby requests into one
+# model.encode() call of up to MAX_BATCH_TEXTS texts / MAX_BATCH_TOKENS
+# (estimated) tokens, holding a batch open for at most MAX_WAIT_MS to
+# collect them. Large requests are encoded a slice at a time, and the
+# interactive lane (small requests, e.g. Retrieval queries, or
+# X-Embed-Priority: interactive) is always served before the bulk lane
+# (ingestion batches) and never topped up with bulk texts, so a query waits
+# for at most the slice already running, not a whole 256-text batch.
+# /health reports what is queued per lane.
+import asyncio
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from fastapi import FastAPI, Request, Response
 from pydantic import BaseModel
 from sentence_transformers import SentenceTransformer
 import uvicorn
 
+MODEL_NAME = "nomic-ai/nomic-embed-text-v1"
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+BINARY_TYPE = "application/x-embeddings-f32"
+
+# === Batching ===
+MAX_BATCH_TEXTS = int(os.getenv("MAX_BATCH_TEXTS", "64"))        # texts per model.encode() call
+MAX_BATCH_TOKENS = int(os.getenv("MAX_BATCH_TOKENS", "16384"))   # estimated tokens per call
+MAX_WAIT_MS = float(os.getenv("MAX_WAIT_MS", "5"))               # how long a batch waits for company
+INTERACTIVE_MAX_TEXTS = 8      # requests this small go in the interactive lane by default
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
 app = FastAPI()
 
-print("🧠 Loading model 'nomic-ai/nomic-embed-text-v1'...")
-model = SentenceTransformer("nomic-ai/nomic-embed-text-v1", trust_remote_code=True)
+print(f"🧠 Loading model '{MODEL_NAME}'...")
+model = SentenceTransformer(MODEL_NAME, trust_remote_code=True)
+DIM = model.get_sentence_embedding_dimension()
+MAX_SEQ = model.max_seq_length or 512
 print("✅ Model loaded.")
 
+def estimate_tokens(text):
+    # ~4 characters per token for English prose; the model truncates at MAX_SEQ anyway
+    return min(len(text) // 4 + 2, MAX_SEQ)
+
+def _resolve(future, result=None, error=None):
+    if future.done():                  # client went away
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+class Job:
+    """One /embed request: its texts, how far the engine has got, and where the vectors go."""
+
+    def __init__(self, texts, lane, loop):
+        self.texts = texts
+        self.lane = lane
+        self.tokens = [estimate_tokens(t) for t in texts]
+        self.next = 0                  # first text not yet handed to the model
+        self.done = 0
+        self.out = np.empty((len(texts), DIM), dtype=np.float32)
+        self.loop = loop
+        self.future = loop.create_future()
+        self.failed = False
+
+    def take(self, max_texts, max_tokens, at_least_one):
+        """Slice [start, end) of remaining texts within the budget, and its token estimate."""
+        start = end = self.next
+        tokens = 0
+        while end < len(self.texts) and end - start < max_texts:
+            t = self.tokens[end]
+            if tokens + t > max_tokens and not (at_least_one and end == start):
+                break
+            tokens += t
+            end += 1
+        self.next = end
+        return start, end, tokens
+
+    def finished(self):
+        self.loop.call_soon_threadsafe(_resolve, self.future, self.out)
+
+    def fail(self, error):
+        self.failed = True
+        self.loop.call_soon_threadsafe(_resolve, self.future, None, error)
+
+class BatchEngine:
+    def __init__(self):
+        self.lanes = {INTERACTIVE: deque(), BULK: deque()}
+        self.cond = threading.Condition()
+        self.batches = 0
+        self.texts = 0
+        self.thread = threading.Thread(target=self._run, name="inference", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, texts, lane):
+        """Queue texts; returns an asyncio future for their (n, DIM) float32 vectors."""
+        job = Job(texts, lane, asyncio.get_running_loop())
+        with self.cond:
+            self.lanes[lane].append(job)
+            self.cond.notify()
+        return job.future
+
+    def depth(self):
+        with self.cond:
+            return {lane: sum(len(j.texts) - j.next for j in q) for lane, q in self.lanes.items()}
+
+    def _collect(self):
+        """Block for work, then pack a batch: interactive lane first, bulk after, within MAX_WAIT_MS."""
+        with self.cond:
+            while not any(self.lanes.values()):
+                self.cond.wait()
+            deadline = time.monotonic() + MAX_WAIT_MS / 1000
+            parts, n, tokens = [], 0, 0
+            while True:
+                for lane in (INTERACTIVE, BULK):
+                    if lane == BULK and any(job.lane == INTERACTIVE for job, _, _ in parts):
+                        break                  # keep interactive batches small: don't top them up with bulk
+                    q = self.lanes[lane]
+                    while q and n < MAX_BATCH_TEXTS:
+                        job = q[0]
+                        if job.failed:
+                            q.popleft()
+                            continue
+                        start, end, t = job.take(MAX_BATCH_TEXTS - n, MAX_BATCH_TOKENS - tokens, at_least_one=not n)
+                        if end > start:
+                            parts.append((job, start, end))
+                            n += end - start
+                            tokens += t
+                        if job.next < len(job.texts):
+                            break              # budget spent; the rest of this job goes in a later batch
+                        q.popleft()
+                remaining = deadline - time.monotonic()
+                if n >= MAX_BATCH_TEXTS or tokens >= MAX_BATCH_TOKENS or remaining <= 0:
+                    return parts
+                if parts and not any(self.lanes.values()):
+                    # Hold the batch open briefly for requests arriving right behind this one
+                    self.cond.wait(remaining)
+                    if not any(self.lanes.values()):
+                        return parts
+                elif not parts:
+                    self.cond.wait(remaining)
+                else:
+                    return parts               # queued work left but out of budget
+
+    def _run(self):
+        while True:
+            parts = self._collect()
+            if not parts:
+                continue
+            texts = [t for job, start, end in parts for t in job.texts[start:end]]
+            try:
+                vectors = model.encode(texts, convert_to_numpy=True)
+            except Exception as e:
+                if len({job for job, _, _ in parts}) == 1:
+                    parts[0][0].fail(e)
+                else:
+                    self._isolate(parts, e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            i = 0
+            for job, start, end in parts:
+                self._store(job, start, end, vectors[i:i + end - start])
+                i += end - start
+
+    def _isolate(self, parts, error):
+        """A co-batched encode failed: retry each job's slice alone so only the job that raises fails."""
+        print(f"⚠️ Batch of {len(parts)} requests failed ({error}); retrying them one by one")
+        for job, start, end in parts:
+            if job.failed:
+                continue
+            try:
+                vectors = model.encode(job.texts[start:end], convert_to_numpy=True)
+            except Exception as e:
+                job.fail(e)
+                continue
+            self.batches += 1
+            self.texts += end - start
+            self._store(job, start, end, vectors)
+
+    @staticmethod
+    def _store(job, start, end, vectors):
+        job.out[start:end] = vectors
+        job.done += end - start
+        if job.done == len(job.texts) and not job.failed:
+            job.finished()
+
+engine = BatchEngine().start()
+
+def lane_for(request, texts):
+    priority = request.headers.get("x-embed-priority", "").lower()
+    if priority in (INTERACTIVE, BULK):
+        return priority
+    return INTERACTIVE if len(texts) <= INTERACTIVE_MAX_TEXTS else BULK
+
 class EmbedRequest(BaseModel):
     texts: list[str]
 
 class EmbedResponse(BaseModel):
     embeddings: list[list[float]]
 
+@app.get("/health")
+def health():
+    # Polled by embed clients before putting an ejected replica back in rotation
+    return {"status": "ok", "model": MODEL_NAME, "dim": DIM, "queued": engine.depth(),
+            "batches": engine.batches, "texts": engine.texts}
+
+def encode_f32(vectors):
+    arr = np.ascontiguousarray(vectors, dtype="<f4").reshape(-1, DIM)
+    return struct.pack("<II", *arr.shape) + arr.tobytes()
+
 @app.post("/embed", response_model=EmbedResponse)
-async def embed(req: EmbedRequest):
-    embeddings = model.encode(req.texts, convert_to_numpy=True).tolist()
-    return {"embeddings": embeddings}
+async def embed(req: EmbedRequest, request: Request):
+    if req.texts:
+        vectors = await engine.submit(req.texts, lane_for(request, req.texts))
+    else:
+        vectors = np.zeros((0, DIM), dtype=np.float32)
+    if BINARY_TYPE in request.headers.get("accept", ""):
+        return Response(content=encode_f32(vectors), media_type=BINARY_TYPE)
+    return {"embeddings": vectors.tolist()}
 
 if __name__ == "__main__":
-    uvicorn.run("embed_server:app", host="0.0.0.0", port=8000, reload=False)
\ No newline at end of file
+    uvicorn.run("embed_server:app", host=HOST, port=PORT, reload=False)
\ No newline at end of file
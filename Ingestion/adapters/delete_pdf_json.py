@@ -1,15 +1,19 @@
 import os
+import shutil
+from datetime import datetime
+
+from adapters.metadata_io import metadata_path, remove_metadata
 
 # === Config: Staging Paths ===
 PDF_DIR = "/home/mike/staging/pdfs"
 JSON_DIR = "/home/mike/staging/metadata"
+QUARANTINE_DIR = "/home/mike/staging/quarantine"
 
 def delete_pair(short_id):
     """
     Deletes both the PDF and JSON file for a given short OpenAlex ID.
     """
     pdf_path = os.path.join(PDF_DIR, f"{short_id}.pdf")
-    json_path = os.path.join(JSON_DIR, f"{short_id}.json")
 
     deleted = {"pdf": False, "json": False}
 
@@ -17,8 +21,31 @@ def delete_pair(short_id):
         os.remove(pdf_path)
         deleted["pdf"] = True
 
-    if os.path.exists(json_path):
-        os.remove(json_path)
+    if remove_metadata(JSON_DIR, short_id):
         deleted["json"] = True
 
-    return deleted
\ No newline at end of file
+    return deleted
+
+def quarantine_pair(short_id, reason):
+    """
+    Moves the PDF and its metadata into QUARANTINE_DIR (with a .reason.txt)
+    instead of deleting them, so rejected downloads can be inspected.
+    """
+    os.makedirs(QUARANTINE_DIR, exist_ok=True)
+    moved = {"pdf": False, "json": False}
+
+    pdf_path = os.path.join(PDF_DIR, f"{short_id}.pdf")
+    if os.path.exists(pdf_path):
+        shutil.move(pdf_path, os.path.join(QUARANTINE_DIR, os.path.basename(pdf_path)))
+        moved["pdf"] = True
+
+    json_path = metadata_path(JSON_DIR, short_id)
+    if json_path:
+        shutil.move(json_path, os.path.join(QUARANTINE_DIR, os.path.basename(json_path)))
+        remove_metadata(JSON_DIR, short_id)
+        moved["json"] = True
+
+    with open(os.path.join(QUARANTINE_DIR, f"{short_id}.reason.txt"), "w", encoding="utf-8") as f:
+        f.write(f"{datetime.now().isoformat()} | {reason}\n")
+
+    return moved
@@ -1,15 +1,13 @@
 import os
 
+from adapters.metadata_io import list_metadata, remove_metadata
+
 # === Config ===
 JSON_DIR = "/home/mike/staging/metadata"
 PDF_DIR = "/home/mike/staging/pdfs"
 
 def check_and_delete_orphans():
-    json_ids = {
-        f.replace(".json", "")
-        for f in os.listdir(JSON_DIR)
-        if f.endswith(".json")
-    }
+    json_ids = set(list_metadata(JSON_DIR))
 
     pdf_ids = {
         f.replace(".pdf", "")
@@ -21,9 +19,7 @@ def check_and_delete_orphans():
 
     # JSONs with no PDF
     for id_ in json_ids - pdf_ids:
-        json_path = os.path.join(JSON_DIR, f"{id_}.json")
-        if os.path.exists(json_path):
-            os.remove(json_path)
+        if remove_metadata(JSON_DIR, id_):
             deleted.append(f"{id_}.json")
 
     # PDFs with no JSON
@@ -0,0 +1,103 @@
+"""
+Read/write OpenAlex work metadata in the staging directory.
+
+Works are written as minified JSON, zstd-compressed (<short_id>.json.zst).
+Legacy pretty-printed <short_id>.json files are still read, so a staging
+dir can hold both while utils/CompactMetadata.py converts it.
+"""
+
+import os
+
+import orjson
+import zstandard
+
+ZSTD_SUFFIX = ".json.zst"
+JSON_SUFFIX = ".json"
+METADATA_SUFFIXES = (ZSTD_SUFFIX, JSON_SUFFIX)
+ZSTD_LEVEL = 3
+
+_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+_decompressor = zstandard.ZstdDecompressor()
+
+
+def is_metadata_file(filename):
+    return filename.endswith(METADATA_SUFFIXES)
+
+def short_id_of(filename):
+    """W123.json / W123.json.zst -> W123"""
+    name = os.path.basename(filename)
+    for suffix in METADATA_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return os.path.splitext(name)[0]
+
+def metadata_path(meta_dir, short_id):
+    """Existing metadata file for short_id (compressed preferred), or None."""
+    for suffix in METADATA_SUFFIXES:
+        path = os.path.join(meta_dir, f"{short_id}{suffix}")
+        if os.path.exists(path):
+            return path
+    return None
+
+def list_metadata(meta_dir):
+    """{short_id: path} for every metadata file; .json.zst wins over a leftover .json."""
+    found = {}
+    for name in os.listdir(meta_dir):
+        if not is_metadata_file(name):
+            continue
+        short_id = short_id_of(name)
+        if short_id not in found or name.endswith(ZSTD_SUFFIX):
+            found[short_id] = os.path.join(meta_dir, name)
+    return found
+
+def encode(work, compress=True) -> bytes:
+    data = orjson.dumps(work)
+    return _compressor.compress(data) if compress else data
+
+def decode(blob: bytes, compressed=True):
+    return orjson.loads(_decompressor.decompress(blob) if compressed else blob)
+
+def read_metadata(path):
+    with open(path, "rb") as f:
+        return decode(f.read(), compressed=path.endswith(ZSTD_SUFFIX))
+
+def write_metadata(meta_dir, short_id, work, compress=True):
+    """Write atomically and drop any legacy file for the same work. Returns the path."""
+    path = os.path.join(meta_dir, f"{short_id}{ZSTD_SUFFIX if compress else JSON_SUFFIX}")
+    tmp = path + ".part"
+    with open(tmp, "wb") as f:
+        f.write(encode(work, compress))
+    os.replace(tmp, path)
+    for suffix in METADATA_SUFFIXES:
+        other = os.path.join(meta_dir, f"{short_id}{suffix}")
+        if other != path and os.path.exists(other):
+            os.remove(other)
+    return path
+
+def remove_metadata(meta_dir, short_id):
+    """Delete every metadata file for short_id. Returns True if any existed."""
+    removed = False
+    for suffix in METADATA_SUFFIXES:
+        path = os.path.join(meta_dir, f"{short_id}{suffix}")
+        if os.path.exists(path):
+            os.remove(path)
+            removed = True
+    return removed
+
+def _strip_nul(value):
+    if isinstance(value, str):
+        return value.replace("\x00", "")
+    if isinstance(value, dict):
+        return {_strip_nul(k): _strip_nul(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_strip_nul(v) for v in value]
+    return value
+
+def to_db_json(work) -> str:
+    """Compact JSON text for openalex_works.full_raw (jsonb rejects NUL characters, so they are dropped)."""
+    text = orjson.dumps(work)
+    if b"\\u0000" in text:
+        # Rare: strip NULs from the values themselves (editing the text would
+        # also hit an escaped backslash followed by "u0000")
+        text = orjson.dumps(_strip_nul(work))
+    return text.decode("utf-8")
@@ -1,41 +1,39 @@
 # /home/mike/rag-lab/Ingestion/src/DocProcessFunctions/ValidateJson.py
 
-import os
 import json
-import glob
-from jsonschema import validate, ValidationError
+
+import zstandard
+from jsonschema import ValidationError
+from jsonschema.validators import validator_for
+
+from adapters.metadata_io import list_metadata, read_metadata
+from adapters.validation_manifest import MAX_WORKERS, run_validation
 
 def load_schema(path):
     with open(path, 'r') as f:
         return json.load(f)
 
-def validate_metadata_files(metadata_dir, schema):
-    json_files = glob.glob(os.path.join(metadata_dir, "*.json"))
-    total = len(json_files)
-    valid = 0
-    invalid = 0
-    invalid_files = []
+def make_json_check(schema):
+    """Compile the schema once per worker process; returns check(path)."""
+    validator_cls = validator_for(schema)
+    validator_cls.check_schema(schema)
+    validator = validator_cls(schema)
 
-    for file_path in json_files:
+    def check(path):
         try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                validate(instance=data, schema=schema)
-                valid += 1
-        except (json.JSONDecodeError, ValidationError) as e:
-            invalid += 1
-            invalid_files.append({
-                "filename": os.path.basename(file_path),
-                "error": str(e).splitlines()[0]
-            })
-
-    return {
-        "valid_count": valid,
-        "invalid_count": invalid,
-        "invalid_files": invalid_files,
-        "total_files": total
-    }
-
-def validate_all_json_files(schema_path, json_dir):
+            data = read_metadata(path)
+        # JSONDecodeError and orjson errors are ValueErrors; a corrupt zstd frame raises ZstdError (an Exception)
+        except (ValueError, zstandard.ZstdError) as e:
+            raise ValueError(f"unreadable metadata: {e}")
+        error = next(validator.iter_errors(data), None)
+        if error is not None:
+            raise ValidationError(error.message)
+    return check
+
+def validate_metadata_files(metadata_dir, schema, manifest=None, workers=MAX_WORKERS):
+    json_files = list(list_metadata(metadata_dir).values())
+    return run_validation(json_files, "json", make_json_check, (schema,), manifest=manifest, workers=workers)
+
+def validate_all_json_files(schema_path, json_dir, manifest=None, workers=MAX_WORKERS):
     schema = load_schema(schema_path)
-    return validate_metadata_files(json_dir, schema)
\ No newline at end of file
+    return validate_metadata_files(json_dir, schema, manifest=manifest, workers=workers)
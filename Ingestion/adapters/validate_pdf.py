@@ -1,29 +1,76 @@
 import os
 import glob
 
+from adapters.validation_manifest import MAX_WORKERS, run_validation
+
 PDF_DIR = "/home/mike/staging/pdfs"
 
-def validate_all_pdfs():
+# === Integrity thresholds ===
+PDF_MAGIC = b"%PDF-"
+TRAILER_WINDOW = 2048        # %%EOF must appear in the last bytes (allows trailing junk/newlines)
+SAMPLE_PAGES = 20            # pages text-probed per file, spread evenly
+MIN_PAGE_CHARS = 100         # a page with less extractable text counts as image-only
+MIN_TEXT_RATIO = 0.2         # share of sampled pages that must carry text
+# Bump when inspect_pdf() gets stricter or records new stats: files that passed
+# an older version are validated again (2 = trailer/PyMuPDF/text-ratio checks + stats)
+CHECK_VERSION = 2
+
+def _sample_pages(page_count, n=SAMPLE_PAGES):
+    if page_count <= n:
+        return list(range(page_count))
+    step = page_count / n
+    return sorted({int(i * step) for i in range(n)})
+
+def inspect_pdf(path):
+    """
+    Structural + content checks. Returns stats (pages, text_pages_sampled,
+    sampled_pages, text_ratio, text_chars_per_page); raises ValueError with
+    the reason for a file that should not be uploaded.
+    """
+    import fitz  # PyMuPDF; imported here so JSON-only validation doesn't need it
+
+    size = os.path.getsize(path)
+    if size == 0:
+        raise ValueError("File is 0 bytes")
+    with open(path, "rb") as f:
+        head = f.read(1024)
+        f.seek(max(0, size - TRAILER_WINDOW))
+        tail = f.read()
+    if PDF_MAGIC not in head:
+        kind = "HTML page" if b"<html" in head.lower() or b"<!doctype" in head.lower() else "not a PDF"
+        raise ValueError(f"{kind} (starts with {head[:16]!r})")
+    if b"%%EOF" not in tail:
+        raise ValueError("Truncated (no %%EOF trailer)")
+
+    try:
+        doc = fitz.open(path)
+    except Exception as e:
+        raise ValueError(f"PyMuPDF cannot open file: {e}")
+    with doc:
+        if doc.needs_pass or doc.is_encrypted:
+            raise ValueError("Encrypted PDF")
+        pages = doc.page_count
+        if pages == 0:
+            raise ValueError("PDF has no pages")
+        sampled = _sample_pages(pages)
+        chars = [len(doc[i].get_text().strip()) for i in sampled]
+
+    text_pages = sum(1 for c in chars if c >= MIN_PAGE_CHARS)
+    stats = {
+        "pages": pages,
+        "sampled_pages": len(sampled),
+        "text_pages_sampled": text_pages,
+        "text_ratio": round(text_pages / len(sampled), 3),
+        "text_chars_per_page": round(sum(chars) / len(sampled)),
+    }
+    if stats["text_ratio"] < MIN_TEXT_RATIO:
+        raise ValueError(f"Image-only / no extractable text ({text_pages}/{len(sampled)} sampled pages have text)")
+    return stats
+
+def make_pdf_check():
+    return inspect_pdf
+
+def validate_all_pdfs(manifest=None, workers=MAX_WORKERS):
     pdf_files = glob.glob(os.path.join(PDF_DIR, "*.pdf"))
-    total = len(pdf_files)
-    valid = 0
-    invalid = 0
-    invalid_files = []
-
-    for path in pdf_files:
-        size = os.path.getsize(path)
-        if size == 0:
-            invalid += 1
-            invalid_files.append({
-                "filename": os.path.basename(path),
-                "error": "File is 0 bytes"
-            })
-        else:
-            valid += 1
-
-    return {
-        "valid_count": valid,
-        "invalid_count": invalid,
-        "invalid_files": invalid_files,
-        "total_files": total
-    }
\ No newline at end of file
+    return run_validation(pdf_files, "pdf", make_pdf_check, manifest=manifest, workers=workers,
+                          version=CHECK_VERSION)
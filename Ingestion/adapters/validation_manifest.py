@@ -0,0 +1,191 @@
+"""
+Incremental, parallel validation of staged files.
+
+ValidationManifest remembers every file that passed validation, keyed on
+(size, mtime_ns, sha256). A file whose size and mtime are unchanged is
+skipped without being opened. If only its mtime changed (copied or
+touched), the hash is compared, so identical content is not re-validated.
+
+run_validation() fans the remaining files out over a process pool. Each
+worker runs check(path), which raises ValueError with a one-line reason
+for an invalid file and may return a dict of stats (e.g. PDF page count
+and text ratio) that is stored with the entry.
+
+Entries also record the check_version they passed. When a check gets
+stricter (a new version), entries from the older check are stale: their
+files are validated again once, whatever their size, mtime or hash.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+MANIFEST_PATH = os.path.expanduser("~/staging/validation_manifest.sqlite")
+MAX_WORKERS = os.cpu_count() or 4
+CHUNKSIZE = 64
+
+
+def file_sha256(path, block_size=1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ValidationManifest:
+    def __init__(self, path=MANIFEST_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path         TEXT PRIMARY KEY,
+                kind         TEXT NOT NULL,
+                size         INTEGER NOT NULL,
+                mtime_ns     INTEGER NOT NULL,
+                sha256       TEXT NOT NULL,
+                validated_at TEXT
+            )
+        """)
+        cols = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+        if "stats" not in cols:
+            self.conn.execute("ALTER TABLE files ADD COLUMN stats TEXT")
+        if "check_version" not in cols:
+            self.conn.execute("ALTER TABLE files ADD COLUMN check_version INTEGER")
+
+    def entries(self, kind, version=None):
+        """path -> (size, mtime_ns, sha256) for entries that passed this version of the check."""
+        rows = self.conn.execute(
+            "SELECT path, size, mtime_ns, sha256 FROM files WHERE kind = ? AND check_version IS ?", (kind, version))
+        return {path: (size, mtime_ns, sha) for path, size, mtime_ns, sha in rows}
+
+    def record(self, kind, path, size, mtime_ns, sha256, stats=None, version=None):
+        self.conn.execute("""
+            INSERT INTO files (path, kind, size, mtime_ns, sha256, validated_at, stats, check_version)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET
+                size = excluded.size, mtime_ns = excluded.mtime_ns,
+                sha256 = excluded.sha256, validated_at = excluded.validated_at,
+                stats = COALESCE(excluded.stats, files.stats),
+                check_version = excluded.check_version
+        """, (path, kind, size, mtime_ns, sha256, datetime.now().isoformat(),
+              json.dumps(stats) if stats is not None else None, version))
+
+    def stats_for(self, path):
+        """Stats recorded when path last passed validation, or None if it never did."""
+        row = self.conn.execute("SELECT stats FROM files WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def reset(self):
+        self.conn.execute("DELETE FROM files")
+        self.conn.commit()
+
+    def forget(self, paths):
+        self.conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in paths])
+
+    def prune(self):
+        """Drop entries whose file no longer exists (deleted pairs, uploaded + flushed staging)."""
+        gone = [p for (p,) in self.conn.execute("SELECT path FROM files") if not os.path.exists(p)]
+        self.forget(gone)
+        self.conn.commit()
+        return len(gone)
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+# === Pool workers ===
+_check = None
+
+def _init_worker(check_factory, factory_args):
+    global _check
+    _check = check_factory(*factory_args)
+
+def _run_check(job):
+    """
+    job = (path, known_sha or None). Returns (path, size, mtime_ns, sha, stats, error, unchanged);
+    unchanged is None if the file was removed before it could be checked.
+    """
+    path, known_sha = job
+    try:
+        st = os.stat(path)
+        sha = file_sha256(path)
+        if sha == known_sha:
+            return path, st.st_size, st.st_mtime_ns, sha, None, None, True
+        stats = _check(path)
+        return path, st.st_size, st.st_mtime_ns, sha, stats, None, False
+    except FileNotFoundError:
+        return path, None, None, None, None, None, None
+    except Exception as e:
+        return path, None, None, None, None, (str(e).splitlines() or [type(e).__name__])[0], False
+
+
+def run_validation(paths, kind, check_factory, factory_args=(), manifest=None, workers=MAX_WORKERS, version=None):
+    """
+    Validate paths, skipping ones the manifest already vouches for at this
+    check version. check_factory(*factory_args) runs once per worker
+    process and returns check(path) (e.g. with a compiled schema validator
+    bound in).
+    """
+    start = time.time()
+    known = manifest.entries(kind, version) if manifest else {}
+    jobs = []
+    skipped = 0
+    gone = 0        # removed since listing (concurrent harvester, 02 quarantine); prune() drops them
+    for path in paths:
+        path = os.path.abspath(path)
+        entry = known.get(path)
+        if entry:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                gone += 1
+                continue
+            if (st.st_size, st.st_mtime_ns) == entry[:2]:
+                skipped += 1
+                continue
+        jobs.append((path, entry[2] if entry else None))
+
+    valid = invalid = 0
+    invalid_files = []
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(check_factory, factory_args)) as pool:
+            for path, size, mtime_ns, sha, stats, error, unchanged in pool.map(_run_check, jobs, chunksize=CHUNKSIZE):
+                if unchanged is None:
+                    gone += 1
+                elif error is None:
+                    if manifest:
+                        manifest.record(kind, path, size, mtime_ns, sha, stats, version)
+                    if unchanged:
+                        skipped += 1
+                    else:
+                        valid += 1
+                else:
+                    invalid += 1
+                    invalid_files.append({"filename": os.path.basename(path), "error": error})
+                    if manifest:
+                        manifest.forget([path])
+        if manifest:
+            manifest.commit()
+
+    elapsed = time.time() - start
+    return {
+        "valid_count": valid + skipped,
+        "invalid_count": invalid,
+        "invalid_files": invalid_files,
+        "total_files": valid + skipped + invalid,
+        "skipped_count": skipped,
+        "gone_count": gone,
+        "checked_count": valid + invalid,
+        "elapsed": elapsed,
+        "files_per_sec": (valid + invalid) / max(elapsed, 1e-6),
+    }
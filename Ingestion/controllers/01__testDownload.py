@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 import os, sys, json, time, argparse
-import requests, psycopg2
+import requests
 from datetime import datetime
-from urllib.parse import urlencode, urlparse
+from urllib.parse import urlparse
+from adapters.metadata_io import write_metadata
+from core import openalex
+from core.clients import pg_connection
+from core.work_index import WorkIndex
 
 # === Config Paths ===
 CONFIG_PATH = "/home/mike/rag-lab/Ingestion/config/openalex_config.json"
@@ -10,13 +14,7 @@ OUTPUT_DIR = os.path.expanduser("~/staging")
 META_DIR = os.path.join(OUTPUT_DIR, "metadata")
 PDF_DIR = os.path.join(OUTPUT_DIR, "pdfs")
 
-# === Database Config ===
-DB_HOST, DB_PORT, DB_NAME, DB_USER = "192.168.0.11", 5432, "raglab", "mike"
-DB_PASSWORD = os.getenv("PG_PASSWORD")
-
 # === API Config ===
-BASE_URL = "https://api.openalex.org/works"
-PER_PAGE = 50
 DOWNLOAD_LIMIT = 100_000
 RETRY_COUNT = 1
 RETRY_DELAY = 1
@@ -58,63 +56,18 @@ except Exception as e:
     print(f"❌ Config error: {e}")
     sys.exit(1)
 
-# === DB ===
+# === Dedup index ===
 try:
-    pg_conn = psycopg2.connect(host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD)
-    pg_cursor = pg_conn.cursor()
+    work_index = WorkIndex().load()
+    with pg_connection() as conn:
+        work_index.refresh(conn)
 except Exception as e:
-    print(f"❌ Database connection failed: {e}")
+    print(f"❌ Work index load failed (database unreachable?): {e}")
     sys.exit(1)
 
-def already_downloaded(work_id: str) -> bool:
-    try:
-        pg_cursor.execute("SELECT 1 FROM openalex_works WHERE id = %s", (work_id,))
-        return pg_cursor.fetchone() is not None
-    except Exception as e:
-        print(f"⚠️ Database query failed: {e}")
-        return False
-
-# === Filter helpers (RESTORED NORMALIZATION) ===
-def _to_oa_value(v):
-    if isinstance(v, bool):
-        return "true" if v else "false"
-    return str(v)
-
-def _normalize_kv(key, val):
-    # language: allow "en" → "languages/en"
-    if key == "language" and isinstance(val, str) and not val.startswith("languages/"):
-        return key, f"languages/{val}"
-    return key, val
-
+# === Filter helpers (shared with 01_download_metadata_and_pdfs.py) ===
 def build_url(cursor="*", page=None):
-    parts = []
-    # pass-through keys with normalization and OR for lists
-    for key, val in FILTERS.items():
-        if key in ("from_date", "to_date"):
-            continue  # mapped below
-        key, val = _normalize_kv(key, val)
-        if isinstance(val, list):
-            joined = "|".join(_to_oa_value(x) for x in val)
-            parts.append(f"{key}:{joined}")
-        else:
-            parts.append(f"{key}:{_to_oa_value(val)}")
-    # map convenience date keys
-    if "from_date" in FILTERS:
-        parts.append(f"from_publication_date:{FILTERS['from_date']}")
-    if "to_date" in FILTERS:
-        parts.append(f"to_publication_date:{FILTERS['to_date']}")
-    params = {
-        "filter": ",".join(parts),
-        "per_page": config.get("per_page", PER_PAGE),
-        "mailto": EMAIL,
-    }
-    if sort := config.get("sort"):
-        params["sort"] = sort
-    if config.get("use_cursor", True):
-        params["cursor"] = cursor
-    else:
-        params["page"] = config.get("page", page or 1)
-    return f"{BASE_URL}?{urlencode(params)}"
+    return openalex.build_url(config, FILTERS, cursor=cursor, page=page)
 
 def get_pdf_url(work):
     locations = []
@@ -137,11 +90,9 @@ def download_paper(work):
     if not pdf_url:
         print(f"⚠️ Skipping (no/blocked PDF): {short_id}")
         return False
-    meta_path = os.path.join(META_DIR, f"{short_id}.json")
     pdf_path = os.path.join(PDF_DIR, f"{short_id}.pdf")
     try:
-        with open(meta_path, "w") as f:
-            json.dump(work, f, indent=2)
+        write_metadata(META_DIR, short_id, work)
         for attempt in range(RETRY_COUNT + 1):
             try:
                 r = requests.get(pdf_url, headers=HEADERS, timeout=30)
@@ -179,37 +130,35 @@ def run():
         f.write("filename,publication_date,download_time,primary_topic_id,primary_topic_name\n")
     total = 0
     cursor = "*"
-    try:
-        while total < DOWNLOAD_LIMIT:
-            url = build_url(cursor=cursor)
-            print(f"🔍 Fetching: {url}")
-            try:
-                r = requests.get(url, headers=HEADERS, timeout=60)
-                r.raise_for_status()
-                data = r.json()
-            except Exception as e:
-                print(f"❌ API request failed: {e}")
+    while total < DOWNLOAD_LIMIT:
+        url = build_url(cursor=cursor)
+        print(f"🔍 Fetching: {url}")
+        try:
+            r = requests.get(url, headers=HEADERS, timeout=60)
+            r.raise_for_status()
+            data = r.json()
+        except Exception as e:
+            print(f"❌ API request failed: {e}")
+            break
+        results = data.get("results", [])
+        if not results:
+            break
+        known = work_index.contains_many([w["id"] for w in results])
+        for work, seen in zip(results, known):
+            if total >= DOWNLOAD_LIMIT:
                 break
-            results = data.get("results", [])
-            if not results:
-                break
-            for work in results:
-                if total >= DOWNLOAD_LIMIT:
-                    break
-                if already_downloaded(work["id"]):
-                    continue
-                if download_paper(work):
-                    pt = work.get("primary_topic") or {}
-                    pt_id = pt.get("id", "")
-                    pt_name = pt.get("display_name", "")
-                    with open(LOG_PATH, "a") as f:
-                        f.write(f"{work['id'].split('/')[-1]}.pdf,{work.get('publication_date','')},{datetime.now().isoformat()},{pt_id},{pt_name}\n")
-                    total += 1
-            cursor = data.get("meta", {}).get("next_cursor")
-            if not cursor:
-                break
-    finally:
-        pg_conn.close()
+            if seen:
+                continue
+            if download_paper(work):
+                pt = work.get("primary_topic") or {}
+                pt_id = pt.get("id", "")
+                pt_name = pt.get("display_name", "")
+                with open(LOG_PATH, "a") as f:
+                    f.write(f"{work['id'].split('/')[-1]}.pdf,{work.get('publication_date','')},{datetime.now().isoformat()},{pt_id},{pt_name}\n")
+                total += 1
+        cursor = data.get("meta", {}).get("next_cursor")
+        if not cursor:
+            break
     print(f"\n🎉 Finished. Downloaded {total} papers.")
     print(f"📊 Log saved to: {LOG_PATH}")
 
@@ -1,10 +1,20 @@
 import os
 import json
+import argparse
 import requests
-import psycopg2
 import time
 from datetime import datetime
-from urllib.parse import urlencode, urlparse
+from functools import partial
+from urllib.parse import urlparse
+
+from adapters.metadata_io import to_db_json, write_metadata
+from core import harvest_state, openalex
+from core.clients import MINIO_BUCKET, pg_connection, s3_client, log_metrics
+from core.harvest_state import HarvestState
+from core.host_health import HostHealth
+from core.object_store import NotAPdfError
+from core.pdf_fetcher import HostUnavailableError, PdfFetcher
+from core.work_index import WorkIndex
 
 # === Config Paths ===
 CONFIG_PATH = "/home/mike/rag-lab/Ingestion/config/openalex_config.json"
@@ -12,34 +22,37 @@ OUTPUT_DIR = os.path.expanduser("~/staging")
 META_DIR = os.path.join(OUTPUT_DIR, "metadata")
 PDF_DIR = os.path.join(OUTPUT_DIR, "pdfs")
 
-# === Database Config ===
-DB_HOST = "192.168.0.11"
-DB_PORT = 5432
-DB_NAME = "raglab"
-DB_USER = "mike"
-DB_PASSWORD = os.getenv("PG_PASSWORD")
-
 # === API Config ===
-BASE_URL = "https://api.openalex.org/works"
 PER_PAGE = 50
 DOWNLOAD_LIMIT = 100_000
 RETRY_COUNT = 1
 RETRY_DELAY = 1
 
+# === Download Concurrency ===
+MAX_WORKERS = 16       # PDFs in flight across all hosts
+PER_HOST_LIMIT = 4     # PDFs in flight against any one host
+PREFETCH_PAGES = 4     # metadata pages fetched ahead of the PDF workers
+
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
     "Accept": "application/json"
 }
 
 # === Blocklist for PDF hosts ===
+# Hand-maintained entries; hosts that keep failing are added to the learned
+# blocklist in HOST_HEALTH (persisted to ~/staging/host_health.json)
 BLOCKED_DOMAINS = []
 # Normalize and support subdomain matches: host == entry OR host endswith("." + entry_wo_www)
 _BLOCKED_SUFFIXES = {d.lower().lstrip(".").removeprefix("www.") for d in BLOCKED_DOMAINS}
 _BLOCKED_EXACT = {d.lower().lstrip(".") for d in BLOCKED_DOMAINS}
 
+HOST_HEALTH = HostHealth().load()
+
 def is_blocked(url: str) -> bool:
-    """Return True if URL host is in blocklist or is a subdomain of a blocked domain."""
+    """Return True if URL host is blocklisted (configured or learned) or a subdomain of a blocked domain."""
     try:
+        if HOST_HEALTH.is_blocked(url):
+            return True
         host = urlparse(url).netloc.split(":")[0].lower()
         host_wo_www = host.removeprefix("www.")
         if host in _BLOCKED_EXACT or host_wo_www in _BLOCKED_EXACT:
@@ -70,155 +83,214 @@ try:
     if not isinstance(config["filters"].get("concepts", []), list):
         raise ValueError("filters.concepts must be an array")
 
-    EMAIL = config["email"]
-    FILTERS = config["filters"]
+    # type/open_access were always applied by this harvester; keep them as defaults
+    FILTERS = {"type": "article", "open_access": True, **config["filters"]}
 
 except Exception as e:
     print(f"❌ Config error: {str(e)}")
     raise SystemExit(1)
 
-# === Database Connection ===
+# === Dedup Index (loaded once, refreshed only if the DB row count drifted) ===
 try:
-    pg_conn = psycopg2.connect(
-        host=DB_HOST, port=DB_PORT,
-        dbname=DB_NAME, user=DB_USER,
-        password=DB_PASSWORD
-    )
-    pg_cursor = pg_conn.cursor()
+    work_index = WorkIndex().load()
+    with pg_connection() as conn:
+        rebuilt = work_index.refresh(conn)
+    if rebuilt:
+        print(f"🔄 Work index rebuilt from Postgres: {work_index.keys.size} IDs")
 except Exception as e:
-    print(f"❌ Database connection failed: {str(e)}")
+    print(f"❌ Work index load failed (database unreachable?): {str(e)}")
     raise SystemExit(1)
 
-def already_downloaded(work_id: str) -> bool:
-    try:
-        pg_cursor.execute("SELECT 1 FROM openalex_works WHERE id = %s", (work_id,))
-        return pg_cursor.fetchone() is not None
-    except Exception as e:
-        print(f"⚠️ Database query failed: {str(e)}")
-        return False
-
 def build_url(cursor="*"):
-    filter_parts = []
-
-    # Handle concepts
-    if concepts := FILTERS.get("concepts"):
-        concept_filters = [f"concepts.id:{c}" for c in concepts]
-        filter_parts.append("|".join(concept_filters))
-
-    # Handle primary topics
-    if primary_topics := FILTERS.get("primary_topics"):
-        primary_filters = [f"primary_topic.id:{p}" for p in primary_topics]
-        filter_parts.append("|".join(primary_filters))
-
-    # Required filters
-    filter_parts.extend([
-        f"type:{FILTERS.get('type', 'article')}",
-        f"open_access.is_oa:{str(FILTERS.get('open_access', True)).lower()}",
-    ])
-
-    # Date filters
-    if from_date := FILTERS.get("from_date"):
-        filter_parts.append(f"from_publication_date:{from_date}")
-    if to_date := FILTERS.get("to_date"):
-        filter_parts.append(f"to_publication_date:{to_date}")
-
-    params = {
-        "filter": ",".join(filter_parts),
-        "per_page": config.get("per_page", PER_PAGE),
-        "cursor": cursor,
-        "mailto": EMAIL,
-    }
-    return f"{BASE_URL}?{urlencode(params)}"
-
-def get_pdf_url(work):
-    """Return first allowed PDF URL from OA locations, skipping blocked hosts."""
+    # Shared OpenAlex filter builder (from 01__testDownload.py); this harvester always pages by cursor
+    return openalex.build_url({**config, "use_cursor": True}, FILTERS, cursor=cursor)
+
+def fetch_page(cursor):
+    url = build_url(cursor)
+    print(f"🔍 Fetching: {url}")
+    response = api_session.get(url, timeout=60)
+    response.raise_for_status()
+    return response.json()
+
+def get_pdf_urls(work):
+    """All usable PDF URLs in OA-location order, skipping blocked hosts and hosts with an open circuit."""
     locations = []
     if work.get("best_oa_location"):
         locations.append(work["best_oa_location"])
     locations.extend(work.get("locations", []))
 
+    urls = []
     for loc in locations:
         if not loc:
             continue
         url = loc.get("pdf_url")
-        if not url:
+        if not url or url in urls:
             continue
         if is_blocked(url):
             print(f"⛔ Blocked host for {work.get('id','?')}: {url}")
             continue
-        return url
-    return None
+        if HOST_HEALTH.is_open(url):
+            print(f"🔌 Host cooling down for {work.get('id','?')}: {url}")
+            continue
+        urls.append(url)
+    return urls
 
-def download_paper(work):
+def get_pdf_url(work):
+    """Return first allowed PDF URL from OA locations, skipping blocked hosts."""
+    urls = get_pdf_urls(work)
+    return urls[0] if urls else None
+
+def has_any_pdf_url(work):
+    locations = [work.get("best_oa_location")] + list(work.get("locations", []))
+    return any(loc and loc.get("pdf_url") for loc in locations)
+
+# === PDF Download Engine ===
+api_session = requests.Session()
+api_session.headers.update(HEADERS)
+fetcher = PdfFetcher(headers=HEADERS, max_workers=MAX_WORKERS, per_host=PER_HOST_LIMIT, timeout=30,
+                     health=HOST_HEALTH)
+
+def _with_retries(short_id, attempt_fn):
+    for attempt in range(RETRY_COUNT + 1):
+        try:
+            attempt_fn()
+            return True
+        except (NotAPdfError, HostUnavailableError) as e:
+            # Landing page instead of a PDF, or the host's circuit just opened: retrying won't help
+            print(f"❌ Failed to download {short_id}: {e}")
+            return False
+        except Exception as e:
+            if attempt < RETRY_COUNT:
+                print(f"❌ Download error ({short_id}), retry {attempt+1}/{RETRY_COUNT}: {e}")
+                time.sleep(RETRY_DELAY)
+                continue
+            print(f"❌ Failed to download {short_id}: {e}")
+            return False
+
+def _has_only_blocked_urls(work):
+    """Every PDF URL is permanently blocked (as opposed to a host merely cooling down)."""
+    locations = [work.get("best_oa_location")] + list(work.get("locations", []))
+    urls = [loc["pdf_url"] for loc in locations if loc and loc.get("pdf_url")]
+    return bool(urls) and all(is_blocked(u) for u in urls)
+
+def download_paper(work, direct=False):
+    """Returns (outcome, pdf_key); pdf_key is only set in direct mode."""
     work_id = work["id"]
     short_id = work_id.split("/")[-1]
-    pdf_url = get_pdf_url(work)
+    pdf_urls = get_pdf_urls(work)
+
+    if not pdf_urls:
+        if not has_any_pdf_url(work):
+            print(f"⚠️ Skipping (no PDF): {short_id}")
+            return harvest_state.NO_PDF, None
+        if _has_only_blocked_urls(work):
+            print(f"⚠️ Skipping (blocked): {short_id}")
+            return harvest_state.BLOCKED, None
+        # Hosts are only cooling down; leave it retryable for a later run
+        print(f"⚠️ Deferred (host circuit open): {short_id}")
+        return harvest_state.FAILED, None
+
+    if direct:
+        # Stream straight into MinIO under its content hash; the row is written by the caller
+        for pdf_url in pdf_urls:
+            uploaded = []
+            if _with_retries(short_id, lambda: uploaded.append(fetcher.fetch_to_bucket(pdf_url, s3_client(), MINIO_BUCKET))):
+                print(f"✅ Streamed {short_id} → s3://{MINIO_BUCKET}/{uploaded[0]}")
+                return harvest_state.DOWNLOADED, uploaded[0]
+        return harvest_state.FAILED, None
 
-    if not pdf_url or is_blocked(pdf_url):
-        print(f"⚠️ Skipping (blocked/no PDF): {short_id}")
-        return False
-
-    meta_path = os.path.join(META_DIR, f"{short_id}.json")
     pdf_path = os.path.join(PDF_DIR, f"{short_id}.pdf")
 
     try:
-        # Save metadata
-        with open(meta_path, "w") as f:
-            json.dump(work, f, indent=2)
-
-        # Download PDF with retries
-        for attempt in range(RETRY_COUNT + 1):
-            try:
-                resp = requests.get(pdf_url, headers=HEADERS, timeout=30)
-                resp.raise_for_status()
-                with open(pdf_path, "wb") as f:
-                    f.write(resp.content)
+        # Save metadata (minified, zstd-compressed)
+        write_metadata(META_DIR, short_id, work)
+
+        # Download PDF with retries (streamed to disk, per-host capped), falling back to the next location
+        for pdf_url in pdf_urls:
+            if _with_retries(short_id, lambda: fetcher.fetch(pdf_url, pdf_path)):
                 print(f"✅ Downloaded {short_id}")
-                return True
-            except Exception as e:
-                if attempt < RETRY_COUNT:
-                    print(f"❌ Download error ({short_id}), retry {attempt+1}/{RETRY_COUNT}: {e}")
-                    time.sleep(RETRY_DELAY)
-                    continue
-                print(f"❌ Failed to download {short_id}: {e}")
-                return False
+                return harvest_state.DOWNLOADED, None
+        return harvest_state.FAILED, None
     except Exception as e:
         print(f"❌ File operation failed for {short_id}: {e}")
+        return harvest_state.FAILED, None
+
+def record_work(work, pdf_key):
+    """Insert the openalex_works row for a PDF already uploaded in direct mode."""
+    short_id = work["id"].split("/")[-1]
+    try:
+        with pg_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO openalex_works (id, title, full_raw, pdf_key)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (id) DO UPDATE SET pdf_key = EXCLUDED.pdf_key
+                    WHERE openalex_works.pdf_key IS NULL;
+            """, (work["id"], work.get("title"), to_db_json(work), pdf_key))
+            inserted = cur.rowcount == 1
+        if inserted:
+            work_index.add_many([work["id"]])
+        return True
+    except Exception as e:
+        print(f"❌ Metadata insert failed for {short_id} (object left for CheckMinIOOrphans): {e}")
         return False
 
-def main():
+def main(direct=False, resume=False, snapshot=None):
     # Initialize log
     with open(LOG_PATH, "w") as f:
         f.write("filename,publication_date,download_time,primary_topic_id,primary_topic_name\n")
 
     total_downloaded = 0
+    state = HarvestState()
+    fhash = harvest_state.filter_hash(FILTERS, config.get("per_page", PER_PAGE))
     cursor = "*"
 
+    if resume:
+        saved_cursor, completed = state.load_cursor(fhash)
+        if completed:
+            print(f"✅ Harvest for filter set {fhash} already completed; nothing to resume.")
+            state.close()
+            return
+        if saved_cursor:
+            cursor = saved_cursor
+            print(f"⏯️  Resuming filter set {fhash} from saved cursor")
+
+    if snapshot:
+        # Offline source: pages built from local snapshot files (see 01_import_openalex_snapshot.py)
+        prefetcher = None
+        pages = openalex.snapshot_pages(snapshot, FILTERS, config.get("per_page", PER_PAGE))
+    else:
+        # Metadata pages are fetched ahead on a producer thread while PDFs download
+        prefetcher = openalex.PagePrefetcher(fetch_page, start_cursor=cursor, max_ahead=PREFETCH_PAGES)
+        pages = prefetcher
+
     try:
-        while total_downloaded < DOWNLOAD_LIMIT:
-            url = build_url(cursor)
-            print(f"🔍 Fetching: {url}")
-
-            try:
-                response = requests.get(url, headers=HEADERS, timeout=60)
-                response.raise_for_status()
-                data = response.json()
-            except Exception as e:
-                print(f"❌ API request failed: {e}")
+        for page in pages:
+            if total_downloaded >= DOWNLOAD_LIMIT:
                 break
 
+            if page.error is not None:
+                print(f"❌ API request failed: {page.error}")
+                print("⏯️  Checkpoint kept; rerun with --resume to continue from this page.")
+                break
+
+            data = page.data
             results = data.get("results", [])
             if not results:
+                if not snapshot:
+                    state.save_cursor(fhash, None, completed=True)
                 break
 
-            for work in results:
-                if total_downloaded >= DOWNLOAD_LIMIT:
-                    break
-
-                if already_downloaded(work["id"]):
-                    continue
-
-                if download_paper(work):
+            known = work_index.contains_many([w["id"] for w in results])
+            skip = state.skippable([w["id"] for w in results])
+            pending = [w for w, seen in zip(results, known) if not seen and w["id"] not in skip]
+            page_complete = len(pending) <= DOWNLOAD_LIMIT - total_downloaded
+            pending = pending[:DOWNLOAD_LIMIT - total_downloaded]
+
+            for work, (outcome, pdf_key) in fetcher.map(partial(download_paper, direct=direct), pending):
+                if outcome == harvest_state.DOWNLOADED and direct and not record_work(work, pdf_key):
+                    outcome = harvest_state.FAILED
+                state.record(work["id"], outcome)
+                if outcome == harvest_state.DOWNLOADED:
                     pt = work.get("primary_topic") or {}
                     pt_id = pt.get("id", "")
                     pt_name = pt.get("display_name", "")
@@ -230,15 +302,44 @@ def main():
                             f"{pt_id},{pt_name}\n"
                         )
                     total_downloaded += 1
+            state.commit()
+
+            print(f"⚡ {fetcher.stats.summary()}")
+            HOST_HEALTH.save()
+
+            if not page_complete:
+                break  # keep the checkpoint on this page; its remaining works are picked up on resume
+
+            if snapshot:
+                continue
 
-            cursor = data.get("meta", {}).get("next_cursor")
-            if not cursor:
+            next_cursor = data.get("meta", {}).get("next_cursor")
+            state.save_cursor(fhash, next_cursor, completed=not next_cursor)
+            if not next_cursor:
                 break
     finally:
-        pg_conn.close()
+        if prefetcher:
+            prefetcher.close()
+        fetcher.close()
+        HOST_HEALTH.save()
+        work_index.save()
+        outcomes = state.counts()
+        state.close()
 
     print(f"\n🎉 Finished. Downloaded {total_downloaded} papers.")
+    print(f"⚡ Throughput: {fetcher.stats.summary()}")
+    print(f"🗂️  Harvest state (all runs): {outcomes}")
+    print(f"🔌 Host health: {HOST_HEALTH.summary()}")
+    log_metrics()
     print(f"📊 Log saved to: {LOG_PATH}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--direct", action="store_true",
+                    help="Stream PDFs straight into MinIO and insert openalex_works rows (skips ~/staging and stage 03).")
+    ap.add_argument("--resume", action="store_true",
+                    help="Continue from the last checkpointed cursor for the current filter set.")
+    ap.add_argument("--snapshot", nargs="+", metavar="PATH",
+                    help="Read works from local OpenAlex snapshot files/dirs instead of the API.")
+    args = ap.parse_args()
+    main(direct=args.direct, resume=args.resume, snapshot=args.snapshot)
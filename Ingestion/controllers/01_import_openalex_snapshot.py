@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Offline bulk import of OpenAlex works from snapshot files.
+
+Streams gzipped JSON Lines (the OpenAlex snapshot's works/updated_date=*/part_*.gz,
+or any local sample file) and applies the same concept/topic/type/OA/date
+filters that 01_download_metadata_and_pdfs.py sends to the API.
+
+Targets:
+  staging   write matching works to ~/staging/snapshot/*.jsonl.gz
+            (feed these to `01_download_metadata_and_pdfs.py --snapshot` for PDFs)
+  postgres  insert matching works into openalex_works in large batches
+            (pdf_key stays NULL until the PDF is uploaded)
+
+Needs no network for the staging target, so it can be run against local
+sample files only:
+  python controllers/01_import_openalex_snapshot.py --target staging samples/works.jsonl.gz
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+from itertools import islice
+
+from adapters.metadata_io import to_db_json
+from core import openalex
+
+# === Config Paths ===
+CONFIG_PATH = "/home/mike/rag-lab/Ingestion/config/openalex_config.json"
+SNAPSHOT_STAGING_DIR = os.path.expanduser("~/staging/snapshot")
+
+BATCH_SIZE = 5000           # works per staging file / per Postgres transaction
+
+def load_filters(path):
+    with open(path) as f:
+        config = json.load(f)
+    if "filters" not in config:
+        raise ValueError("Config missing required field: filters")
+    # Same defaults as the API harvester
+    return {"type": "article", "open_access": True, **config["filters"]}
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# === Targets ===
+def write_staging(batches, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    total = 0
+    for n, batch in enumerate(batches, start=1):
+        path = os.path.join(out_dir, f"works_{stamp}_{n:05d}.jsonl.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for work in batch:
+                f.write(json.dumps(work, separators=(",", ":")))
+                f.write("\n")
+        total += len(batch)
+        print(f"💾 {path}: {len(batch)} works (total {total})")
+    return total
+
+def write_postgres(batches):
+    from psycopg2.extras import execute_values
+    from core.clients import pg_connection
+
+    total = inserted = 0
+    with pg_connection() as conn, conn.cursor() as cur:
+        for batch in batches:
+            rows = [(w["id"], w.get("title"), to_db_json(w)) for w in batch]
+            execute_values(cur, """
+                INSERT INTO openalex_works (id, title, full_raw)
+                VALUES %s
+                ON CONFLICT (id) DO NOTHING;
+            """, rows, page_size=len(rows))  # one statement per batch, so rowcount covers it
+            inserted += cur.rowcount
+            conn.commit()
+            total += len(batch)
+            print(f"🧠 Committed batch: {len(batch)} works (seen {total}, inserted {inserted})")
+    return inserted
+
+# === Main ===
+def main():
+    ap = argparse.ArgumentParser(description="Import OpenAlex works from local snapshot files.")
+    ap.add_argument("paths", nargs="+", help="Snapshot .gz/.jsonl files or directories")
+    ap.add_argument("--target", choices=["staging", "postgres"], default="staging")
+    ap.add_argument("--config", default=CONFIG_PATH, help="openalex_config.json with the filters to apply")
+    ap.add_argument("--out-dir", default=SNAPSHOT_STAGING_DIR, help="Output dir for --target staging")
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    ap.add_argument("--limit", type=int, default=None, help="Stop after N matching works")
+    ap.add_argument("--count", action="store_true", help="Only count matching works")
+    args = ap.parse_args()
+
+    try:
+        filters = load_filters(args.config)
+    except Exception as e:
+        print(f"❌ Config error: {e}")
+        sys.exit(1)
+
+    print(f"🔍 Filter: {openalex.build_filter(filters)}")
+    start = time.time()
+    works = openalex.iter_snapshot_works(args.paths, filters)
+    if args.limit:
+        works = islice(works, args.limit)
+
+    if args.count:
+        total = sum(1 for _ in works)
+        print(f"📊 Matching works: {total}")
+    elif args.target == "staging":
+        total = write_staging(batched(works, args.batch_size), args.out_dir)
+    else:
+        total = write_postgres(batched(works, args.batch_size))
+
+    elapsed = time.time() - start
+    print(f"\n🎉 Done: {total} works in {elapsed:.1f}s ({total / max(elapsed, 1e-6):.0f} works/s)")
+
+if __name__ == "__main__":
+    main()
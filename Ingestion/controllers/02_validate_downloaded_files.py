@@ -1,55 +1,88 @@
 import sys
 import os
+import argparse
 
 # === Import validation functions and delete helper ===
 from adapters.validate_json import validate_all_json_files
 from adapters.validate_pdf import validate_all_pdfs
-from adapters.delete_pdf_json import delete_pair
+from adapters.delete_pdf_json import delete_pair, quarantine_pair
+from adapters.metadata_io import short_id_of
+from adapters.validation_manifest import MAX_WORKERS, ValidationManifest
 from adapters.document_consistency_check import check_and_delete_orphans
+from core.harvest_state import HarvestState
 
 # === Constants ===
 SCHEMA_PATH = "/home/mike/rag-lab/Ingestion/schemas/openalex_work.schema.json"
 JSON_DIR = "/home/mike/staging/metadata"
+OPENALEX_PREFIX = "https://openalex.org/"    # harvest checkpoint keys are full work IDs
+
+def print_rate(result):
+    print(f"   - Skipped (unchanged since last validation): {result['skipped_count']}")
+    if result["gone_count"]:
+        print(f"   - Removed before they could be checked: {result['gone_count']}")
+    print(f"   - Checked: {result['checked_count']} in {result['elapsed']:.1f}s "
+          f"({result['files_per_sec']:.1f} files/s)")
+
+def reopen_in_harvest(work_ids, reason):
+    """Let 01 --resume fetch discarded downloads again (bounded by its failed-attempt limit)."""
+    if not work_ids:
+        return
+    state = HarvestState()
+    reopened = state.reopen(work_ids, reason)
+    state.close()
+    if reopened:
+        print(f"   ⏯️  {reopened} works reopened in the harvest checkpoint")
 
 # === Main ===
-def main():
+def main(workers=MAX_WORKERS, full=False):
     print("🚀 Starting document processing pipeline...\n")
+    manifest = ValidationManifest()
+    if full:
+        manifest.reset()
 
     # === Step 1: Validate JSON files ===
-    print("🔍 Step 1: Validating JSON files...")
-    result = validate_all_json_files(schema_path=SCHEMA_PATH, json_dir=JSON_DIR)
+    print(f"🔍 Step 1: Validating JSON files ({workers} workers)...")
+    result = validate_all_json_files(schema_path=SCHEMA_PATH, json_dir=JSON_DIR, manifest=manifest, workers=workers)
 
     print("\n✅ JSON validation complete.")
     print(f"   - Valid files: {result['valid_count']}")
     print(f"   - Invalid files: {result['invalid_count']}")
     print(f"   - Total files: {result['total_files']}")
+    print_rate(result)
 
     if result["invalid_files"]:
         print("\n🧨 Invalid JSON files summary:")
+        deleted_ids = []
         for item in result["invalid_files"]:
             print(f" - {item['filename']}: {item['error']}")
-            short_id = item["filename"].replace(".json", "")
+            short_id = short_id_of(item["filename"])
             deleted = delete_pair(short_id)
             if deleted["pdf"] or deleted["json"]:
                 print(f"   🗑️ Deleted files for {short_id}: {deleted}")
+                deleted_ids.append(f"{OPENALEX_PREFIX}{short_id}")
+        reopen_in_harvest(deleted_ids, "invalid JSON deleted by 02")
 
     # === Step 2: Validate PDFs ===
-    print("\n🔍 Step 2: Validating PDF files...")
-    pdf_result = validate_all_pdfs()
+    print("\n🔍 Step 2: Validating PDF files (magic bytes, trailer, encryption, page count, text ratio)...")
+    pdf_result = validate_all_pdfs(manifest=manifest, workers=workers)
 
     print("\n✅ PDF validation complete.")
     print(f"   - Valid files: {pdf_result['valid_count']}")
     print(f"   - Invalid files: {pdf_result['invalid_count']}")
     print(f"   - Total files: {pdf_result['total_files']}")
+    print_rate(pdf_result)
 
     if pdf_result["invalid_files"]:
         print("\n🧨 Invalid PDF files summary:")
+        quarantined = []
         for item in pdf_result["invalid_files"]:
             print(f" - {item['filename']}: {item['error']}")
             short_id = item["filename"].replace(".pdf", "")
-            deleted = delete_pair(short_id)
-            if deleted["pdf"] or deleted["json"]:
-                print(f"   🗑️ Deleted files for {short_id}: {deleted}")
+            moved = quarantine_pair(short_id, item["error"])
+            if moved["pdf"] or moved["json"]:
+                print(f"   🚧 Quarantined files for {short_id}: {moved}")
+                quarantined.append(f"{OPENALEX_PREFIX}{short_id}")
+        reopen_in_harvest(quarantined, "quarantined by 02")
 
     # === Step 3: Consistency Check ===
     print("\n🔍 Step 3: Checking for orphaned files...")
@@ -59,7 +92,16 @@ def main():
     else:
         print("   ✅ No orphans found.")
 
+    pruned = manifest.prune()
+    manifest.close()
+    if pruned:
+        print(f"\n🧾 Dropped {pruned} deleted files from the validation manifest.")
+
     print("\n🎯 Done.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=MAX_WORKERS, help="Validation processes")
+    ap.add_argument("--full", action="store_true", help="Ignore the manifest and re-validate every file")
+    args = ap.parse_args()
+    main(workers=args.workers, full=args.full)
\ No newline at end of file
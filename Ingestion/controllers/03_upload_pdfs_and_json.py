@@ -1,26 +1,25 @@
 import os
-import json
-import boto3
-import psycopg2
+import csv
+import time
 import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from psycopg2.extras import execute_values
 
-# === Config ===
-MINIO_ENDPOINT = "http://192.168.0.17:9000"
-MINIO_ACCESS_KEY = "admin"
-MINIO_SECRET_KEY = "adminsecret"
-MINIO_BUCKET = "papers"
-
-PG_HOST = "192.168.0.11"
-PG_DB = "raglab"
-PG_USER = "mike"
-PG_PASSWORD = os.getenv("PG_PASSWORD")
+from adapters.metadata_io import metadata_path, read_metadata, to_db_json
+from adapters.validation_manifest import ValidationManifest
+from core.clients import MINIO_BUCKET, S3_MAX_POOL, pg_connection, s3_client, log_metrics
+from core.object_store import MAX_PARTS_IN_FLIGHT, upload_file_content_addressed
+from core.work_index import WorkIndex
 
+# === Config ===
 PDF_DIR = os.path.expanduser("~/staging/pdfs")
 META_DIR = os.path.expanduser("~/staging/metadata")
+LOG_DIR = os.path.expanduser("~/staging/logs")
 
-# === Check env ===
-if not PG_PASSWORD:
-    raise RuntimeError("❌ PG_PASSWORD environment variable not set.")
+# === Bulk upload tuning ===
+UPLOAD_WORKERS = 8      # PDFs uploading concurrently (each multipart, MAX_PARTS_IN_FLIGHT parts at a time)
+BATCH_SIZE = 500        # metadata rows per INSERT + commit
 
 # === Setup Logging (stdout only) ===
 logging.basicConfig(
@@ -29,86 +28,194 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]  # only stdout
 )
 
-# === Clients ===
-s3 = boto3.client(
-    "s3",
-    endpoint_url=MINIO_ENDPOINT,
-    aws_access_key_id=MINIO_ACCESS_KEY,
-    aws_secret_access_key=MINIO_SECRET_KEY,
-)
-
-pg_conn = psycopg2.connect(
-    host=PG_HOST,
-    dbname=PG_DB,
-    user=PG_USER,
-    password=PG_PASSWORD
-)
-pg_cur = pg_conn.cursor()
-
-# === Load existing IDs from DB ===
+# === Load existing IDs (local dedup index, synced with DB) ===
 def get_existing_ids():
-    pg_cur.execute("SELECT id FROM openalex_works;")
-    return set(r[0] for r in pg_cur.fetchall())
+    index = WorkIndex().load()
+    with pg_connection() as conn:
+        rebuilt = index.refresh(conn)
+    if rebuilt:
+        logging.info(f"🔄 Work index rebuilt from Postgres: {index.keys.size} IDs")
+    return index
+
+# === Postgres batch writer ===
+INSERT_SQL = """
+    INSERT INTO openalex_works (id, title, full_raw, pdf_key, pdf_pages, pdf_text_ratio, pdf_text_chars_per_page)
+    VALUES %s
+    ON CONFLICT (id) DO UPDATE SET pdf_key = EXCLUDED.pdf_key,
+        pdf_pages = EXCLUDED.pdf_pages,
+        pdf_text_ratio = EXCLUDED.pdf_text_ratio,
+        pdf_text_chars_per_page = EXCLUDED.pdf_text_chars_per_page
+        WHERE openalex_works.pdf_key IS NULL
+    RETURNING id;
+"""
+
+def flush_rows(rows):
+    """
+    Insert one batch and commit. Returns (written_ids, failed) where failed is
+    [(work_id, error)]. If the batch statement fails, rows are retried one at
+    a time so a single bad row doesn't sink the batch.
+    """
+    if not rows:
+        return [], []
+    with pg_connection() as conn, conn.cursor() as cur:
+        try:
+            written = execute_values(cur, INSERT_SQL, rows, page_size=len(rows), fetch=True)
+            conn.commit()
+            return [r[0] for r in written], []
+        except Exception as e:
+            conn.rollback()
+            logging.warning(f"⚠️ Batch insert of {len(rows)} rows failed ({e}); retrying row by row")
+
+        written, failed = [], []
+        for row in rows:
+            try:
+                out = execute_values(cur, INSERT_SQL, [row], fetch=True)
+                conn.commit()
+                written.extend(r[0] for r in out)
+            except Exception as e:
+                conn.rollback()
+                failed.append((row[0], str(e)))
+        return written, failed
 
 # === Upload matching pairs ===
-def upload_all():
+def prepare(pdf_file, existing_ids, manifest):
+    """Return (base_id, pdf_path, row-without-pdf_key) or a skip reason string."""
+    base_id = pdf_file.replace(".pdf", "")
+    json_path = metadata_path(META_DIR, base_id)
+    if not json_path:
+        return f"JSON not found for {base_id}"
+
+    data = read_metadata(json_path)
+    work_id = data["id"]
+    if work_id in existing_ids:
+        return f"{work_id} already in database"
+
+    pdf_path = os.path.join(PDF_DIR, pdf_file)
+    pdf_stats = manifest.stats_for(pdf_path) or {}
+    if not pdf_stats:
+        logging.warning(f"⚠️ {base_id}: PDF not validated by 02, uploading without page/text stats")
+    row = (work_id, data.get("title", None), to_db_json(data),
+           pdf_stats.get("pages"), pdf_stats.get("text_ratio"), pdf_stats.get("text_chars_per_page"))
+    return base_id, pdf_path, row
+
+def upload_pdf(base_id, pdf_path):
+    """Upload PDF to MinIO under its content hash (identical files are stored once)."""
+    pdf_key, stored = upload_file_content_addressed(s3_client(), MINIO_BUCKET, pdf_path)
+    return pdf_key, stored, os.path.getsize(pdf_path)
+
+def upload_all(workers=UPLOAD_WORKERS, batch_size=BATCH_SIZE):
+    if workers * MAX_PARTS_IN_FLIGHT > S3_MAX_POOL:
+        logging.warning(f"⚠️ {workers} workers x {MAX_PARTS_IN_FLIGHT} parts exceeds S3_MAX_POOL={S3_MAX_POOL}; "
+                        f"uploads will queue for connections")
     existing_ids = get_existing_ids()
+    manifest = ValidationManifest()   # PDF stats recorded by 02
     uploaded = 0
     skipped = 0
-    failed = 0
+    shared = 0
+    conflicts = 0                     # already in the DB with a pdf_key (another run got there first)
+    nbytes = 0
+    failures = []                     # (base_id or work_id, stage, error)
+    batch = []
+    start = time.time()
 
     pdf_files = [f for f in os.listdir(PDF_DIR) if f.endswith(".pdf")]
-
-    for pdf_file in pdf_files:
-        base_id = pdf_file.replace(".pdf", "")
-        json_path = os.path.join(META_DIR, f"{base_id}.json")
-        pdf_path = os.path.join(PDF_DIR, pdf_file)
-
-        if not os.path.exists(json_path):
-            logging.warning(f"⚠️ JSON not found for {base_id}, skipping.")
-            skipped += 1
-            continue
-
+    logging.info(f"📂 {len(pdf_files)} PDFs staged; {workers} upload workers, batches of {batch_size}")
+
+    def flush():
+        nonlocal uploaded, conflicts
+        written, failed = flush_rows([(*row[:3], pdf_key, *row[3:]) for row, pdf_key in batch])
+        existing_ids.add_many(written)
+        uploaded += len(written)
+        for work_id, err in failed:
+            failures.append((work_id, "postgres", err))
+            logging.error(f"❌ Metadata insert failed for {work_id}: {err}")
+        # ON CONFLICT ... WHERE pdf_key IS NULL returns no id for works that already
+        # have a PDF: nothing was written, and an object uploaded only for them is
+        # left for CheckMinIOOrphans.py
+        settled = set(written) | {work_id for work_id, _ in failed}
+        kept = [(row[0], pdf_key) for row, pdf_key in batch if row[0] not in settled]
+        existing_ids.add_many([work_id for work_id, _ in kept], created=False)
+        conflicts += len(kept)
+        for work_id, pdf_key in kept:
+            logging.warning(f"⚠️ {work_id} already has a PDF in the database; not replaced by {pdf_key}")
+        batch.clear()
+        elapsed = max(time.time() - start, 1e-6)
+        logging.info(f"🧠 Committed batch — {uploaded} uploaded, {len(failures)} failed, "
+                     f"{uploaded / elapsed:.1f} files/s, {nbytes / 1048576 / elapsed:.1f} MiB/s")
+
+    def collect(fut):
+        nonlocal shared, nbytes
+        base_id, row = in_flight.pop(fut)
         try:
-            with open(json_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
-            work_id = data["id"]
-            if work_id in existing_ids:
-                logging.info(f"⏩ Skipping {work_id}, already in database.")
-                skipped += 1
-                continue
-
-            title = data.get("title", None)
-            full_raw = json.dumps(data)
-            pdf_key = f"{base_id}.pdf"
-
-            # Upload PDF to MinIO
-            s3.upload_file(pdf_path, MINIO_BUCKET, pdf_key)
-
-            # Insert metadata into Postgres
-            pg_cur.execute("""
-                INSERT INTO openalex_works (id, title, full_raw, pdf_key)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (id) DO NOTHING;
-            """, (work_id, title, full_raw, pdf_key))
-
-            pg_conn.commit()
-            uploaded += 1
-            logging.info(f"✅ Uploaded: {pdf_file} + {base_id}.json")
-
+            pdf_key, stored, size = fut.result()
         except Exception as e:
-            failed += 1
+            failures.append((base_id, "minio", str(e)))
             logging.error(f"❌ Failed for {base_id}: {e}")
+            return
+        nbytes += size
+        if not stored:
+            shared += 1
+            logging.info(f"♻️ {base_id}: identical PDF already stored as {pdf_key}")
+        batch.append((row, pdf_key))
+        if len(batch) >= batch_size:
+            flush()
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload") as pool:
+        for pdf_file in pdf_files:
+            try:
+                prepared = prepare(pdf_file, existing_ids, manifest)
+            except Exception as e:
+                failures.append((pdf_file, "metadata", str(e)))
+                logging.error(f"❌ Failed for {pdf_file}: {e}")
+                continue
+            if isinstance(prepared, str):
+                logging.info(f"⏩ Skipping: {prepared}")
+                skipped += 1
+                continue
 
+            base_id, pdf_path, row = prepared
+            in_flight[pool.submit(upload_pdf, base_id, pdf_path)] = (base_id, row)
+            # Bounded window: metadata for at most a few batches is held in memory
+            while len(in_flight) >= workers * 4:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    collect(fut)
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                collect(fut)
+    flush()
+
+    existing_ids.save()
+    manifest.close()
+
+    if failures:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        fail_path = os.path.join(LOG_DIR, f"upload_failures_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+        with open(fail_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "stage", "error"])
+            writer.writerows(failures)
+        logging.info(f"🧾 Failures written to {fail_path}")
+
+    elapsed = max(time.time() - start, 1e-6)
     logging.info(f"\n📦 PDFs uploaded: {uploaded}")
+    logging.info(f"♻️ Deduplicated (shared PDF object): {shared}")
     logging.info(f"⏩ Skipped: {skipped}")
-    logging.info(f"❌ Failed: {failed}")
+    logging.info(f"🔁 Already in database (not replaced): {conflicts}")
+    logging.info(f"❌ Failed: {len(failures)}")
+    logging.info(f"⚡ {elapsed:.1f}s — {uploaded / elapsed:.1f} files/s, {nbytes / 1048576 / elapsed:.1f} MiB/s")
 
 # === Run ===
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=UPLOAD_WORKERS, help="Concurrent MinIO uploads")
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Metadata rows per Postgres commit")
+    args = ap.parse_args()
+
     logging.info("🚀 Starting upload process...\n")
-    upload_all()
-    pg_cur.close()
-    pg_conn.close()
+    upload_all(workers=args.workers, batch_size=args.batch_size)
+    log_metrics()
     logging.info("✅ Upload complete.")
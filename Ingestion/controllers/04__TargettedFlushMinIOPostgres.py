@@ -9,49 +9,25 @@ deletes those below it.
 
 Supports dry-run (--whatif) and execution (--execute).
 Deletion order: MinIO PDFs first, then Postgres rows.
+PDF objects still referenced by a work that is kept (content-addressed
+keys can be shared) are left in MinIO.
 Qdrant is not touched.
 python3 purge_ai_low.py --threshold 0.35
 
 """
 
-import os
 import sys
 import argparse
 from typing import List, Tuple, Dict
 
-import boto3
-import psycopg2
+# Connection settings (PG_*, MINIO_*) come from core.clients, env overrides allowed
+from core.clients import MINIO_BUCKET, pg_connection, s3_client
 
 
-# === Config (env overrides allowed) ===
-MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://192.168.0.17:9000")
-MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "adminsecret")
-MINIO_BUCKET = os.getenv("MINIO_BUCKET", "papers")
-
-PG_HOST = os.getenv("PG_HOST", "192.168.0.11")
-PG_DB = os.getenv("PG_DB", "raglab")
-PG_USER = os.getenv("PG_USER", "mike")
-PG_PASSWORD = os.getenv("PG_PASSWORD")
-
+# === Config ===
 # OpenAlex AI concept IDs sometimes appear with/without the full URI
 AI_IDS = ('https://openalex.org/C154945302', 'C154945302')
 
-if not PG_PASSWORD:
-    raise RuntimeError("❌ PG_PASSWORD environment variable not set.")
-
-# ---------- Clients ----------
-def s3_client():
-    return boto3.client(
-        "s3",
-        endpoint_url=MINIO_ENDPOINT,
-        aws_access_key_id=MINIO_ACCESS_KEY,
-        aws_secret_access_key=MINIO_SECRET_KEY,
-    )
-
-def pg_conn():
-    return psycopg2.connect(host=PG_HOST, dbname=PG_DB, user=PG_USER, password=PG_PASSWORD)
-
 # ---------- SQL ----------
 # We compute AI score from full_raw::jsonb->'concepts'
 AI_SCORE_CTE = """
@@ -76,7 +52,7 @@ def fetch_counts(threshold: float) -> Dict[str, int]:
       COUNT(*) AS total
     FROM scores;
     """
-    with pg_conn() as conn, conn.cursor() as cur:
+    with pg_connection() as conn, conn.cursor() as cur:
         cur.execute(sql, (list(AI_IDS), threshold, threshold))
         row = cur.fetchone()
         return {"to_delete": row[0], "to_keep": row[1], "total": row[2]}
@@ -87,10 +63,23 @@ def fetch_candidates(threshold: float) -> List[Tuple[str, str]]:
     FROM scores
     WHERE ai_score < %s;
     """
-    with pg_conn() as conn, conn.cursor() as cur:
+    with pg_connection() as conn, conn.cursor() as cur:
         cur.execute(sql, (list(AI_IDS), threshold))
         return cur.fetchall()  # [(id, pdf_key), ...]
 
+def fetch_keys_still_referenced(keys: List[str], ids: List[str]) -> set:
+    """pdf_keys among `keys` that some work outside `ids` also points at."""
+    if not keys:
+        return set()
+    sql = """
+    SELECT DISTINCT pdf_key
+    FROM openalex_works
+    WHERE pdf_key = ANY(%s) AND NOT (id = ANY(%s));
+    """
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(sql, (keys, ids))
+        return {row[0] for row in cur.fetchall()}
+
 # ---------- MinIO ----------
 def delete_minio_objects(keys: List[str]) -> Tuple[int, List[str]]:
     """Delete objects in batches of 1000. Return (deleted_count, failed_keys)."""
@@ -120,7 +109,7 @@ def delete_postgres_rows(ids: List[str]) -> int:
     if not ids:
         return 0
     sql = "DELETE FROM openalex_works WHERE id = ANY(%s);"
-    with pg_conn() as conn, conn.cursor() as cur:
+    with pg_connection() as conn, conn.cursor() as cur:
         cur.execute(sql, (ids,))
         return cur.rowcount
 
@@ -158,11 +147,14 @@ def main():
         return
 
     ids_all = [w_id for (w_id, _) in candidates]
-    keys_all = [k for (_, k) in candidates if k]  # skip NULL/empty keys
-
-    # 1) Delete from MinIO
-    deleted_count, failed_keys = delete_minio_objects(keys_all)
-    print(f"🗂️ MinIO objects requested: {len(keys_all)}")
+    keys_all = sorted({k for (_, k) in candidates if k})  # skip NULL/empty keys, shared keys once
+
+    # 1) Delete from MinIO (keep objects a surviving work still points at)
+    kept_keys = fetch_keys_still_referenced(keys_all, ids_all)
+    if kept_keys:
+        print(f"♻️  Shared PDFs kept for surviving works: {len(kept_keys)}")
+    deleted_count, failed_keys = delete_minio_objects([k for k in keys_all if k not in kept_keys])
+    print(f"🗂️ MinIO objects requested: {len(keys_all) - len(kept_keys)}")
     print(f"🧽 MinIO objects deleted:  {deleted_count}")
     if failed_keys:
         print(f"⚠️ MinIO failed deletions: {len(failed_keys)}")
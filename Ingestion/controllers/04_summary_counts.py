@@ -1,32 +1,13 @@
 #!/usr/bin/env python3
-import os
-import boto3
-import psycopg2
+from core.clients import MINIO_BUCKET, pg_connection, s3_client
 
-# === MinIO Config ===
-MINIO_ENDPOINT = "192.168.0.17:9000"
-MINIO_ACCESS_KEY = "admin"
-MINIO_SECRET_KEY = "adminsecret"
-MINIO_BUCKET = "papers"
-
-# === Postgres Config ===
-PG_HOST = "192.168.0.11"
-PG_DB = "raglab"
-PG_USER = "mike"
-PG_PASSWORD = os.getenv("PG_PASSWORD")
-
-if not PG_PASSWORD:
-    raise RuntimeError("❌ PG_PASSWORD environment variable not set.")
+# Chunk counts cover the profile retrieval reads (core/chunking_profiles.py);
+# profiles still being built show up in utils/ChunkingProfiles.py list
+ACTIVE_PROFILE = "(SELECT id FROM chunking_profiles WHERE active)"
 
 # === Count PDFs in MinIO ===
 def count_pdfs_in_minio():
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=f"http://{MINIO_ENDPOINT}",
-        aws_access_key_id=MINIO_ACCESS_KEY,
-        aws_secret_access_key=MINIO_SECRET_KEY,
-    )
-    paginator = s3.get_paginator("list_objects_v2")
+    paginator = s3_client().get_paginator("list_objects_v2")
     page_iterator = paginator.paginate(Bucket=MINIO_BUCKET)
 
     count = 0
@@ -34,39 +15,35 @@ def count_pdfs_in_minio():
         count += page.get("KeyCount", 0)
     return count
 
-# === Postgres helpers ===
-def _pg_conn():
-    return psycopg2.connect(
-        host=PG_HOST, dbname=PG_DB, user=PG_USER, password=PG_PASSWORD
-    )
-
 # === Count JSON entries in Postgres ===
 def count_json_in_postgres():
-    with _pg_conn() as conn, conn.cursor() as cur:
+    with pg_connection() as conn, conn.cursor() as cur:
         cur.execute("SELECT COUNT(*) FROM openalex_works;")
         return cur.fetchone()[0]
 
 # === Count distinct chunked work_ids in Postgres ===
 def count_unique_chunked_papers():
-    with _pg_conn() as conn, conn.cursor() as cur:
-        cur.execute("SELECT COUNT(DISTINCT work_id) FROM chunks;")
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(DISTINCT work_id) FROM chunks WHERE profile_id = {ACTIVE_PROFILE};")
         return cur.fetchone()[0]
 
 # === Count distinct embedded work_ids (ANY chunk embedded) ===
 def count_any_embedded_papers():
-    with _pg_conn() as conn, conn.cursor() as cur:
-        cur.execute("SELECT COUNT(DISTINCT work_id) FROM chunks WHERE embedded = TRUE;")
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(DISTINCT work_id) FROM chunks "
+                    f"WHERE embedded = TRUE AND profile_id = {ACTIVE_PROFILE};")
         return cur.fetchone()[0]
 
 # === Count fully embedded papers (ALL chunks embedded) ===
 def count_fully_embedded_papers():
-    with _pg_conn() as conn, conn.cursor() as cur:
+    with pg_connection() as conn, conn.cursor() as cur:
         cur.execute(
-            """
+            f"""
             SELECT COUNT(*)
             FROM (
                 SELECT work_id
                 FROM chunks
+                WHERE profile_id = {ACTIVE_PROFILE}
                 GROUP BY work_id
                 HAVING BOOL_AND(embedded)  -- all chunks for this work_id are TRUE
             ) s;
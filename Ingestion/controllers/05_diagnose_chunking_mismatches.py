@@ -1,45 +1,34 @@
-import os
-import boto3
-import psycopg2
-
-# === Config ===
-MINIO_ENDPOINT = "http://192.168.0.17:9000"
-MINIO_ACCESS_KEY = "admin"
-MINIO_SECRET_KEY = "adminsecret"
-MINIO_BUCKET = "papers"
-
-PG_CONFIG = {
-    "host": "192.168.0.11",
-    "dbname": "raglab",
-    "user": "mike",
-    "password": os.getenv("PG_PASSWORD")
-}
-
-def connect_pg():
-    return psycopg2.connect(**PG_CONFIG)
+from core.chunking_profiles import get_profile
+from core.clients import MINIO_BUCKET, pg_connection, s3_client
 
 def main():
     print("🔍 Diagnosing chunking mismatches and cleaning up bad items...\n")
 
-    # Connect to Postgres
-    conn = connect_pg()
-    cur = conn.cursor()
+    with pg_connection() as conn, conn.cursor() as cur:
+        # === Get all work_ids chunked by the active profile ===
+        profile = get_profile(cur)
+        print(f"🗂️  Active chunking profile: {profile.id}")
+        cur.execute("SELECT DISTINCT work_id FROM chunks WHERE profile_id = %s;", (profile.id,))
+        chunked_ids = set(row[0] for row in cur.fetchall())
 
-    # === Get all work_ids in chunks table ===
-    cur.execute("SELECT DISTINCT work_id FROM chunks;")
-    chunked_ids = set(row[0] for row in cur.fetchall())
+        # Works whose PDF is shared with another work are chunked under the
+        # canonical ID only ('shared'), so they are not mismatches.
+        cur.execute("""
+            SELECT work_id FROM work_chunk_status WHERE profile_id = %s AND status = 'shared';
+        """, (profile.id,))
+        shared_ids = set(row[0] for row in cur.fetchall())
 
-    # === Get all ids from openalex_works ===
-    cur.execute("SELECT id FROM openalex_works;")
-    all_ids = set(row[0] for row in cur.fetchall())
+        # === Get all ids and their PDF keys from openalex_works ===
+        cur.execute("SELECT id, pdf_key FROM openalex_works;")
+        all_ids = set()
+        ids_by_key = {}
+        for wid, pdf_key in cur.fetchall():
+            all_ids.add(wid)
+            if pdf_key:
+                ids_by_key.setdefault(pdf_key, []).append(wid)
 
     # === Get all keys from MinIO ===
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=MINIO_ENDPOINT,
-        aws_access_key_id=MINIO_ACCESS_KEY,
-        aws_secret_access_key=MINIO_SECRET_KEY,
-    )
+    s3 = s3_client()
     paginator = s3.get_paginator("list_objects_v2")
     minio_ids = set()
     minio_keys = {}
@@ -47,40 +36,38 @@ def main():
         for obj in page.get("Contents", []):
             key = obj["Key"]
             if key.endswith(".pdf"):
-                base = os.path.splitext(os.path.basename(key))[0]
-                work_id = f"https://openalex.org/{base}"
-                minio_ids.add(work_id)
-                minio_keys[work_id] = key
-
-    cur.close()
+                for work_id in ids_by_key.get(key, []):
+                    minio_ids.add(work_id)
+                    minio_keys[work_id] = key
 
     # === Analysis ===
-    never_chunked = (all_ids & minio_ids) - chunked_ids
+    never_chunked = (all_ids & minio_ids) - chunked_ids - shared_ids
 
     print(f"🧠 Metadata entries        : {len(all_ids)}")
-    print(f"📦 PDFs in MinIO           : {len(minio_ids)}")
+    print(f"📦 Works with PDF in MinIO : {len(minio_ids)}")
     print(f"🧩 Already chunked works   : {len(chunked_ids)}")
+    print(f"♻️  Sharing another's chunks: {len(shared_ids)}")
     print(f"🕳️  PDFs + metadata but not chunked: {len(never_chunked)}")
 
     if never_chunked:
-        conn = connect_pg()
-        cur = conn.cursor()
-        for wid in sorted(never_chunked):
-            pdf_key = minio_keys.get(wid)
-            if pdf_key:
+        with pg_connection() as conn, conn.cursor() as cur:
+            for wid in sorted(never_chunked):
+                pdf_key = minio_keys.get(wid)
+                # Only drop the object if no surviving work still references it
+                still_used = [w for w in ids_by_key.get(pdf_key, []) if w not in never_chunked]
+                if pdf_key and not still_used:
+                    try:
+                        s3.delete_object(Bucket=MINIO_BUCKET, Key=pdf_key)
+                        print(f"🗑️  Deleted PDF from MinIO: {pdf_key}")
+                    except Exception as e:
+                        print(f"❌ Failed to delete {pdf_key} from MinIO: {e}")
+                elif pdf_key:
+                    print(f"♻️  Kept shared PDF {pdf_key} (used by {len(still_used)} other work(s))")
                 try:
-                    s3.delete_object(Bucket=MINIO_BUCKET, Key=pdf_key)
-                    print(f"🗑️  Deleted PDF from MinIO: {pdf_key}")
+                    cur.execute("DELETE FROM openalex_works WHERE id = %s;", (wid,))
+                    print(f"🧹 Deleted metadata for: {wid}")
                 except Exception as e:
-                    print(f"❌ Failed to delete {pdf_key} from MinIO: {e}")
-            try:
-                cur.execute("DELETE FROM openalex_works WHERE id = %s;", (wid,))
-                print(f"🧹 Deleted metadata for: {wid}")
-            except Exception as e:
-                print(f"❌ Failed to delete metadata for {wid}: {e}")
-        conn.commit()
-        cur.close()
-        conn.close()
+                    print(f"❌ Failed to delete metadata for {wid}: {e}")
 
     print("\n✅ Cleanup complete.")
 
@@ -1,49 +1,27 @@
 # ResetPipeline.py
-import boto3
-import psycopg2
-import os
 import argparse
-import requests
 
-# MinIO config
-MINIO_ENDPOINT = "http://192.168.0.17:9000"
-MINIO_ACCESS_KEY = "admin"
-MINIO_SECRET_KEY = "adminsecret"
-MINIO_BUCKET = "papers"
+from core.clients import (MINIO_BUCKET, MINIO_TEXT_BUCKET, QDRANT_ALIAS, QDRANT_COLLECTION,
+                          pg_connection, s3_client)
+from core.chunking_profiles import delete_alias, delete_collection, list_profiles
+from core.harvest_state import HarvestState
 
-# PostgreSQL config
-PG_CONFIG = {
-    "host": "192.168.0.11",
-    "dbname": "raglab",
-    "user": "mike",
-    "password": os.getenv("PG_PASSWORD")
-}
-
-# Qdrant config
-QDRANT_URL = "http://192.168.0.11:6333"
-QDRANT_COLLECTION = "openalex"
-
-def empty_minio_bucket():
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=MINIO_ENDPOINT,
-        aws_access_key_id=MINIO_ACCESS_KEY,
-        aws_secret_access_key=MINIO_SECRET_KEY,
-    )
+def empty_minio_bucket(bucket=MINIO_BUCKET):
+    s3 = s3_client()
     paginator = s3.get_paginator("list_objects_v2")
     total_deleted = 0
-    for page in paginator.paginate(Bucket=MINIO_BUCKET):
+    for page in paginator.paginate(Bucket=bucket):
         contents = page.get("Contents", [])
         if not contents:
             continue
         # Batch delete up to 1000 keys per request
         for i in range(0, len(contents), 1000):
             batch = [{"Key": obj["Key"]} for obj in contents[i:i+1000]]
-            s3.delete_objects(Bucket=MINIO_BUCKET, Delete={"Objects": batch})
+            s3.delete_objects(Bucket=bucket, Delete={"Objects": batch})
             total_deleted += len(batch)
-            print(f"🗑️  Deleted {total_deleted} objects from MinIO so far...")
+            print(f"🗑️  Deleted {total_deleted} objects from MinIO '{bucket}' so far...")
     if total_deleted == 0:
-        print("ℹ️  MinIO bucket already empty.")
+        print(f"ℹ️  MinIO bucket '{bucket}' already empty.")
 
 def reset(confirm=False):
     if not confirm:
@@ -52,17 +30,26 @@ def reset(confirm=False):
 
     print("🧨 Resetting pipeline...")
 
-    # Qdrant: delete embeddings collection
+    # Qdrant: the retrieval alias and every chunking profile's collection
+    collections = {QDRANT_COLLECTION}
     try:
-        resp = requests.delete(f"{QDRANT_URL}/collections/{QDRANT_COLLECTION}", timeout=30)
-        if resp.status_code in (200, 202):
-            print(f"🗑️  Qdrant: collection '{QDRANT_COLLECTION}' deleted.")
-        elif resp.status_code == 404:
-            print(f"ℹ️  Qdrant: collection '{QDRANT_COLLECTION}' not found (already gone).")
-        else:
-            print(f"❌ Qdrant delete returned {resp.status_code}: {resp.text}")
+        with pg_connection() as conn, conn.cursor() as cur:
+            collections.update(p.qdrant_collection for p in list_profiles(cur))
     except Exception as e:
-        print(f"❌ Qdrant delete error: {e}")
+        print(f"❌ Could not list chunking profiles (only '{QDRANT_COLLECTION}' will be deleted): {e}")
+    try:
+        if delete_alias():
+            print(f"🗑️  Qdrant: alias '{QDRANT_ALIAS}' deleted.")
+    except Exception as e:
+        print(f"❌ Qdrant alias delete error: {e}")
+    for collection in sorted(collections):
+        try:
+            if delete_collection(collection):
+                print(f"🗑️  Qdrant: collection '{collection}' deleted.")
+            else:
+                print(f"ℹ️  Qdrant: collection '{collection}' not found (already gone).")
+        except Exception as e:
+            print(f"❌ Qdrant delete error for '{collection}': {e}")
 
     # MinIO: delete ALL PDFs (paginated)
     try:
@@ -70,19 +57,31 @@ def reset(confirm=False):
     except Exception as e:
         print(f"❌ MinIO delete error: {e}")
 
-    # PostgreSQL: delete all metadata + chunks
+    # MinIO: extracted-text cache (keyed by PDF hash, useless once the PDFs are gone)
+    try:
+        empty_minio_bucket(MINIO_TEXT_BUCKET)
+    except Exception as e:
+        print(f"❌ MinIO text cache delete error: {e}")
+
+    # PostgreSQL: delete all metadata + chunks (chunking queue state cascades with the works;
+    # chunking profiles are kept, their collections are recreated by 10)
     try:
-        conn = psycopg2.connect(**PG_CONFIG)
-        cur = conn.cursor()
-        cur.execute("DELETE FROM chunks;")
-        cur.execute("DELETE FROM openalex_works;")
-        conn.commit()
-        cur.close()
-        conn.close()
+        with pg_connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM chunks;")
+            cur.execute("DELETE FROM openalex_works;")
         print("✅ All database entries wiped.")
     except Exception as e:
         print(f"❌ Postgres delete error: {e}")
 
+    # Harvest checkpoint: downloads it remembers are gone now, so 01 --resume may fetch them again
+    try:
+        state = HarvestState()
+        forgotten = state.forget_downloads()
+        state.close()
+        print(f"⏯️  Harvest checkpoint: {forgotten} downloaded works and all saved cursors forgotten.")
+    except Exception as e:
+        print(f"❌ Harvest checkpoint reset error: {e}")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--confirm", action="store_true", help="Actually perform the reset")
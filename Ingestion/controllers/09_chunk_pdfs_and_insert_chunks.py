@@ -1,201 +1,331 @@
 import os
-import fitz  # PyMuPDF
-import psycopg2
-import boto3
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from uuid import uuid4
 from datetime import datetime
 from io import BytesIO
+import io
+import csv
 import traceback
-import sys
+import time
+import argparse
+import multiprocessing
+from queue import Empty
 
-# === Config ===
-MINIO_ENDPOINT = "http://192.168.0.17:9000"
-MINIO_ACCESS_KEY = "admin"
-MINIO_SECRET_KEY = "adminsecret"
-MINIO_BUCKET = "papers"
+from core import chunk_queue, chunking_profiles, token_chunker
+from core.clients import MINIO_BUCKET, MINIO_TEXT_BUCKET, pg_connect, pg_connection, s3_client, log_metrics
+from core.pdf_extract import PageExtractor
+from core.text_cache import TextCache
 
+# === Config ===
 ERROR_LOG_PATH = "chunking_errors.log"
 
-PG_CONFIG = {
-    "host": "192.168.0.11",
-    "dbname": "raglab",
-    "user": "mike",
-    "password": os.getenv("PG_PASSWORD")
-}
-
-CHUNK_SIZE = 900
-CHUNK_OVERLAP = 200
-
-
-if not PG_CONFIG["password"]:
-    raise RuntimeError("❌ PG_PASSWORD not set.")
-
-# === Text Splitter ===
-splitter = RecursiveCharacterTextSplitter(
-    chunk_size=CHUNK_SIZE,
-    chunk_overlap=CHUNK_OVERLAP,
-    separators=["\n\n", "\n", ". ", " "]
-)
+# Stage 02 records pdf_text_ratio (share of sampled pages with extractable text);
+# below this there is nothing worth chunking
+MIN_TEXT_RATIO = 0.2
 
-# === MinIO Client ===
-s3 = boto3.client(
-    "s3",
-    endpoint_url=MINIO_ENDPOINT,
-    aws_access_key_id=MINIO_ACCESS_KEY,
-    aws_secret_access_key=MINIO_SECRET_KEY,
-)
+# === Worker pool ===
+WORKERS = os.cpu_count() or 4   # chunking processes per VM (run on more VMs to scale out)
+CLAIM_BATCH = 16                # works leased per claim (and written per COPY transaction)
+REPORT_EVERY = 30               # seconds between throughput reports
 
 # === Error Logging ===
 def log_error(message):
     with open(ERROR_LOG_PATH, "a", encoding="utf-8") as f:
         f.write(f"{datetime.utcnow().isoformat()} | {message}\n")
 
-# === Status Tracking ===
-def mark_status(work_id, status):
-    try:
-        conn = psycopg2.connect(**PG_CONFIG)
-        cur = conn.cursor()
-        cur.execute("UPDATE openalex_works SET chunking_status = %s WHERE id = %s;", (status, work_id))
-        conn.commit()
-        cur.close()
-        conn.close()
-    except Exception as e:
-        log_error(f"⚠️ Failed to update status for {work_id} to {status}: {e}")
-
-# === DB Checks ===
-def is_already_chunked(work_id):
-    conn = psycopg2.connect(**PG_CONFIG)
-    cur = conn.cursor()
-    cur.execute("SELECT 1 FROM chunks WHERE work_id = %s LIMIT 1;", (work_id,))
-    exists = cur.fetchone() is not None
-    cur.close()
-    conn.close()
-    return exists
-
-def work_id_exists(work_id):
-    conn = psycopg2.connect(**PG_CONFIG)
-    cur = conn.cursor()
-    cur.execute("SELECT 1 FROM openalex_works WHERE id = %s LIMIT 1;", (work_id,))
-    exists = cur.fetchone() is not None
-    cur.close()
-    conn.close()
-    return exists
-
 # === Chunk Inserter ===
-def insert_chunks(work_id, chunks, key):
-    try:
-        conn = psycopg2.connect(**PG_CONFIG)
-        cur = conn.cursor()
+COPY_SQL = """
+    COPY chunks (id, work_id, profile_id, chunk_index, text, char_start, char_end, token_count, embedded, created_at)
+    FROM STDIN WITH (FORMAT csv)
+"""
+
+def _copy_rows(cur, batch, profile_id, created_at):
+    """Stream every chunk of every work in batch through one COPY."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    for work_id, _, chunks in batch:
         for idx, chunk in enumerate(chunks):
-            clean_text = chunk['text'].replace('\x00', '')
-            chunk_id = str(uuid4())
-            cur.execute("""
-                INSERT INTO chunks (id, work_id, chunk_index, text, char_start, char_end, token_count, embedded, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, FALSE, %s);
-            """, (
-                chunk_id,
-                work_id,
-                idx,
-                clean_text,
-                chunk['start'],
-                chunk['end'],
-                chunk['tokens'],
-                datetime.utcnow()
+            writer.writerow((
+                uuid4(), work_id, profile_id, idx, chunk['text'].replace('\x00', ''),
+                chunk['start'], chunk['end'], chunk['tokens'], "f", created_at,
             ))
-        cur.execute("UPDATE openalex_works SET chunking_status = 'success' WHERE id = %s;", (work_id,))
+    buf.seek(0)
+    cur.copy_expert(COPY_SQL, buf)
+
+def insert_chunk_batch(batch, conn, queue):
+    """
+    batch = [(work_id, key, chunks)]. Marks the works 'success' with one
+    set-based UPDATE (only those whose lease we still hold) and COPYs their
+    chunks, all in one transaction. If the batch fails it is retried one
+    work at a time so each failure is logged and released per work.
+    Returns (written_works, written_chunks, failed_work_ids).
+    """
+    if not batch:
+        return 0, 0, []
+    created_at = datetime.utcnow().isoformat()
+    try:
+        with conn.cursor() as cur:
+            owned = queue.finish_many(cur, [work_id for work_id, _, _ in batch], chunk_queue.SUCCESS)
+            kept = [item for item in batch if item[0] in owned]
+            _copy_rows(cur, kept, queue.profile_id, created_at)
         conn.commit()
-        cur.close()
-        conn.close()
+        for work_id, key, _ in batch:
+            if work_id not in owned:
+                log_error(f"insert_chunks skipped {key} ({work_id}): lease lost to another worker")
+        return len(kept), sum(len(c) for _, _, c in kept), []
     except Exception as e:
-        log_error(f"insert_chunks failed for {key} ({work_id}): {e}")
-        mark_status(work_id, 'failed')
-        raise
+        conn.rollback()
+        if len(batch) == 1:
+            work_id, key, _ = batch[0]
+            log_error(f"insert_chunks failed for {key} ({work_id}): {e}")
+            queue.release(work_id, chunk_queue.FAILED)
+            return 0, 0, [work_id]
+
+    works = chunks = 0
+    failed = []
+    for item in batch:
+        w, c, f = insert_chunk_batch([item], conn, queue)
+        works += w
+        chunks += c
+        failed.extend(f)
+    return works, chunks, failed
 
 # === PDF Processor ===
-def extract_text_from_pdf_bytes(pdf_bytes, key):
+def extract_text_from_pdf_bytes(pdf_bytes, key, extractor):
+    """Returns (text, page_starts); page ranges run in the extractor's pool under its time/memory limits."""
     try:
-        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-            text = "\n".join(page.get_text() for page in doc)
-        return text.replace('\x00', '')
+        return extractor.extract(pdf_bytes, key)
     except Exception as e:
         log_error(f"extract_text_from_pdf_bytes failed for {key}: {e}")
         raise
 
-def process_pdf_from_minio(work_id, key):
+def text_from_minio(work_id, key, cache, extractor, refresh=False):
+    """
+    Text of one PDF (chunked later, a claim batch at a time). Served from the
+    extracted-text cache when present; otherwise fetched, extracted and cached.
+    """
     try:
-        response = s3.get_object(Bucket=MINIO_BUCKET, Key=key)
+        if not refresh:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached[0]
+        response = s3_client().get_object(Bucket=MINIO_BUCKET, Key=key)
         pdf_bytes = response['Body'].read()
-        raw_text = extract_text_from_pdf_bytes(pdf_bytes, key)
-        splits = splitter.create_documents([raw_text])
-        chunks = []
-        char_pos = 0
-        for doc in splits:
-            text = doc.page_content.replace('\x00', '')
-            length = len(text)
-            chunks.append({
-                "text": text,
-                "start": char_pos,
-                "end": char_pos + length,
-                "tokens": length // 4
-            })
-            char_pos += length - CHUNK_OVERLAP
-        insert_chunks(work_id, chunks, key)
+        text, page_starts = extract_text_from_pdf_bytes(pdf_bytes, key, extractor)
+        try:
+            cache.put(key, text, page_starts)
+        except Exception as e:
+            log_error(f"text cache put failed for {key} ({work_id}): {e}")
+        return text
     except Exception as e:
-        log_error(f"process_pdf_from_minio failed for {key} ({work_id}):\n{traceback.format_exc()}")
-        mark_status(work_id, 'failed')
+        log_error(f"text_from_minio failed for {key} ({work_id}):\n{traceback.format_exc()}")
         raise
 
-# === Reprocessing ===
-def get_failed_work_ids():
-    conn = psycopg2.connect(**PG_CONFIG)
-    cur = conn.cursor()
-    cur.execute("SELECT id, pdf_key FROM openalex_works WHERE chunking_status = 'failed';")
-    results = cur.fetchall()
-    cur.close()
-    conn.close()
-    return results
-
-def reprocess_failed():
-    failed_items = get_failed_work_ids()
-    for work_id, key in failed_items:
-        print(f"🔁 Retrying: {key}")
-        try:
-            process_pdf_from_minio(work_id, key)
-            print(f"✅ Retry succeeded: {key}")
-        except Exception as e:
-            print(f"❌ Retry failed again for {key}: {e}")
+def chunk_extracted(extracted, queue, name, profile):
+    """
+    extracted = [(work_id, key, text)]. Tokenizes every text in one batched
+    call and packs chunks to the profile's token budget. Returns
+    ([(work_id, key, chunks)], failed_count).
+    """
+    if not extracted:
+        return [], 0
+    budget = token_chunker.chunk_budget(profile.max_tokens, profile.tokenizer)
+    settings = dict(budget=budget, overlap=profile.overlap_tokens, tokenizer=profile.tokenizer)
+    try:
+        per_doc = token_chunker.chunk_texts([text for _, _, text in extracted], **settings)
+    except Exception:
+        # One bad document shouldn't sink the batch: retry individually
+        per_doc = []
+        for work_id, key, text in extracted:
+            try:
+                per_doc.append(token_chunker.chunk_text(text, **settings))
+            except Exception:
+                log_error(f"chunk_extracted failed for {key} ({work_id}):\n{traceback.format_exc()}")
+                per_doc.append(None)
+
+    batch = []
+    failed = 0
+    for (work_id, key, _), chunks in zip(extracted, per_doc):
+        if chunks is None:
+            failed += 1
+            queue.release(work_id, chunk_queue.FAILED)
+            continue
+        batch.append((work_id, key, chunks))
+        tokens = sum(c["tokens"] for c in chunks)
+        print(f"🧩 [{name}] {work_id.split('/')[-1]}: {len(chunks)} chunks, {tokens} tokens")
+    return batch, failed
+
+# === Worker ===
+def chunk_worker(index, profile, lease_seconds, report_q, refresh_text=False):
+    """One chunking process: claim → fetch → extract → insert until the profile's queue is empty."""
+    # The worker's queue connection holds its claims across transactions, so it is
+    # dedicated rather than pooled; s3_client() is built fresh in each forked process
+    conn = pg_connect()
+    cache = TextCache(s3_client(), MINIO_TEXT_BUCKET, profile.extractor)
+    extractor = PageExtractor()
+    queue = chunk_queue.ChunkQueue(conn, chunk_queue.worker_id(index), profile.id, lease_seconds=lease_seconds)
+    name = f"w{index:02d}"
+    done = failed = skipped = chunks_total = 0
+    started = time.time()
+
+    try:
+        while True:
+            claimed = queue.claim(CLAIM_BATCH)
+            if not claimed:
+                break
+            canonical = queue.canonical_ids({key for _, key, _ in claimed})
+            remaining = [work_id for work_id, _, _ in claimed]
+            extracted = []
+
+            for work_id, key, ratio in claimed:
+                remaining.remove(work_id)
+                short_id = work_id.split("/")[-1]
+
+                # One object may back several works; it is chunked once under the canonical ID
+                if canonical.get(key, work_id) != work_id:
+                    queue.release(work_id, chunk_queue.SHARED)
+                    skipped += 1
+                    continue
+
+                # Trust the stats stage 02 recorded instead of downloading a known image-only PDF
+                if ratio is not None and ratio < MIN_TEXT_RATIO:
+                    print(f"⚠️  [{name}] Skipping (no extractable text, ratio {ratio}): {short_id}")
+                    queue.release(work_id, chunk_queue.NO_TEXT)
+                    skipped += 1
+                    continue
+
+                try:
+                    extracted.append((work_id, key, text_from_minio(work_id, key, cache, extractor, refresh_text)))
+                except Exception as e:
+                    failed += 1
+                    print(f"❌ [{name}] Error processing {short_id}: {e}")
+                    queue.release(work_id, chunk_queue.FAILED)
+                # Lease renewal also covers works extracted but not yet written
+                queue.renew(remaining + [w for w, _, _ in extracted])
+
+            batch, chunk_failed = chunk_extracted(extracted, queue, name, profile)
+            failed += chunk_failed
+
+            # One transaction per claim batch: COPY all chunks + one status UPDATE
+            w, c, f = insert_chunk_batch(batch, conn, queue)
+            done += w
+            chunks_total += c
+            failed += len(f)
+            print(f"✅ [{name}] Wrote {w} works / {c} chunks" + (f" ({len(f)} failed)" if f else ""))
+            report_q.put((name, done, failed, skipped, chunks_total, time.time() - started, False))
+    finally:
+        report_q.put((name, done, failed, skipped, chunks_total, time.time() - started, True))
+        conn.close()
+        extractor.close()
+        print(f"📚 [{name}] Text cache: {cache.summary()}; extraction: {extractor.summary()}")
+        log_metrics(f"🔌 [{name}] Clients")
+
+def print_report(stats, started):
+    elapsed = max(time.time() - started, 1e-6)
+    total_done = sum(s[1] for s in stats.values())
+    total_chunks = sum(s[4] for s in stats.values())
+    print(f"\n📊 {len(stats)} workers — {total_done} works, {total_chunks} chunks in {elapsed:.0f}s "
+          f"({total_done / elapsed:.2f} works/s, {total_chunks / elapsed:.1f} chunks/s)")
+    for name, (_, done, failed, skipped, chunks, w_elapsed, finished) in sorted(stats.items()):
+        rate = done / max(w_elapsed, 1e-6)
+        print(f"   {name}: {done} done, {failed} failed, {skipped} skipped, {chunks} chunks — "
+              f"{rate:.2f} works/s{' (finished)' if finished else ''}")
 
 # === Full Run ===
-def process_all_pdfs():
-    paginator = s3.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=MINIO_BUCKET):
-        for obj in page.get("Contents", []):
-            key = obj["Key"]
-            if not key.endswith(".pdf"):
-                continue
-
-            short_id = os.path.splitext(os.path.basename(key))[0]
-            work_id = f"https://openalex.org/{short_id}"
-
-            if is_already_chunked(work_id):
-                print(f"⏭️  Already chunked: {short_id}")
-                continue
-
-            if not work_id_exists(work_id):
-                print(f"⚠️  Skipping (missing in Postgres): {short_id}")
-                continue
-
-            print(f"🔍 Processing: {short_id} ...")
-            try:
-                process_pdf_from_minio(work_id, key)
-                print(f"✅ Done: {short_id}")
-            except Exception as e:
-                print(f"❌ Error processing {short_id}: {e}")
+def load_profile(profile_id=None):
+    """
+    The profile to build: profile_id, or the active one if it can be built,
+    else the newest token profile. 09 only builds token profiles.
+    """
+    with pg_connection() as conn, conn.cursor() as cur:
+        if profile_id is None:
+            profile = chunking_profiles.build_profile(cur)
+            if not profile.active:
+                print(f"ℹ️  Active profile is frozen; building the newest token profile '{profile.id}'")
+            return profile
+        profile = chunking_profiles.get_profile(cur, profile_id)
+    chunking_profiles.check_buildable(profile)
+    return profile
+
+def process_all_pdfs(profile, workers=WORKERS, lease_seconds=chunk_queue.LEASE_SECONDS, refresh_text=False):
+    if workers > 1:
+        # Parallelism comes from the worker processes; stop each tokenizer spawning a thread per core too
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    TextCache(s3_client(), MINIO_TEXT_BUCKET).ensure_bucket()
+
+    # Candidates are selected in Postgres (works with a pdf_key and no queue row for this
+    # profile), not by listing the bucket; CheckMinIOOrphans.py reconciles MinIO vs the DB
+    enqueue_started = time.time()
+    with pg_connection() as conn:
+        queue = chunk_queue.ChunkQueue(conn, chunk_queue.worker_id(), profile.id)
+        added = queue.enqueue_new()
+        requeued = queue.requeue_orphaned_shared()
+        counts = queue.counts()
+    if requeued:
+        print(f"♻️  Requeued {requeued} shared works whose canonical work produced no chunks")
+    print(f"📥 Queued {added} new works in {time.time() - enqueue_started:.1f}s; "
+          f"open: {counts.get(chunk_queue.PENDING, 0)} pending, {counts.get(chunk_queue.PROCESSING, 0)} processing")
+    if not counts.get(chunk_queue.PENDING) and not counts.get(chunk_queue.PROCESSING):
+        print("🎉 Nothing to chunk.")
+        return
+
+    report_q = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=chunk_worker, args=(i, profile, lease_seconds, report_q, refresh_text),
+                                name=f"chunker-{i}")
+        for i in range(workers)
+    ]
+    print(f"🚀 Starting {workers} chunking workers on {chunk_queue.worker_id()} for profile '{profile.id}'"
+          f"{' (active)' if profile.active else ''}")
+    started = time.time()
+    for p in procs:
+        p.start()
+
+    stats = {}
+    finished = 0
+    last_report = time.time()
+    while finished < workers:
+        try:
+            msg = report_q.get(timeout=5)
+        except Empty:
+            if not any(p.is_alive() for p in procs):
+                break
+            continue
+        stats[msg[0]] = msg
+        if msg[-1]:
+            finished += 1
+        if time.time() - last_report >= REPORT_EVERY:
+            print_report(stats, started)
+            last_report = time.time()
+
+    for p in procs:
+        p.join()
+    print_report(stats, started)
+
+    with pg_connection() as conn:
+        print(f"🗂️  Queue state: {chunk_queue.ChunkQueue(conn, chunk_queue.worker_id(), profile.id).counts()}")
+
+def requeue_failed(profile):
+    with pg_connection() as conn:
+        n = chunk_queue.ChunkQueue(conn, chunk_queue.worker_id(), profile.id).requeue_failed()
+    print(f"🔁 Re-queued {n} failed works for profile '{profile.id}'")
 
 # === Run ===
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == "--retry-failed":
-        reprocess_failed()
-    else:
-        process_all_pdfs()
\ No newline at end of file
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profile", help="Chunking profile to build (default: the active one, or the newest "
+                                      "token profile while 'legacy' is active); see utils/ChunkingProfiles.py")
+    ap.add_argument("--workers", type=int, default=WORKERS, help="Chunking processes on this VM")
+    ap.add_argument("--lease", type=int, default=chunk_queue.LEASE_SECONDS, help="Lease length in seconds")
+    ap.add_argument("--retry-failed", action="store_true", help="Re-queue failed works, then run the workers")
+    ap.add_argument("--refresh-text", action="store_true",
+                    help="Ignore the extracted-text cache: re-extract every PDF and overwrite its entry")
+    args = ap.parse_args()
+
+    try:
+        profile = load_profile(args.profile)
+    except chunking_profiles.ProfileError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    if args.retry_failed:
+        requeue_failed(profile)
+    process_all_pdfs(profile, workers=args.workers, lease_seconds=args.lease, refresh_text=args.refresh_text)
@@ -1,35 +1,38 @@
 #!/usr/bin/env python3
 import os
+import argparse
+import threading
 import time
 import uuid
-import requests
-import psycopg2
-import psycopg2.extras
+from concurrent.futures import ThreadPoolExecutor, wait
+from queue import Queue
+
+import numpy as np
+import orjson
+
+from core.chunk_queue import worker_id
+from core.chunking_profiles import get_profile
+from core.clients import QDRANT_URL, pg_connect, pg_connection, http_session, log_metrics
+from core.embed_pool import EmbedPool
+from core.embed_queue import EmbedQueue, LEASE_SECONDS
 
 # === Config ===
-PG_CONFIG = dict(
-    host="192.168.0.11",
-    dbname="raglab",
-    user="mike",
-    password=os.getenv("PG_PASSWORD"),
-)
-EMBED_ENDPOINT = os.getenv("EMBED_ENDPOINT", "http://lab-1-embed01:8000/embed")
-QDRANT_URL = "http://192.168.0.11:6333"
-QDRANT_COLLECTION = "openalex"
-
-BATCH_SIZE = 1000         # total chunks to process per loop
+BATCH_SIZE = 1000         # chunks leased per claim (several clients can run at once)
 EMBED_CHUNK_SIZE = 256    # per request to embed server
 QDRANT_CHUNK_SIZE = 512   # per upsert to Qdrant
-SLEEP_BETWEEN_BATCHES = 0 # seconds
+
+# === Pipeline ===
+EMBED_IN_FLIGHT = int(os.getenv("EMBED_IN_FLIGHT", "0"))  # concurrent embed requests (0 = 2 per replica)
+PIPELINE_DEPTH = 2        # claimed batches queued behind the one being written
+RENEW_FRACTION = 1 / 3    # renew held leases every third of the lease while batches wait
+REPORT_EVERY = 60         # seconds between per-replica throughput reports
 
 # If the existing collection has a different vector size, should we drop & recreate?
 QDRANT_RECREATE_ON_SIZE_MISMATCH = False
 
-if not PG_CONFIG["password"]:
-    raise RuntimeError("❌ PG_PASSWORD not set.")
-
 # === ADDED: lightweight retry helper ===
-def retry(fn, *, tries=5, delay=2, backoff=2, exceptions=(Exception,)):
+def retry(fn, *, tries=5, delay=2, backoff=2, exceptions=(Exception,), on_retry=None):
+    """Call fn with exponential backoff; on_retry() runs before every retry (after the sleep)."""
     def _wrapped(*a, **kw):
         t, d = tries, delay
         while True:
@@ -41,56 +44,21 @@ def retry(fn, *, tries=5, delay=2, backoff=2, exceptions=(Exception,)):
                     raise
                 time.sleep(d)
                 d *= backoff
+                if on_retry is not None:
+                    on_retry()
     return _wrapped
 
 # === DB helpers ===
-def get_conn():
-    return psycopg2.connect(**PG_CONFIG)
-
-def fetch_unembedded(limit):
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-            SELECT id::text, work_id, text
-            FROM chunks
-            WHERE embedded = FALSE
-            ORDER BY created_at
-            LIMIT %s;
-        """, (limit,))
-        return cur.fetchall()
-
-def mark_embedded(ids):
-    if not ids:
-        return
-    with get_conn() as conn, conn.cursor() as cur:
-        psycopg2.extras.execute_values(
-            cur,
-            """
-            UPDATE chunks AS c
-            SET embedded = TRUE
-            FROM (VALUES %s) AS v(id)
-            WHERE c.id = v.id::uuid;
-            """,
-            [(i,) for i in ids],
-            template=None
-        )
-        conn.commit()
-
-# === Embedding & Qdrant helpers ===
-@retry   
-def embed_texts(texts):
-    r = requests.post(EMBED_ENDPOINT, json={"texts": texts}, timeout=600)
-    r.raise_for_status()
-    data = r.json()
-    # Accept both batch {vectors:[...]} and single {embedding:[...]}
-    if isinstance(data, dict) and "vectors" in data:
-        return data["vectors"]
-    if isinstance(data, dict) and "embedding" in data:
-        return [data["embedding"]]
-    raise ValueError(f"Unexpected embed response keys: {list(data)[:5]}")
-def ensure_collection(vector_size):
+def load_profile(profile_id=None):
+    """Profile whose chunks to embed (active one by default)."""
+    with pg_connection() as conn, conn.cursor() as cur:
+        return get_profile(cur, profile_id)
+
+# === Qdrant helpers ===
+def ensure_collection(collection, vector_size):
     """Ensure Qdrant collection exists with the given vector size."""
-    base = f"{QDRANT_URL}/collections/{QDRANT_COLLECTION}"
-    r = requests.get(base, timeout=10)
+    base = f"{QDRANT_URL}/collections/{collection}"
+    r = http_session().get(base, timeout=10)
     if r.status_code == 200:
         info = r.json().get("result", {})
         current_size = None
@@ -103,38 +71,39 @@ def ensure_collection(vector_size):
                     current_size = v["size"]
                     break
         if current_size is not None and current_size != vector_size:
-            msg = (f"⚠️  Collection '{QDRANT_COLLECTION}' exists with size={current_size}, "
+            msg = (f"⚠️  Collection '{collection}' exists with size={current_size}, "
                    f"but embeddings are size={vector_size}.")
             if QDRANT_RECREATE_ON_SIZE_MISMATCH:
                 print(msg + " Recreating collection...")
-                rd = requests.delete(base, timeout=30)
+                rd = http_session().delete(base, timeout=30)
                 rd.raise_for_status()
-                _create_collection(base, vector_size)
+                _create_collection(base, collection, vector_size)
                 return
             else:
                 raise RuntimeError(msg + " Set QDRANT_RECREATE_ON_SIZE_MISMATCH=True to auto-fix.")
         return
     if r.status_code != 404:
         r.raise_for_status()
-    _create_collection(base, vector_size)
+    _create_collection(base, collection, vector_size)
 
-def _create_collection(base_url, vector_size):
+def _create_collection(base_url, collection, vector_size):
     create_payload = {
         "vectors": {
             "size": vector_size,
             "distance": "Cosine"
         }
     }
-    r = requests.put(base_url, json=create_payload, timeout=30)
+    r = http_session().put(base_url, json=create_payload, timeout=30)
     r.raise_for_status()
-    print(f"🆕 Created Qdrant collection '{QDRANT_COLLECTION}' with size={vector_size}, distance=Cosine")
+    print(f"🆕 Created Qdrant collection '{collection}' with size={vector_size}, distance=Cosine")
 
-@retry  # ADDED
-def upsert_points(points):
+def upsert_points(collection, points):
     # ADDED: ?wait=true ensures write durability before we mark embedded
-    r = requests.put(
-        f"{QDRANT_URL}/collections/{QDRANT_COLLECTION}/points?wait=true",
-        json={"points": points},
+    # Vectors are float32 NumPy rows; orjson writes them without a round trip through Python floats
+    r = http_session().put(
+        f"{QDRANT_URL}/collections/{collection}/points?wait=true",
+        data=orjson.dumps({"points": points}, option=orjson.OPT_SERIALIZE_NUMPY),
+        headers={"Content-Type": "application/json"},
         timeout=120
     )
     r.raise_for_status()
@@ -144,80 +113,182 @@ def chunked(iterable, size):
         yield iterable[i:i+size]
 
 # === Core processing ===
-def process_batch():
-    rows = fetch_unembedded(BATCH_SIZE)
-    if not rows:
-        return 0
-
-    print(f"📦 Fetched {len(rows)} chunks from Postgres...")
-    start_time = time.time()
-
-    ids, work_ids, texts = zip(*rows)
-    vectors = []
-
-    count = 0
-    for sub in chunked(list(texts), EMBED_CHUNK_SIZE):
-        emb = embed_texts(sub)
-        vectors.extend(emb)
-        count += len(sub)
-        print(f"   Embedded {count}/{len(rows)} chunks...")
-
-    # ADDED: sanity check
-    if len(vectors) != len(rows):
-        raise RuntimeError(f"Embedding count mismatch: got {len(vectors)} for {len(rows)} inputs")
-
-    # Ensure collection with the correct vector size (infer from first vector)
-    vec_size = len(vectors[0])
-    ensure_collection(vec_size)
-
-    # Build points (same order as inputs)
-    points = []
-    for i, vec in enumerate(vectors):
-        points.append({
-            "id": ids[i],     # UUID string is fine
-            "vector": vec,    # single unnamed vector
-            "payload": {
-                "work_id": work_ids[i],
-                "chunk_id": ids[i],
-                "source": "openalex",
-            },
-        })
-
-    # Upsert in chunks (wait=true inside upsert_points); only mark after all succeed
-    sent = 0
-    for sub in chunked(points, QDRANT_CHUNK_SIZE):
-        upsert_points(sub)
-        sent += len(sub)
-        if sent % 1000 == 0 or sent == len(points):
-            print(f"   Uploaded {sent}/{len(points)} to Qdrant...")
-
-    # Only now mark embedded
-    mark_embedded(ids)
-
-    elapsed = time.time() - start_time
-    print(f"✅ Done: {len(rows)} chunks embedded and uploaded in {elapsed:.2f} sec")
-    if elapsed > 0:
-        rate = len(rows)/elapsed
-        print(f"⚡ {rate:.2f} chunks/sec")
-    return len(rows)
-
-def main():
+def build_points(profile, rows, vectors):
+    """Qdrant points for rows = [(chunk_id, work_id, text)], in the same order as vectors."""
+    return [{
+        "id": chunk_id,   # UUID string is fine
+        "vector": vec,    # single unnamed vector
+        "payload": {
+            "work_id": work_id,
+            "chunk_id": chunk_id,
+            "profile_id": profile.id,
+            "source": "openalex",
+        },
+    } for (chunk_id, work_id, _), vec in zip(rows, vectors)]
+
+class EmbedPipeline:
+    """
+    claim (main thread) → embed (EMBED_IN_FLIGHT requests in a thread pool,
+    spread over the embed replicas by EmbedPool) → upsert + mark (writer thread, one batch at a time, in claim order).
+
+    The embed server works on the next batches while the writer talks to
+    Qdrant and Postgres, and the next claim happens while both are busy.
+    At most PIPELINE_DEPTH claimed batches wait for the writer. While it
+    waits for embeddings, the writer renews the leases of every claimed,
+    unwritten batch each RENEW_FRACTION of the lease, so a slow replica
+    doesn't let another client claim them. The writer upserts a batch with wait=true
+    and only then marks its chunks embedded: as before, a chunk is marked
+    only once its vectors are durable. A failed batch is released and stops
+    the pipeline; batches behind it are released unwritten.
+    """
+
+    def __init__(self, profile, claims, marks, embedder, dim):
+        self.profile = profile
+        self.embedder = embedder      # EmbedPool
+        self.claims = claims          # EmbedQueue on the main thread's connection
+        self.marks = marks            # same owner, writer thread's own connection
+        self.dim = dim
+        self.embed_pool = ThreadPoolExecutor(max_workers=EMBED_IN_FLIGHT or embedder.in_flight,
+                                             thread_name_prefix="embed")
+        self.batches = Queue(maxsize=PIPELINE_DEPTH)
+        self.held = {}                # id(rows) -> chunk ids claimed and not yet finished or released
+        self.held_lock = threading.Lock()
+        self.renew_every = marks.lease_seconds * RENEW_FRACTION
+        self.last_renew = time.time()
+        self.writer = threading.Thread(target=self._write, name="embed-writer", daemon=True)
+        self.error = None
+        self.written = 0
+        self.started = time.time()
+        self.last_report = self.started
+
+    def run(self):
+        """Drain the profile's backlog; returns chunks written. Re-raises the first batch failure."""
+        self.writer.start()
+        try:
+            while self.error is None:
+                rows = self.claims.claim(BATCH_SIZE)
+                if not rows:
+                    break
+                texts = [text for _, _, text in rows]
+                futures = [self.embed_pool.submit(self.embedder.embed, sub)
+                           for sub in chunked(texts, EMBED_CHUNK_SIZE)]
+                print(f"📦 Claimed {len(rows)} chunks ({len(futures)} embed requests queued)")
+                with self.held_lock:
+                    self.held[id(rows)] = [chunk_id for chunk_id, _, _ in rows]
+                self.batches.put((rows, futures))   # blocks while PIPELINE_DEPTH batches wait
+        finally:
+            self.batches.put(None)
+            self.writer.join()
+            self.embed_pool.shutdown(wait=True, cancel_futures=True)
+        if self.error is not None:
+            raise self.error
+        return self.written
+
+    def _write(self):
+        while True:
+            item = self.batches.get()
+            if item is None:
+                return
+            rows, futures = item
+            ids = [chunk_id for chunk_id, _, _ in rows]
+            if self.error is not None:
+                self._drop(ids, futures)
+            else:
+                try:
+                    self._write_batch(rows, ids, futures)
+                except Exception as e:
+                    print(f"❌ Batch of {len(rows)} chunks failed: {e}")
+                    self.error = e
+                    self._drop(ids, futures)
+            with self.held_lock:
+                self.held.pop(id(rows), None)
+
+    def _renew_held(self, force=False):
+        """Renew the leases of every claimed batch not yet written (this one and those queued behind it)."""
+        if not force and time.time() - self.last_renew < self.renew_every:
+            return
+        with self.held_lock:
+            ids = [chunk_id for batch in self.held.values() for chunk_id in batch]
+        try:
+            self.marks.renew(ids)
+        except Exception as e:
+            print(f"⚠️  Could not renew leases of {len(ids)} chunks: {e}")
+        self.last_renew = time.time()
+
+    def _vectors(self, futures):
+        """Wait for a batch's embeddings, renewing held leases meanwhile."""
+        self._renew_held()
+        while wait(futures, timeout=self.renew_every)[1]:
+            self._renew_held(force=True)
+        return np.concatenate([f.result() for f in futures])
+
+    def _write_batch(self, rows, ids, futures):
+        vectors = self._vectors(futures)
+        if len(vectors) != len(rows):
+            raise RuntimeError(f"Embedding count mismatch: got {len(vectors)} for {len(rows)} inputs")
+        if vectors.shape[1] != self.dim:
+            raise RuntimeError(f"Embedding size changed: got {vectors.shape[1]}, collection has {self.dim}")
+
+        # Upsert in chunks (wait=true inside upsert_points); only mark after all succeed.
+        # Retries back off for up to ~30s on top of the request timeouts, so held leases
+        # are renewed between sub-batches and before every retry.
+        upsert = retry(upsert_points, on_retry=lambda: self._renew_held(force=True))
+        for sub in chunked(build_points(self.profile, rows, vectors), QDRANT_CHUNK_SIZE):
+            self._renew_held()
+            upsert(self.profile.qdrant_collection, sub)
+        marked = self.marks.finish(ids)
+        if marked != len(ids):
+            print(f"⚠️  {len(ids) - marked} chunks had lost their lease (re-embedded by another client)")
+
+        self.written += len(rows)
+        elapsed = max(time.time() - self.started, 1e-6)
+        print(f"✅ Wrote {len(rows)} chunks — {self.written} total, {self.written / elapsed:.2f} chunks/sec")
+        if time.time() - self.last_report >= REPORT_EVERY:
+            log_metrics()
+            self.embedder.log_stats()
+            self.last_report = time.time()
+
+    def _drop(self, ids, futures):
+        """Give a batch back unwritten so another client (or the next run) picks it up."""
+        for f in futures:
+            f.cancel()
+        try:
+            self.marks.release(ids)
+        except Exception as e:
+            print(f"⚠️  Could not release {len(ids)} chunks (their leases will expire): {e}")
+
+def main(profile_id=None, lease_seconds=LEASE_SECONDS):
+    profile = load_profile(profile_id)
+    # Dedicated connections: claims keep their keyset position, and the writer
+    # thread marks chunks on its own connection under the same lease owner
+    owner = worker_id()
+    conn, write_conn = pg_connect(), pg_connect()
+    queue = EmbedQueue(conn, owner, profile.id, lease_seconds=lease_seconds)
+    print(f"🗂️  Embedding profile '{profile.id}' into '{profile.qdrant_collection}'"
+          f"{' (active)' if profile.active else ''}")
+    embedder = EmbedPool()
+    print(f"🧠 {len(embedder.replicas)} embed replica(s), {EMBED_IN_FLIGHT or embedder.in_flight} requests in flight")
     try:
-        probe_vec = embed_texts(["probe"])[0]
-        ensure_collection(len(probe_vec))
+        probe_vec = embedder.embed(["probe"])[0]
+        ensure_collection(profile.qdrant_collection, len(probe_vec))
         print(f"🧪 Embed/vector-size probe OK: dim={len(probe_vec)}")
     except Exception as e:
         raise RuntimeError(f"Failed startup probe/ensure_collection: {e}")
 
-    total_processed = 0
-    while True:
-        processed = process_batch()
-        if processed == 0:
-            print("🎉 All chunks embedded.")
-            break
-        total_processed += processed
-        print(f"📊 Total processed so far: {total_processed}")
-        time.sleep(SLEEP_BETWEEN_BATCHES)
+    print(f"📚 Backlog: {queue.backlog()} unembedded chunks")
+    pipeline = EmbedPipeline(profile, queue, EmbedQueue(write_conn, owner, profile.id, lease_seconds=lease_seconds),
+                             embedder, dim=len(probe_vec))
+    try:
+        written = pipeline.run()
+        print(f"🎉 All chunks embedded (or leased by other clients): {written} written by this client.")
+    finally:
+        conn.close()
+        write_conn.close()
+        embedder.log_stats()
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profile", help="Chunking profile to embed (default: the active one)")
+    ap.add_argument("--lease", type=int, default=LEASE_SECONDS, help="Lease length in seconds")
+    args = ap.parse_args()
+    main(args.profile, args.lease)
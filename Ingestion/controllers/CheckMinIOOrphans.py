@@ -1,38 +1,15 @@
 #!/usr/bin/env python3
-import os
 import sys
 import csv
 import argparse
 from typing import Dict, Set, Tuple, List
 
-import boto3
-import psycopg2
+# Connection settings (PG_*, MINIO_*) come from core.clients, env overrides allowed
+from core.clients import MINIO_BUCKET, pg_connection, s3_client
 
-# === Config (env overrides allowed) ===
-MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://192.168.0.17:9000")
-MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "adminsecret")
-MINIO_BUCKET = os.getenv("MINIO_BUCKET", "papers")
-
-PG_HOST = os.getenv("PG_HOST", "192.168.0.11")
-PG_DB = os.getenv("PG_DB", "raglab")
-PG_USER = os.getenv("PG_USER", "mike")
-PG_PASSWORD = os.getenv("PG_PASSWORD")
-
-if not PG_PASSWORD:
-    raise RuntimeError("❌ PG_PASSWORD environment variable not set.")
-
-# ---------- Clients ----------
-def s3_client():
-    return boto3.client(
-        "s3",
-        endpoint_url=MINIO_ENDPOINT,
-        aws_access_key_id=MINIO_ACCESS_KEY,
-        aws_secret_access_key=MINIO_SECRET_KEY,
-    )
-
-def pg_conn():
-    return psycopg2.connect(host=PG_HOST, dbname=PG_DB, user=PG_USER, password=PG_PASSWORD)
+# 09 selects chunking candidates from Postgres and never lists the bucket;
+# this is the separate (occasional) pass for objects with no DB row and vice versa
+DB_FETCH_BATCH = 10000
 
 # ---------- MinIO listing ----------
 def list_minio_objects(bucket: str) -> Tuple[Dict[str, int], int, int]:
@@ -55,23 +32,22 @@ def list_minio_objects(bucket: str) -> Tuple[Dict[str, int], int, int]:
     return sizes, total, total_bytes
 
 # ---------- Postgres ----------
-def fetch_db_pdf_keys() -> Tuple[Set[str], Dict[str, str]]:
+def fetch_db_pdf_keys() -> Tuple[Set[str], Dict[str, List[str]]]:
     """
     Returns:
       keys_in_db: set of pdf_key strings
-      id_by_key: map pdf_key -> id (for convenience/backrefs)
+      ids_by_key: map pdf_key -> [ids] (content-addressed PDFs can back several works)
     """
     sql = "SELECT id, pdf_key FROM openalex_works WHERE pdf_key IS NOT NULL;"
-    keys: Set[str] = set()
-    id_by_key: Dict[str, str] = {}
-    with pg_conn() as conn, conn.cursor() as cur:
+    ids_by_key: Dict[str, List[str]] = {}
+    # Server-side cursor: rows stream in batches instead of one client-side result set
+    with pg_connection() as conn, conn.cursor(name="orphan_pdf_keys") as cur:
+        cur.itersize = DB_FETCH_BATCH
         cur.execute(sql)
-        for _id, pdf_key in cur.fetchall():
+        for _id, pdf_key in cur:
             if pdf_key:
-                keys.add(pdf_key)
-                # If duplicates exist, last one wins; fine for reporting
-                id_by_key[pdf_key] = _id
-    return keys, id_by_key
+                ids_by_key.setdefault(pdf_key, []).append(_id)
+    return set(ids_by_key), ids_by_key
 
 # ---------- CSV helpers ----------
 def export_list(path: str, rows: List[List]):
@@ -107,7 +83,8 @@ def human_bytes(n: int) -> str:
 def main():
     ap = argparse.ArgumentParser(description="Reconcile MinIO objects with Postgres pdf_key references.")
     ap.add_argument("--export-prefix", type=str, default=None,
-                    help="If set, export CSVs: <prefix>_minio_orphans.csv and <prefix>_db_missing.csv")
+                    help="If set, export CSVs: <prefix>_minio_orphans.csv, <prefix>_db_missing.csv "
+                         "and <prefix>_shared_objects.csv")
     ap.add_argument("--delete-minio-orphans", action="store_true",
                     help="Delete MinIO objects that are not referenced in Postgres.")
     args = ap.parse_args()
@@ -119,8 +96,12 @@ def main():
     print(f"🗂️  MinIO objects in '{MINIO_BUCKET}': {minio_count} ({human_bytes(minio_bytes)})")
 
     # Load DB keys
-    db_keys, id_by_key = fetch_db_pdf_keys()
-    print(f"🧠 Postgres rows with pdf_key: {len(db_keys)}")
+    db_keys, ids_by_key = fetch_db_pdf_keys()
+    shared = {k: ids for k, ids in ids_by_key.items() if len(ids) > 1}
+    print(f"🧠 Postgres rows with pdf_key: {sum(len(ids) for ids in ids_by_key.values())} "
+          f"({len(db_keys)} distinct keys)")
+    print(f"♻️  Objects shared by several works: {len(shared)} "
+          f"(saving {human_bytes(sum(sizes_by_key.get(k, 0) * (len(ids) - 1) for k, ids in shared.items()))})")
 
     # Diff
     minio_keys: Set[str] = set(sizes_by_key.keys())
@@ -136,15 +117,19 @@ def main():
     if args.export_prefix:
         mo_path = f"{args.export_prefix}_minio_orphans.csv"
         dbm_path = f"{args.export_prefix}_db_missing.csv"
+        shared_path = f"{args.export_prefix}_shared_objects.csv"
 
         export_list(mo_path, [["key","size_bytes","size_human"]] +
                     [[k, sizes_by_key[k], human_bytes(sizes_by_key[k])] for k in minio_only])
-        export_list(dbm_path, [["pdf_key","id"]] +
-                    [[k, id_by_key.get(k, "")] for k in db_only])
+        export_list(dbm_path, [["pdf_key","ids"]] +
+                    [[k, ";".join(ids_by_key.get(k, []))] for k in db_only])
+        export_list(shared_path, [["pdf_key","works","ids"]] +
+                    [[k, len(ids), ";".join(ids)] for k, ids in sorted(shared.items())])
 
         print(f"\n💾 Exported:")
         print(f"   - MinIO orphans → {mo_path}")
         print(f"   - DB-missing    → {dbm_path}")
+        print(f"   - Shared        → {shared_path}")
 
     # Optional delete MinIO orphans
     if args.delete_minio_orphans and minio_only:
@@ -1,8 +1,7 @@
 #!/usr/bin/env python3
-import os, psycopg2
+from core.clients import pg_connection
 
-PG_CONFIG = dict(host="192.168.0.11", dbname="raglab", user="mike", password=os.getenv("PG_PASSWORD"))
-with psycopg2.connect(**PG_CONFIG) as conn, conn.cursor() as cur:
+with pg_connection() as conn, conn.cursor() as cur:
     cur.execute("SELECT COUNT(*) FROM chunks WHERE embedded = TRUE;")
     before = cur.fetchone()[0]
     print(f"🔧 Chunks with embedded=TRUE before: {before}")
@@ -1,15 +1,17 @@
 #!/usr/bin/env python3
 # Qdrant-only sanity: no calls to /embed
-import requests, os, random
+import os, random
 
-QURL = os.getenv("QDRANT_URL", "http://192.168.0.11:6333")
-COLL = os.getenv("QDRANT_COLLECTION", "openalex")
+from core.clients import QDRANT_URL, QDRANT_COLLECTION, http_session
+
+QURL = QDRANT_URL
+COLL = QDRANT_COLLECTION
 SAMPLE = int(os.getenv("SAMPLE", "100"))   # number of points to test
 TOPK = 3                                   # require self to be in top-1 (or relax to top-3)
 HNSW_EF = 256
 
 def qinfo():
-    r = requests.get(f"{QURL}/collections/{COLL}", timeout=15)
+    r = http_session().get(f"{QURL}/collections/{COLL}", timeout=15)
     r.raise_for_status()
     return r.json()["result"]
 
@@ -18,7 +20,7 @@ def scroll_with_vectors(n):
     while len(out) < n:
         body = {"limit": min(64, n - len(out)), "with_vector": True, "with_payload": True}
         if page: body["page"] = page
-        r = requests.post(f"{QURL}/collections/{COLL}/points/scroll", json=body, timeout=30)
+        r = http_session().post(f"{QURL}/collections/{COLL}/points/scroll", json=body, timeout=30)
         r.raise_for_status()
         j = r.json()["result"]
         out += j["points"]
@@ -27,7 +29,7 @@ def scroll_with_vectors(n):
     return out[:n]
 
 def search(vec, k=TOPK):
-    r = requests.post(
+    r = http_session().post(
         f"{QURL}/collections/{COLL}/points/search",
         json={"vector": vec, "limit": k, "params": {"hnsw_ef": HNSW_EF}},
         timeout=30
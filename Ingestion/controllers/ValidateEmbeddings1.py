@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 # Intra-paper clustering sanity for Qdrant (no /embed calls)
-import os, random, requests, collections
+import os, random, collections
 
-QURL = os.getenv("QDRANT_URL", "http://192.168.0.11:6333")
-COLL = os.getenv("QDRANT_COLLECTION", "openalex")
+from core.clients import QDRANT_URL, QDRANT_COLLECTION, http_session
+
+QURL = QDRANT_URL
+COLL = QDRANT_COLLECTION
 
 # Tuning knobs (env overrides welcome)
 NUM_PAPERS     = int(os.getenv("NUM_PAPERS", "20"))   # distinct work_ids to test
@@ -13,7 +15,7 @@ TOPK           = int(os.getenv("TOPK", "10"))         # neighbors to inspect
 HNSW_EF        = int(os.getenv("HNSW_EF", "256"))
 
 def qinfo():
-    r = requests.get(f"{QURL}/collections/{COLL}", timeout=15)
+    r = http_session().get(f"{QURL}/collections/{COLL}", timeout=15)
     r.raise_for_status()
     return r.json()["result"]
 
@@ -26,7 +28,7 @@ def scroll_points(n=1000, with_vector=False, with_payload=True):
         body = {"limit": min(256, need), "with_vector": with_vector, "with_payload": with_payload}
         if page:
             body["page"] = page
-        r = requests.post(f"{QURL}/collections/{COLL}/points/scroll", json=body, timeout=30)
+        r = http_session().post(f"{QURL}/collections/{COLL}/points/scroll", json=body, timeout=30)
         r.raise_for_status()
         j = r.json()["result"]
         out += j["points"]
@@ -36,7 +38,7 @@ def scroll_points(n=1000, with_vector=False, with_payload=True):
     return out
 
 def fetch_points(ids, with_vector=True, with_payload=True):
-    r = requests.post(
+    r = http_session().post(
         f"{QURL}/collections/{COLL}/points",
         json={"ids": ids, "with_vector": with_vector, "with_payload": with_payload},
         timeout=30
@@ -47,7 +49,7 @@ def fetch_points(ids, with_vector=True, with_payload=True):
     return {str(p["id"]): p for p in got}
 
 def search(vec, k=TOPK):
-    r = requests.post(
+    r = http_session().post(
         f"{QURL}/collections/{COLL}/points/search",
         json={
             "vector": vec,
@@ -0,0 +1,217 @@
+"""
+Postgres-backed work queue for chunking workers, one queue per chunking
+profile (core/chunking_profiles.py).
+
+Queue state lives in work_chunk_status, one row per (work, profile), so
+several profiles can be built side by side without touching each other.
+Candidates come from the database, never from listing the bucket: at the
+start of a run enqueue_new() adds a 'pending' row for every work with a
+pdf_key that the profile hasn't seen, in one set-based INSERT ... SELECT.
+Workers then claim pending rows (and rows whose lease ran out: crashed
+worker, lost VM) with FOR UPDATE SKIP LOCKED, so any number of worker
+processes, on any number of VMs, can pull from the same queue without
+handing out a work twice. A claim only touches the partial index of open
+rows, however many works are already done. Works that have burned through
+MAX_ATTEMPTS leases are marked 'failed' instead of being retried forever.
+
+Works that share one PDF object are chunked once, under a canonical work
+(canonical_ids()); the others finish as 'shared'. If that canonical work
+ends without chunks, requeue_orphaned_shared() puts them back at the start
+of the next run.
+
+Needs Database/migrations/004_chunking_profiles.sql.
+"""
+
+import os
+import socket
+
+LEASE_SECONDS = 15 * 60
+MAX_ATTEMPTS = 3
+CLAIM_BATCH = 16
+
+# Statuses a worker leaves behind
+SUCCESS = "success"
+FAILED = "failed"
+SHARED = "shared"
+NO_TEXT = "no_text"
+PENDING = "pending"
+PROCESSING = "processing"
+
+
+def worker_id(index=None) -> str:
+    suffix = f"/{index}" if index is not None else ""
+    return f"{socket.gethostname()}:{os.getpid()}{suffix}"
+
+
+class ChunkQueue:
+    def __init__(self, conn, owner, profile_id, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.conn = conn
+        self.owner = owner
+        self.profile_id = profile_id
+        self.lease = f"{int(lease_seconds)} seconds"
+        self.max_attempts = max_attempts
+
+    def enqueue_new(self):
+        """Queue every work with a PDF that this profile has no row for. Returns the number added."""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO work_chunk_status (work_id, profile_id, status)
+                SELECT w.id, %s, %s FROM openalex_works w
+                WHERE w.pdf_key IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM work_chunk_status s
+                                  WHERE s.profile_id = %s AND s.work_id = w.id)
+                ON CONFLICT DO NOTHING;
+            """, (self.profile_id, PENDING, self.profile_id))
+            n = cur.rowcount
+        self.conn.commit()
+        return n
+
+    def claim(self, n=CLAIM_BATCH):
+        """Lease up to n works. Returns [(work_id, pdf_key, pdf_text_ratio)]."""
+        with self.conn.cursor() as cur:
+            # Expired leases that are out of attempts won't be handed out again
+            cur.execute("""
+                UPDATE work_chunk_status
+                SET status = %s, lease_owner = NULL, lease_expires = NULL, updated_at = now()
+                WHERE profile_id = %s AND status = %s AND lease_expires < now() AND attempts >= %s;
+            """, (FAILED, self.profile_id, PROCESSING, self.max_attempts))
+            cur.execute("""
+                WITH claimed AS (
+                    SELECT work_id FROM work_chunk_status
+                    WHERE profile_id = %s
+                      AND (status = %s OR (status = %s AND lease_expires < now()))
+                    ORDER BY work_id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE work_chunk_status s
+                SET status = %s,
+                    lease_owner = %s,
+                    lease_expires = now() + %s::interval,
+                    attempts = s.attempts + 1,
+                    updated_at = now()
+                FROM claimed
+                WHERE s.profile_id = %s AND s.work_id = claimed.work_id
+                RETURNING s.work_id;
+            """, (self.profile_id, PENDING, PROCESSING, n, PROCESSING, self.owner, self.lease, self.profile_id))
+            ids = [row[0] for row in cur.fetchall()]
+            rows = []
+            if ids:
+                cur.execute("""
+                    SELECT id, pdf_key, pdf_text_ratio FROM openalex_works WHERE id = ANY(%s);
+                """, (ids,))
+                rows = cur.fetchall()
+        self.conn.commit()
+        return sorted(rows)
+
+    def canonical_ids(self, pdf_keys):
+        """
+        pdf_key -> the work whose chunks every work sharing the object reuses.
+        Only works this profile may still chunk count: one already chunked
+        ('success') wins, then the earliest claimed one being chunked, then
+        the lowest ID. A key whose works all ended without chunks is absent,
+        so a later claim chunks the object itself instead of being 'shared'.
+        """
+        if not pdf_keys:
+            return {}
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT DISTINCT ON (w.pdf_key) w.pdf_key, w.id
+                FROM openalex_works w
+                JOIN work_chunk_status s ON s.profile_id = %s AND s.work_id = w.id
+                WHERE w.pdf_key = ANY(%s) AND s.status IN (%s, %s, %s)
+                ORDER BY w.pdf_key,
+                         s.status <> %s,
+                         s.status <> %s,
+                         CASE WHEN s.status = %s THEN s.updated_at END,
+                         w.id;
+            """, (self.profile_id, list(pdf_keys), SUCCESS, PROCESSING, PENDING,
+                  SUCCESS, PROCESSING, PROCESSING))
+            return dict(cur.fetchall())
+
+    def requeue_orphaned_shared(self):
+        """
+        Put 'shared' works back in the queue when no work sharing their
+        object is chunked or still queued (it failed, had no text or was
+        deleted). Returns the number requeued.
+        """
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE work_chunk_status s
+                SET status = %s, attempts = 0, lease_owner = NULL, lease_expires = NULL, updated_at = now()
+                FROM openalex_works w
+                WHERE s.profile_id = %s AND s.status = %s AND w.id = s.work_id
+                  AND NOT EXISTS (
+                      SELECT 1 FROM openalex_works o
+                      JOIN work_chunk_status c ON c.profile_id = s.profile_id AND c.work_id = o.id
+                      WHERE o.pdf_key = w.pdf_key AND o.id <> w.id AND c.status IN (%s, %s, %s));
+            """, (PENDING, self.profile_id, SHARED, SUCCESS, PROCESSING, PENDING))
+            n = cur.rowcount
+        self.conn.commit()
+        return n
+
+    def renew(self, work_ids):
+        """Push the expiry out for works this worker still holds."""
+        if not work_ids:
+            return
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE work_chunk_status SET lease_expires = now() + %s::interval
+                WHERE profile_id = %s AND work_id = ANY(%s) AND lease_owner = %s AND status = %s;
+            """, (self.lease, self.profile_id, list(work_ids), self.owner, PROCESSING))
+        self.conn.commit()
+
+    def finish(self, cur, work_id, status=SUCCESS) -> bool:
+        """
+        Set the final status inside the caller's transaction. Returns False if
+        the lease was lost to another worker, in which case the caller must
+        roll back rather than commit duplicate chunks.
+        """
+        cur.execute("""
+            UPDATE work_chunk_status
+            SET status = %s, lease_owner = NULL, lease_expires = NULL, updated_at = now()
+            WHERE profile_id = %s AND work_id = %s AND lease_owner = %s;
+        """, (status, self.profile_id, work_id, self.owner))
+        return cur.rowcount == 1
+
+    def finish_many(self, cur, work_ids, status=SUCCESS):
+        """Set-based finish() for a batch; returns the subset whose lease this worker still held."""
+        if not work_ids:
+            return set()
+        cur.execute("""
+            UPDATE work_chunk_status
+            SET status = %s, lease_owner = NULL, lease_expires = NULL, updated_at = now()
+            WHERE profile_id = %s AND work_id = ANY(%s) AND lease_owner = %s
+            RETURNING work_id;
+        """, (status, self.profile_id, list(work_ids), self.owner))
+        return {row[0] for row in cur.fetchall()}
+
+    def release(self, work_id, status):
+        """Finish a work that produced no chunks (failed / shared / no_text)."""
+        with self.conn.cursor() as cur:
+            ok = self.finish(cur, work_id, status)
+        self.conn.commit()
+        return ok
+
+    def requeue_failed(self):
+        """Put every failed work back in the queue with fresh attempts."""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE work_chunk_status
+                SET status = %s, attempts = 0, lease_owner = NULL, lease_expires = NULL, updated_at = now()
+                WHERE profile_id = %s AND status = %s;
+            """, (PENDING, self.profile_id, FAILED))
+            n = cur.rowcount
+        self.conn.commit()
+        return n
+
+    def counts(self):
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT status, COUNT(*) FROM work_chunk_status
+                WHERE profile_id = %s GROUP BY status;
+            """, (self.profile_id,))
+            counts = dict(cur.fetchall())
+            cur.execute("SELECT COUNT(*) FROM openalex_works WHERE pdf_key IS NOT NULL;")
+            counts["unqueued"] = cur.fetchone()[0] - sum(counts.values())
+        return counts
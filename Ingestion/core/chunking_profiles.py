@@ -0,0 +1,233 @@
+"""
+Chunking profiles: several chunkings of the corpus, side by side.
+
+A profile (row in chunking_profiles, Database/migrations/004) pins what a
+chunk is: splitter, tokenizer, token budget and overlap, and the text
+EXTRACTOR version. Chunks carry profile_id, queue state is kept per
+(work, profile) in work_chunk_status, and every profile embeds into its own
+Qdrant collection. A new profile is therefore built incrementally next to
+the live one (09 --profile, 10 --profile) without touching it.
+
+Retrieval reads QDRANT_ALIAS, never a collection name. activate() moves the
+alias to the profile's collection and flips chunking_profiles.active in the
+same step, so switching profiles is a pointer flip, and switching back is
+one too while the old profile's chunks and vectors are kept. Right after
+migration 004, ensure_alias() (utils/ChunkingProfiles.py init) points the
+alias at the legacy collection.
+
+'legacy' is the 900/200-character langchain chunking that predates
+profiles; it can still serve retrieval but can no longer be built.
+"""
+
+from collections import namedtuple
+
+from core.clients import QDRANT_ALIAS, QDRANT_URL, http_session
+from core.text_cache import EXTRACTOR
+from core import token_chunker
+
+LEGACY = "legacy"
+
+Profile = namedtuple("Profile", "id splitter tokenizer max_tokens overlap_tokens extractor qdrant_collection active")
+
+_COLUMNS = "id, splitter, tokenizer, max_tokens, overlap_tokens, extractor, qdrant_collection, active"
+
+
+class ProfileError(RuntimeError):
+    pass
+
+
+def profile_id(tokenizer=token_chunker.TOKENIZER_NAME, max_tokens=token_chunker.MAX_SEQ_LEN,
+               overlap_tokens=token_chunker.OVERLAP_TOKENS, extractor=EXTRACTOR) -> str:
+    """Readable ID derived from the settings, e.g. nomic-embed-text-v1-512o64-pymupdf-text-v1."""
+    model = tokenizer.rstrip("/").split("/")[-1].lower()
+    return f"{model}-{max_tokens}o{overlap_tokens}-{extractor}"
+
+
+def collection_for(pid) -> str:
+    return f"openalex__{pid}"
+
+
+# === Lookups ===
+def get_profile(cur, pid=None) -> Profile:
+    """Profile pid, or the active profile when pid is None."""
+    if pid is None:
+        cur.execute(f"SELECT {_COLUMNS} FROM chunking_profiles WHERE active;")
+    else:
+        cur.execute(f"SELECT {_COLUMNS} FROM chunking_profiles WHERE id = %s;", (pid,))
+    row = cur.fetchone()
+    if row is None:
+        raise ProfileError(f"No chunking profile {pid!r}" if pid else "No active chunking profile")
+    return Profile(*row)
+
+
+def list_profiles(cur):
+    cur.execute(f"SELECT {_COLUMNS} FROM chunking_profiles ORDER BY created_at;")
+    return [Profile(*row) for row in cur.fetchall()]
+
+
+def check_buildable(profile):
+    """09 can only build token profiles extracted with the current EXTRACTOR."""
+    if profile.splitter != "tokens":
+        raise ProfileError(f"Profile {profile.id!r} ({profile.splitter} splitter) is frozen; "
+                           f"create a token profile with utils/ChunkingProfiles.py create")
+    if profile.extractor != EXTRACTOR:
+        raise ProfileError(f"Profile {profile.id!r} was extracted with {profile.extractor}; "
+                           f"this tree extracts with {EXTRACTOR}")
+
+
+def build_profile(cur):
+    """
+    Profile 09 builds without --profile: the active one if it can be built,
+    else the newest buildable token profile (after migration 004 the active
+    'legacy' profile is frozen). Raises ProfileError if there is none.
+    """
+    active = get_profile(cur)
+    candidates = [active] + [p for p in reversed(list_profiles(cur)) if p.id != active.id]
+    for profile in candidates:
+        try:
+            check_buildable(profile)
+            return profile
+        except ProfileError:
+            continue
+    raise ProfileError(f"The active profile {active.id!r} ({active.splitter} splitter) can't be built and there "
+                       f"is no token profile for {EXTRACTOR}: create one with "
+                       f"'python utils/ChunkingProfiles.py create', then rerun (or pass --profile <id>)")
+
+
+def profile_status(cur, pid):
+    """{'chunks', 'unembedded', 'works': {status: n}} for one profile."""
+    cur.execute("""
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE NOT embedded)
+        FROM chunks WHERE profile_id = %s;
+    """, (pid,))
+    chunks, unembedded = cur.fetchone()
+    cur.execute("""
+        SELECT status, COUNT(*) FROM work_chunk_status
+        WHERE profile_id = %s GROUP BY status;
+    """, (pid,))
+    works = dict(cur.fetchall())
+    cur.execute("SELECT COUNT(*) FROM openalex_works WHERE pdf_key IS NOT NULL;")
+    works["unqueued"] = cur.fetchone()[0] - sum(works.values())
+    return {"chunks": chunks, "unembedded": unembedded, "works": works}
+
+
+# === Changes ===
+def create_profile(cur, tokenizer=token_chunker.TOKENIZER_NAME, max_tokens=token_chunker.MAX_SEQ_LEN,
+                   overlap_tokens=token_chunker.OVERLAP_TOKENS, pid=None) -> Profile:
+    pid = pid or profile_id(tokenizer, max_tokens, overlap_tokens)
+    cur.execute("""
+        INSERT INTO chunking_profiles (id, splitter, tokenizer, max_tokens, overlap_tokens, extractor, qdrant_collection)
+        VALUES (%s, 'tokens', %s, %s, %s, %s, %s)
+        ON CONFLICT (id) DO NOTHING;
+    """, (pid, tokenizer, max_tokens, overlap_tokens, EXTRACTOR, collection_for(pid)))
+    return get_profile(cur, pid)
+
+
+def alias_target(alias=QDRANT_ALIAS):
+    """Collection alias currently points at, or None."""
+    r = http_session().get(f"{QDRANT_URL}/aliases", timeout=10)
+    r.raise_for_status()
+    for a in r.json().get("result", {}).get("aliases", []):
+        if a.get("alias_name") == alias:
+            return a.get("collection_name")
+    return None
+
+
+def point_alias(collection, alias=QDRANT_ALIAS):
+    """Atomically (re)point alias at collection (one change_aliases call)."""
+    actions = [{"create_alias": {"collection_name": collection, "alias_name": alias}}]
+    if alias_target(alias) is not None:
+        actions.insert(0, {"delete_alias": {"alias_name": alias}})
+    r = http_session().post(f"{QDRANT_URL}/collections/aliases", json={"actions": actions}, timeout=30)
+    r.raise_for_status()
+
+
+def delete_alias(alias=QDRANT_ALIAS):
+    """Remove alias if it exists. Returns True if it did."""
+    if alias_target(alias) is None:
+        return False
+    r = http_session().post(f"{QDRANT_URL}/collections/aliases",
+                            json={"actions": [{"delete_alias": {"alias_name": alias}}]}, timeout=30)
+    r.raise_for_status()
+    return True
+
+
+def delete_collection(collection):
+    """Drop a Qdrant collection. Returns False if it didn't exist."""
+    r = http_session().delete(f"{QDRANT_URL}/collections/{collection}", timeout=60)
+    if r.status_code == 404:
+        return False
+    r.raise_for_status()
+    return True
+
+
+def empty_collection(profile):
+    """
+    Recreate the profile's collection with no points and the same vector
+    config, so a rebuild doesn't leave the old chunk IDs' vectors behind
+    (09 gives every chunk a fresh ID). The alias is put back if the profile
+    is active. Returns False if the collection didn't exist.
+    """
+    base = f"{QDRANT_URL}/collections/{profile.qdrant_collection}"
+    r = http_session().get(base, timeout=10)
+    if r.status_code == 404:
+        return False
+    r.raise_for_status()
+    vectors = r.json()["result"]["config"]["params"]["vectors"]
+    delete_collection(profile.qdrant_collection)     # takes any alias on it along
+    http_session().put(base, json={"vectors": vectors}, timeout=60).raise_for_status()
+    if profile.active:
+        point_alias(profile.qdrant_collection)
+    return True
+
+
+def ensure_alias(cur, alias=QDRANT_ALIAS):
+    """Create alias on the active profile's collection if it doesn't exist yet; returns its target."""
+    target = alias_target(alias)
+    if target is None:
+        target = get_profile(cur).qdrant_collection
+        point_alias(target, alias)
+    return target
+
+
+def activate(conn, pid, force=False) -> Profile:
+    """
+    Make pid the profile retrieval reads. Refuses a profile that is still
+    being built (open works or unembedded chunks) unless force is set.
+    The Qdrant alias moves inside the Postgres transaction: if it fails,
+    the active flag is rolled back with it.
+    """
+    with conn.cursor() as cur:
+        profile = get_profile(cur, pid)
+        if not force:
+            status = profile_status(cur, pid)
+            open_works = sum(status["works"].get(s, 0) for s in ("unqueued", "pending", "processing"))
+            if open_works or status["unembedded"]:
+                raise ProfileError(f"Profile {pid!r} is not fully built: {open_works} works to chunk, "
+                                   f"{status['unembedded']} chunks to embed (use --force to switch anyway)")
+        cur.execute("UPDATE chunking_profiles SET active = false WHERE active AND id <> %s;", (pid,))
+        cur.execute("UPDATE chunking_profiles SET active = true WHERE id = %s;", (pid,))
+        try:
+            point_alias(profile.qdrant_collection)
+        except Exception:
+            conn.rollback()
+            raise
+    conn.commit()
+    return profile._replace(active=True)
+
+
+def drop_profile(conn, pid):
+    """
+    Delete an inactive profile: its chunks, queue state and Qdrant
+    collection. Returns the number of chunks deleted.
+    """
+    with conn.cursor() as cur:
+        profile = get_profile(cur, pid)
+        if profile.active:
+            raise ProfileError(f"Profile {pid!r} is active; activate another profile first")
+        cur.execute("DELETE FROM chunks WHERE profile_id = %s;", (pid,))
+        deleted = cur.rowcount
+        cur.execute("DELETE FROM chunking_profiles WHERE id = %s;", (pid,))   # cascades to work_chunk_status
+    conn.commit()
+    delete_collection(profile.qdrant_collection)
+    return deleted
@@ -0,0 +1,209 @@
+"""
+Shared Postgres / MinIO / HTTP clients for Ingestion controllers and utils.
+
+One place for connection settings (env overrides, same defaults the
+scripts used to hardcode) and for reusing connections instead of opening
+one per call:
+
+  pg_connection()   context manager over a ThreadedConnectionPool; commits
+                    on success, rolls back on error, returns the connection
+  pg_connect()      a dedicated connection (named cursors, long
+                    transactions, per-process workers) with the same
+                    keepalive / statement_timeout settings
+  s3_client()       one boto3 client per process, connection pool sized
+                    for concurrent transfers
+  http_session()    one requests.Session per process for Qdrant and the
+                    embed server (keep-alive, pooled, retried on 502/503/504);
+                    embed replicas behind EMBED_ENDPOINTS go through
+                    core/embed_pool.py instead
+
+Every client is tagged application_name=ingestion:<script>, so connections
+show up per script in pg_stat_activity (Monitoring/postgres_metrics.sh);
+client_metrics() / log_metrics() report what this process has open.
+
+Clients are cached per PID: a forked worker builds its own instead of
+sharing sockets with its parent.
+"""
+
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+# === Postgres ===
+PG_HOST = os.getenv("PG_HOST", "192.168.0.11")
+PG_PORT = int(os.getenv("PG_PORT", "5432"))
+PG_DB = os.getenv("PG_DB", "raglab")
+PG_USER = os.getenv("PG_USER", "mike")
+PG_PASSWORD = os.getenv("PG_PASSWORD")
+PG_POOL_MIN = 1
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "8"))
+PG_STATEMENT_TIMEOUT_MS = int(os.getenv("PG_STATEMENT_TIMEOUT_MS", str(15 * 60 * 1000)))
+
+# === MinIO ===
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://192.168.0.17:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "adminsecret")
+MINIO_BUCKET = os.getenv("MINIO_BUCKET", "papers")
+MINIO_TEXT_BUCKET = os.getenv("MINIO_TEXT_BUCKET", "papers-text")   # extracted-text cache (core/text_cache.py)
+S3_MAX_POOL = int(os.getenv("S3_MAX_POOL", "32"))
+
+# === Qdrant / embed server ===
+QDRANT_URL = os.getenv("QDRANT_URL", "http://192.168.0.11:6333")
+QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "openalex")
+QDRANT_ALIAS = os.getenv("QDRANT_ALIAS", "openalex-active")   # what retrieval queries (core/chunking_profiles.py)
+EMBED_ENDPOINT = os.getenv("EMBED_ENDPOINT", "http://lab-1-embed01:8000/embed")
+# Comma-separated embed-server replicas (core/embed_pool.py); defaults to the single EMBED_ENDPOINT
+EMBED_ENDPOINTS = [u.strip() for u in os.getenv("EMBED_ENDPOINTS", EMBED_ENDPOINT).split(",") if u.strip()]
+HTTP_POOL = int(os.getenv("HTTP_POOL", "16"))
+
+APP_NAME = "ingestion:" + os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+
+_lock = threading.Lock()
+_pid = None
+_pool = None
+_s3 = None
+_http = None
+_metrics = {"pg_dedicated": 0, "pg_checkouts": 0, "s3_clients": 0, "http_sessions": 0}
+
+
+def _reset_if_forked():
+    """Drop clients inherited from a parent process (their sockets belong to it)."""
+    global _pid, _pool, _s3, _http
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _pool = _s3 = _http = None
+        for k in _metrics:
+            _metrics[k] = 0
+
+
+def pg_params(**overrides):
+    params = dict(
+        host=PG_HOST, port=PG_PORT, dbname=PG_DB, user=PG_USER, password=PG_PASSWORD,
+        application_name=APP_NAME,
+        # Detect dead peers (VM reboot, NAT drop) instead of hanging on a half-open socket
+        keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=5,
+        connect_timeout=10,
+        options=f"-c statement_timeout={PG_STATEMENT_TIMEOUT_MS}",
+    )
+    params.update(overrides)
+    if not params["password"]:
+        raise RuntimeError("❌ PG_PASSWORD environment variable not set.")
+    return params
+
+
+def pg_connect(**overrides):
+    """A dedicated connection; the caller closes it."""
+    import psycopg2
+
+    with _lock:
+        _reset_if_forked()
+        _metrics["pg_dedicated"] += 1
+    return psycopg2.connect(**pg_params(**overrides))
+
+
+def pg_pool():
+    global _pool
+    from psycopg2.pool import ThreadedConnectionPool
+
+    with _lock:
+        _reset_if_forked()
+        if _pool is None:
+            _pool = ThreadedConnectionPool(PG_POOL_MIN, PG_POOL_MAX, **pg_params())
+        return _pool
+
+
+@contextmanager
+def pg_connection():
+    """Borrow a pooled connection: commit on success, roll back on error."""
+    pool = pg_pool()
+    conn = pool.getconn()
+    with _lock:
+        _metrics["pg_checkouts"] += 1
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken or bool(conn.closed))
+
+
+def s3_client():
+    global _s3
+    import boto3
+    from botocore.config import Config
+
+    with _lock:
+        _reset_if_forked()
+        if _s3 is None:
+            _s3 = boto3.client(
+                "s3",
+                endpoint_url=MINIO_ENDPOINT,
+                aws_access_key_id=MINIO_ACCESS_KEY,
+                aws_secret_access_key=MINIO_SECRET_KEY,
+                config=Config(
+                    max_pool_connections=S3_MAX_POOL,
+                    tcp_keepalive=True,
+                    retries={"max_attempts": 5, "mode": "standard"},
+                ),
+            )
+            _metrics["s3_clients"] += 1
+        return _s3
+
+
+def http_session():
+    global _http
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    with _lock:
+        _reset_if_forked()
+        if _http is None:
+            session = requests.Session()
+            # urllib3's default allowed_methods: only idempotent verbs (GET/PUT/DELETE/...) are
+            # retried, so a POST that reached the server is never replayed behind the caller's back
+            retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                          raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL, pool_maxsize=HTTP_POOL, max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http = session
+            _metrics["http_sessions"] += 1
+        return _http
+
+
+# === Metrics ===
+def client_metrics() -> dict:
+    with _lock:
+        out = dict(_metrics, pid=os.getpid(), app=APP_NAME)
+        if _pool is not None:
+            # ThreadedConnectionPool keeps idle conns in _pool and checked-out ones in _used
+            out["pg_pool_in_use"] = len(_pool._used)
+            out["pg_pool_idle"] = len(_pool._pool)
+            out["pg_pool_max"] = _pool.maxconn
+    return out
+
+
+def log_metrics(prefix="🔌 Clients"):
+    m = client_metrics()
+    pool = (f"pool {m['pg_pool_in_use']} in use / {m['pg_pool_idle']} idle (max {m['pg_pool_max']})"
+            if "pg_pool_max" in m else "pool unused")
+    print(f"{prefix} [{m['app']} pid {m['pid']}]: Postgres {pool}, {m['pg_checkouts']} checkouts, "
+          f"{m['pg_dedicated']} dedicated; {m['s3_clients']} S3 client(s); {m['http_sessions']} HTTP session(s)")
+
+
+def close_all():
+    global _pool, _http
+    with _lock:
+        if _pool is not None and _pid == os.getpid():
+            _pool.closeall()
+        if _http is not None and _pid == os.getpid():
+            _http.close()
+        _pool = _http = None
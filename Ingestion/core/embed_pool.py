@@ -0,0 +1,297 @@
+"""
+Client for a pool of embed-server replicas (EMBED_ENDPOINTS).
+
+Each request goes to the replica with the lowest expected finish time,
+(outstanding requests + 1) x its recent seconds per text, so load spreads
+by what each replica already has in flight and how fast it has been.
+Adding a process on lab-1-embed01 or another VM is a matter of listing
+its URL in EMBED_ENDPOINTS.
+
+A replica leaves rotation after FAILS_TO_EJECT consecutive failures, or
+when its latency per text runs SLOW_FACTOR times the fastest replica's.
+It sits out a cool-down that doubles with each repeat (EJECT_SECONDS up to
+EJECT_MAX) and comes back only once GET /health answers. Only what says
+the replica is down counts as a failure: connection errors, timeouts and
+502/503/504. Those requests are retried on another replica. A 4xx is the
+batch's fault and goes straight back to the caller. Any other 500 (or an
+unreadable response) is tried once more on a different replica and raised
+if it happens there too. Neither marks the replica down, so one poison
+batch can't walk the pool and eject every healthy replica.
+
+stats() / log_stats() report requests, texts, errors, throughput and
+state per replica.
+
+Vectors come back as a float32 NumPy array (n, dim). With EMBED_WIRE=f32
+(the default) the client asks for the binary response (BINARY_TYPE: an
+<n, dim> uint32 header then little-endian float32) and decodes it with
+np.frombuffer, no float parsing at all; a server that only speaks JSON
+answers JSON and is decoded from that. EMBED_WIRE=json always asks for
+JSON. Either way the values are the model's float32 output.
+"""
+
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+import orjson
+import requests
+
+from core.clients import EMBED_ENDPOINTS
+
+EMBED_TIMEOUT = 600            # seconds per embed request
+HEALTH_TIMEOUT = 5
+FAILS_TO_EJECT = 2             # consecutive failures before a replica leaves rotation
+EJECT_SECONDS = 30             # first cool-down; doubles per repeat
+EJECT_MAX = 600
+SLOW_FACTOR = 3.0              # seconds/text vs the fastest replica before it's taken out
+MIN_SAMPLES = 5                # requests before a replica's speed is judged
+EWMA_ALPHA = 0.2
+IN_FLIGHT_PER_REPLICA = 2      # default concurrent requests per replica
+DOWN_STATUSES = (502, 503, 504)  # replica (or its proxy) down: fail over and count toward ejection
+SERVER_ERROR_TRIES = 2         # replicas a batch that gets 500s is tried on before it is rejected
+
+# === Wire format ===
+EMBED_WIRE = os.getenv("EMBED_WIRE", "f32")      # f32 | json
+BINARY_TYPE = "application/x-embeddings-f32"
+_HEADER = struct.Struct("<II")                   # n, dim
+
+
+class NoHealthyReplica(RuntimeError):
+    pass
+
+
+class EmbedRequestError(RuntimeError):
+    """The replicas rejected this batch (4xx, or a 500 on more than one replica); retrying won't help."""
+
+
+def parse_embeddings(data):
+    """Vectors from a JSON embed response ({embeddings}, {vectors} or a single {embedding})."""
+    if isinstance(data, dict):
+        for key in ("embeddings", "vectors"):
+            if key in data:
+                return np.asarray(data[key], dtype=np.float32)
+        if "embedding" in data:
+            return np.asarray([data["embedding"]], dtype=np.float32)
+    raise ValueError(f"Unexpected embed response keys: {list(data)[:5]}")
+
+
+def decode_f32(body):
+    """(n, dim) float32 array from a BINARY_TYPE body (read-only view, no copy)."""
+    n, dim = _HEADER.unpack_from(body)
+    if len(body) != _HEADER.size + 4 * n * dim:
+        raise ValueError(f"Binary embed response is {len(body)} bytes, expected {_HEADER.size + 4 * n * dim}")
+    return np.frombuffer(body, dtype="<f4", count=n * dim, offset=_HEADER.size).reshape(n, dim)
+
+
+def decode_response(r):
+    if r.headers.get("Content-Type", "").startswith(BINARY_TYPE):
+        return decode_f32(r.content)
+    return parse_embeddings(orjson.loads(r.content))
+
+
+def health_url(endpoint):
+    """http://host:8000/embed -> http://host:8000/health"""
+    return endpoint.rstrip("/").rsplit("/", 1)[0] + "/health"
+
+
+class Replica:
+    def __init__(self, url):
+        self.url = url
+        self.health_url = health_url(url)
+        self.outstanding = 0
+        self.requests = 0
+        self.texts = 0
+        self.errors = 0
+        self.busy = 0.0            # seconds spent in successful requests
+        self.sec_per_text = None   # EWMA
+        self.samples = 0
+        self.fails = 0             # consecutive
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.last_error = None
+
+    def cost(self, default):
+        return (self.outstanding + 1) * (self.sec_per_text or default)
+
+
+class EmbedPool:
+    def __init__(self, endpoints=EMBED_ENDPOINTS, timeout=EMBED_TIMEOUT, in_flight=None):
+        if not endpoints:
+            raise ValueError("No embed endpoints configured (EMBED_ENDPOINTS)")
+        self.replicas = [Replica(url) for url in endpoints]
+        self.timeout = timeout
+        self.in_flight = in_flight or IN_FLIGHT_PER_REPLICA * len(self.replicas)
+        self.started = time.time()
+        # Ingestion traffic is bulk: small tail batches shouldn't take the embed server's interactive lane
+        self.headers = {"X-Embed-Priority": "bulk"}
+        if EMBED_WIRE == "f32":
+            self.headers["Accept"] = f"{BINARY_TYPE}, application/json;q=0.5"
+        self._lock = threading.Lock()
+        self._session = self._make_session()
+
+    def _make_session(self):
+        # Own session without urllib3 retries: a failing replica should fail over
+        # to another one, not be retried in place
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.replicas), pool_maxsize=self.in_flight, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    # === Selection ===
+    def _pick(self, avoid=None):
+        """
+        Least expected finish time among replicas in rotation, other than
+        avoid if there is another; readmits recovered ones first.
+        """
+        while True:
+            now = time.time()
+            with self._lock:
+                due = [r for r in self.replicas if r.ejected_until and now >= r.ejected_until]
+                live = [r for r in self.replicas if not r.ejected_until]
+                if not due and live:
+                    live = [r for r in live if r is not avoid] or live
+                    known = [r.sec_per_text for r in live if r.sec_per_text]
+                    default = min(known) if known else 1.0
+                    best = min(live, key=lambda r: r.cost(default))
+                    best.outstanding += 1
+                    return best
+                waiting = None if due or live else min(r.ejected_until for r in self.replicas)
+            if waiting is not None:
+                # Everything is out: wait for the first cool-down to end
+                time.sleep(min(max(waiting - now, 0.1), EJECT_SECONDS))
+                continue
+            for r in due:
+                self._probe(r)
+
+    def _probe(self, replica):
+        try:
+            ok = self._session.get(replica.health_url, timeout=HEALTH_TIMEOUT).status_code == 200
+        except Exception:
+            ok = False
+        with self._lock:
+            if not replica.ejected_until or time.time() < replica.ejected_until:
+                return                      # another thread already handled it
+            if ok:
+                replica.ejected_until = 0.0
+                replica.fails = 0
+                replica.sec_per_text, replica.samples = None, 0
+                print(f"🟢 Embed replica back in rotation: {replica.url}")
+            else:
+                self._eject(replica, "health check failed")
+
+    def _eject(self, replica, reason):
+        """Take replica out of rotation (caller holds the lock)."""
+        cooldown = min(EJECT_SECONDS * 2 ** replica.ejections, EJECT_MAX)
+        replica.ejections += 1
+        replica.ejected_until = time.time() + cooldown
+        print(f"🔴 Embed replica out of rotation for {cooldown}s: {replica.url} ({reason})")
+
+    # === Outcomes ===
+    def _succeeded(self, replica, n_texts, elapsed):
+        with self._lock:
+            replica.outstanding -= 1
+            replica.requests += 1
+            replica.texts += n_texts
+            replica.busy += elapsed
+            replica.fails = 0
+            per_text = elapsed / max(n_texts, 1)
+            replica.sec_per_text = (per_text if replica.sec_per_text is None
+                                    else EWMA_ALPHA * per_text + (1 - EWMA_ALPHA) * replica.sec_per_text)
+            replica.samples += 1
+            others = [r.sec_per_text for r in self.replicas
+                      if r is not replica and not r.ejected_until and r.samples >= MIN_SAMPLES]
+            if (replica.samples >= MIN_SAMPLES and others
+                    and replica.sec_per_text > SLOW_FACTOR * min(others)):
+                self._eject(replica, f"{replica.sec_per_text * 1000:.1f} ms/text vs {min(others) * 1000:.1f}")
+            elif replica.samples >= MIN_SAMPLES:
+                replica.ejections = 0      # healthy and keeping up: next ejection starts from EJECT_SECONDS
+
+    def _rejected(self, replica, error):
+        """The request failed because of what was sent, not the replica: no failover count, no ejection."""
+        with self._lock:
+            replica.outstanding -= 1
+            replica.errors += 1
+            replica.last_error = str(error)[:200]
+
+    def _failed(self, replica, error):
+        with self._lock:
+            replica.outstanding -= 1
+            replica.errors += 1
+            replica.fails += 1
+            replica.last_error = str(error)[:200]
+            if replica.fails >= FAILS_TO_EJECT and not replica.ejected_until:
+                self._eject(replica, replica.last_error)
+
+    # === Requests ===
+    def embed(self, texts, tries=None):
+        """(len(texts), dim) float32 array from whichever replica is best placed; fails over if a replica is down."""
+        tries = tries or max(3, 2 * len(self.replicas))
+        body = orjson.dumps({"texts": texts})
+        last = avoid = None
+        server_errors = 0
+        for _ in range(tries):
+            replica = self._pick(avoid)
+            started = time.time()
+            try:
+                r = self._session.post(replica.url, data=body, timeout=self.timeout,
+                                       headers={"Content-Type": "application/json", **self.headers})
+            except requests.RequestException as e:
+                self._failed(replica, e)
+                last = e
+                continue
+            if r.status_code in DOWN_STATUSES:
+                last = RuntimeError(f"HTTP {r.status_code} from {replica.url}")
+                self._failed(replica, last)
+                continue
+            if 400 <= r.status_code < 500:
+                error = EmbedRequestError(f"HTTP {r.status_code} from {replica.url}: {r.text[:200]}")
+                self._rejected(replica, error)
+                raise error
+            try:
+                r.raise_for_status()
+                vectors = decode_response(r)
+                if len(vectors) != len(texts):
+                    raise ValueError(f"got {len(vectors)} vectors for {len(texts)} texts")
+            except Exception as e:
+                # 500 or a garbled answer: likely this batch; one more replica decides
+                self._rejected(replica, e)
+                last, avoid = e, replica
+                server_errors += 1
+                if server_errors >= SERVER_ERROR_TRIES:
+                    raise EmbedRequestError(f"Batch failed on {server_errors} replicas: {e}") from e
+                continue
+            self._succeeded(replica, len(texts), time.time() - started)
+            return vectors
+        raise NoHealthyReplica(f"Embedding failed after {tries} attempts: {last}") from last
+
+    # === Reporting ===
+    def stats(self):
+        now = time.time()
+        wall = max(now - self.started, 1e-6)
+        with self._lock:
+            return [{
+                "url": r.url,
+                "state": "in rotation" if not r.ejected_until else f"out {max(r.ejected_until - now, 0):.0f}s",
+                "outstanding": r.outstanding,
+                "requests": r.requests,
+                "texts": r.texts,
+                "errors": r.errors,
+                "texts_per_sec": r.texts / wall,
+                "ms_per_text": (r.sec_per_text or 0) * 1000,
+                "last_error": r.last_error,
+            } for r in self.replicas]
+
+    def log_stats(self, prefix="🧠 Embed replicas"):
+        rows = self.stats()
+        total = sum(s["texts_per_sec"] for s in rows)
+        print(f"{prefix}: {len(rows)} replicas, {total:.1f} texts/s overall")
+        for s in rows:
+            print(f"   {s['url']}: {s['state']}, {s['requests']} req / {s['texts']} texts, "
+                  f"{s['texts_per_sec']:.1f} texts/s, {s['ms_per_text']:.1f} ms/text, {s['errors']} errors"
+                  + (f" (last: {s['last_error']})" if s["errors"] and s["last_error"] else ""))
@@ -0,0 +1,105 @@
+"""
+Postgres-backed work queue for embed clients (10_CreateEmbeddings.py).
+
+Unembedded chunks of one chunking profile are claimed in id order with
+FOR UPDATE SKIP LOCKED and a lease (embed_lease_owner + expiry), so any
+number of embed clients can drain the backlog in parallel without
+embedding a chunk twice. A lease that runs out (client crashed) makes its
+chunks claimable again.
+
+Claims read the partial index chunks_unembedded_idx (only NOT embedded
+rows) and continue from the last id this client claimed (keyset), so each
+claim costs the same whether the backlog is 10M chunks or 10. When the
+cursor reaches the end it goes round once more for expired leases and
+chunks inserted behind it.
+
+Needs Database/migrations/005_chunks_embed_queue.sql.
+"""
+
+LEASE_SECONDS = 10 * 60
+CLAIM_BATCH = 1000
+
+
+class EmbedQueue:
+    def __init__(self, conn, owner, profile_id, lease_seconds=LEASE_SECONDS):
+        self.conn = conn
+        self.owner = owner
+        self.profile_id = profile_id
+        self.lease_seconds = int(lease_seconds)
+        self.lease = f"{int(lease_seconds)} seconds"
+        self.after = None          # last chunk id claimed (keyset position)
+
+    def _claim_after(self, cur, n):
+        keyset = "AND id > %(after)s::uuid" if self.after else ""
+        cur.execute(f"""
+            WITH claimed AS (
+                SELECT id FROM chunks
+                WHERE profile_id = %(profile)s AND NOT embedded {keyset}
+                  AND (embed_lease_expires IS NULL OR embed_lease_expires < now())
+                ORDER BY id
+                LIMIT %(n)s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE chunks c
+            SET embed_lease_owner = %(owner)s, embed_lease_expires = now() + %(lease)s::interval
+            FROM claimed
+            WHERE c.id = claimed.id
+            RETURNING c.id::text, c.work_id, c.text;
+        """, {"profile": self.profile_id, "after": self.after, "n": n, "owner": self.owner, "lease": self.lease})
+        rows = sorted(cur.fetchall())
+        if rows:
+            self.after = rows[-1][0]
+        return rows
+
+    def claim(self, n=CLAIM_BATCH):
+        """Lease up to n unembedded chunks. Returns [(chunk_id, work_id, text)]."""
+        with self.conn.cursor() as cur:
+            rows = self._claim_after(cur, n)
+            if len(rows) < n and self.after is not None:
+                # End of the backlog: wrap round for expired leases and late inserts
+                self.after = None
+                rows += self._claim_after(cur, n - len(rows))
+        self.conn.commit()
+        return rows
+
+    def renew(self, chunk_ids):
+        """Push the expiry out for chunks this client still holds."""
+        if not chunk_ids:
+            return
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE chunks SET embed_lease_expires = now() + %s::interval
+                WHERE id = ANY(%s::uuid[]) AND embed_lease_owner = %s AND NOT embedded;
+            """, (self.lease, list(chunk_ids), self.owner))
+        self.conn.commit()
+
+    def finish(self, chunk_ids):
+        """Mark chunks embedded (only those this client still holds); returns how many were."""
+        if not chunk_ids:
+            return 0
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE chunks
+                SET embedded = TRUE, embed_lease_owner = NULL, embed_lease_expires = NULL
+                WHERE id = ANY(%s::uuid[]) AND embed_lease_owner = %s;
+            """, (list(chunk_ids), self.owner))
+            n = cur.rowcount
+        self.conn.commit()
+        return n
+
+    def release(self, chunk_ids):
+        """Give chunks back unembedded (e.g. the embed server rejected the batch)."""
+        if not chunk_ids:
+            return
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE chunks SET embed_lease_owner = NULL, embed_lease_expires = NULL
+                WHERE id = ANY(%s::uuid[]) AND embed_lease_owner = %s AND NOT embedded;
+            """, (list(chunk_ids), self.owner))
+        self.conn.commit()
+
+    def backlog(self):
+        """Unembedded chunks left in this profile (counted over the partial index)."""
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM chunks WHERE profile_id = %s AND NOT embedded;", (self.profile_id,))
+            return cur.fetchone()[0]
@@ -0,0 +1,132 @@
+"""
+Checkpoint store for OpenAlex harvests (local SQLite file).
+
+Records the last completed next_cursor per filter set (keyed by a hash of
+the filters, so a changed config never resumes a stale cursor) and the
+outcome of every work the harvester attempted. Works that came back with
+no PDF or only blocked hosts, or that failed repeatedly, are skipped on
+later runs without another request. Downloaded works are skipped too, so
+whatever removes a download again has to say so: 02 reopens quarantined
+works (retried like a failure) and the 07 reset forgets every download.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+STATE_PATH = os.path.expanduser("~/staging/harvest_state.sqlite")
+
+# === Work outcomes ===
+DOWNLOADED = "downloaded"
+NO_PDF = "no_pdf"
+BLOCKED = "blocked"
+FAILED = "failed"
+
+DEAD_OUTCOMES = (NO_PDF, BLOCKED)
+MAX_FAILED_ATTEMPTS = 3
+
+
+def filter_hash(filters: dict, per_page=None) -> str:
+    blob = json.dumps({"filters": filters, "per_page": per_page}, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+class HarvestState:
+    def __init__(self, path=STATE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cursors (
+                filter_hash TEXT PRIMARY KEY,
+                next_cursor TEXT,
+                pages       INTEGER NOT NULL DEFAULT 0,
+                completed   INTEGER NOT NULL DEFAULT 0,
+                updated_at  TEXT
+            );
+            CREATE TABLE IF NOT EXISTS works (
+                work_id    TEXT PRIMARY KEY,
+                outcome    TEXT NOT NULL,
+                attempts   INTEGER NOT NULL DEFAULT 1,
+                detail     TEXT,
+                updated_at TEXT
+            );
+        """)
+
+    # === Cursor checkpoint ===
+    def load_cursor(self, fhash):
+        """Return (next_cursor, completed) for this filter set, or (None, False)."""
+        row = self.conn.execute(
+            "SELECT next_cursor, completed FROM cursors WHERE filter_hash = ?", (fhash,)
+        ).fetchone()
+        if not row:
+            return None, False
+        return row[0], bool(row[1])
+
+    def save_cursor(self, fhash, next_cursor, completed=False):
+        self.conn.execute("""
+            INSERT INTO cursors (filter_hash, next_cursor, pages, completed, updated_at)
+            VALUES (?, ?, 1, ?, ?)
+            ON CONFLICT (filter_hash) DO UPDATE SET
+                next_cursor = excluded.next_cursor,
+                pages = cursors.pages + 1,
+                completed = excluded.completed,
+                updated_at = excluded.updated_at
+        """, (fhash, next_cursor, int(completed), datetime.now().isoformat()))
+        self.conn.commit()
+
+    # === Per-work outcomes ===
+    def record(self, work_id, outcome, detail=None):
+        self.conn.execute("""
+            INSERT INTO works (work_id, outcome, attempts, detail, updated_at)
+            VALUES (?, ?, 1, ?, ?)
+            ON CONFLICT (work_id) DO UPDATE SET
+                outcome = excluded.outcome,
+                attempts = works.attempts + 1,
+                detail = excluded.detail,
+                updated_at = excluded.updated_at
+        """, (work_id, outcome, detail, datetime.now().isoformat()))
+
+    def commit(self):
+        self.conn.commit()
+
+    def skippable(self, work_ids):
+        """Subset of work_ids already downloaded, known-dead, or failed too often."""
+        if not work_ids:
+            return set()
+        marks = ",".join("?" * len(work_ids))
+        rows = self.conn.execute(f"""
+            SELECT work_id FROM works
+            WHERE work_id IN ({marks})
+              AND (outcome IN (?, ?, ?) OR (outcome = ? AND attempts >= ?))
+        """, (*work_ids, DOWNLOADED, *DEAD_OUTCOMES, FAILED, MAX_FAILED_ATTEMPTS)).fetchall()
+        return {r[0] for r in rows}
+
+    def reopen(self, work_ids, detail=None):
+        """Downloads that were thrown away (e.g. quarantined): count them as failed attempts."""
+        n = 0
+        work_ids = list(work_ids)
+        for i in range(0, len(work_ids), 500):
+            batch = work_ids[i:i + 500]
+            marks = ",".join("?" * len(batch))
+            n += self.conn.execute(f"""
+                UPDATE works SET outcome = ?, detail = ?, updated_at = ?
+                WHERE outcome = ? AND work_id IN ({marks})
+            """, (FAILED, detail, datetime.now().isoformat(), DOWNLOADED, *batch)).rowcount
+        self.conn.commit()
+        return n
+
+    def forget_downloads(self):
+        """After a reset: every work may be fetched again and every filter set starts over."""
+        n = self.conn.execute("DELETE FROM works WHERE outcome = ?", (DOWNLOADED,)).rowcount
+        self.conn.execute("DELETE FROM cursors")
+        self.conn.commit()
+        return n
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT outcome, COUNT(*) FROM works GROUP BY outcome").fetchall())
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
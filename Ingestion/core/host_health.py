@@ -0,0 +1,143 @@
+"""
+Per-host health tracking and circuit breaker for PDF downloads.
+
+Every attempt against a host records its latency and outcome (ok, timeout,
+HTML-instead-of-PDF, HTTP error). After FAILURE_THRESHOLD consecutive
+failures the host's circuit opens for a cool-down that doubles on every
+re-trip (capped at MAX_COOLDOWN); while it is open, URLs on that host are
+skipped without a request. A host that keeps tripping is added to the
+learned blocklist, which is persisted to HEALTH_PATH with the rest of the
+stats so later runs start with what this one learned.
+
+timeout_for() shrinks the per-request timeout for hosts whose latency is
+known, so a slow host no longer costs the full 30 s on every attempt.
+"""
+
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+HEALTH_PATH = os.path.expanduser("~/staging/host_health.json")
+
+# === Breaker tuning ===
+FAILURE_THRESHOLD = 3        # consecutive failures that open the circuit
+BASE_COOLDOWN = 15 * 60      # seconds the first trip keeps a host closed off
+MAX_COOLDOWN = 24 * 3600
+LEARNED_BLOCK_TRIPS = 5      # trips without a success in between -> learned blocklist
+MIN_TIMEOUT = 5              # seconds; floor for latency-derived timeouts
+LATENCY_ALPHA = 0.2          # EWMA weight of the newest sample
+
+# Failure kinds
+OK = "ok"
+TIMEOUT = "timeout"
+HTML = "html"
+HTTP_ERROR = "http"
+ERROR = "error"
+
+_COUNTERS = {TIMEOUT: "timeouts", HTML: "html", HTTP_ERROR: "http"}
+
+
+def host_key(url: str) -> str:
+    host = urlparse(url).netloc.split(":")[0].lower()
+    return host.removeprefix("www.")
+
+
+class HostHealth:
+    def __init__(self, path=HEALTH_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.hosts = {}
+
+    # === Persistence ===
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.hosts = json.load(f)
+        return self
+
+    def save(self):
+        with self._lock:
+            blob = json.dumps(self.hosts, indent=1, sort_keys=True)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(blob)
+        os.replace(tmp, self.path)
+
+    def _entry(self, host):
+        h = self.hosts.get(host)
+        if h is None:
+            h = self.hosts[host] = {
+                "attempts": 0, "failures": 0, "consecutive": 0,
+                "timeouts": 0, "html": 0, "http": 0,
+                "latency": None, "open_until": 0, "trips": 0, "blocked": False,
+            }
+        return h
+
+    # === Queries ===
+    def is_blocked(self, url) -> bool:
+        """Host is on the learned blocklist (permanent until cleared)."""
+        h = self.hosts.get(host_key(url))
+        return bool(h and h["blocked"])
+
+    def is_open(self, url) -> bool:
+        """Circuit currently open: skip this host for now."""
+        h = self.hosts.get(host_key(url))
+        return bool(h and (h["blocked"] or h["open_until"] > time.time()))
+
+    def allow(self, url) -> bool:
+        return not self.is_open(url)
+
+    def timeout_for(self, url, default):
+        h = self.hosts.get(host_key(url))
+        if not h or h["latency"] is None:
+            return default
+        return min(default, max(MIN_TIMEOUT, 4 * h["latency"]))
+
+    # === Recording ===
+    def record(self, url, kind, latency=None):
+        host = host_key(url)
+        with self._lock:
+            h = self._entry(host)
+            h["attempts"] += 1
+            if latency is not None and kind != TIMEOUT:
+                h["latency"] = latency if h["latency"] is None else (
+                    LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * h["latency"])
+            if kind == OK:
+                h["consecutive"] = 0
+                h["trips"] = 0
+                h["open_until"] = 0
+                return
+            h["failures"] += 1
+            h["consecutive"] += 1
+            if kind in _COUNTERS:
+                h[_COUNTERS[kind]] += 1
+            if h["consecutive"] >= FAILURE_THRESHOLD:
+                h["trips"] += 1
+                h["consecutive"] = 0
+                h["open_until"] = time.time() + min(BASE_COOLDOWN * 2 ** (h["trips"] - 1), MAX_COOLDOWN)
+                if h["trips"] >= LEARNED_BLOCK_TRIPS:
+                    h["blocked"] = True
+                print(f"🔌 Circuit open for {host} (trip {h['trips']}"
+                      f"{', added to learned blocklist' if h['blocked'] else ''})")
+
+    def unblock(self, host):
+        with self._lock:
+            self.hosts.pop(host.lower().removeprefix("www."), None)
+
+    def summary(self, top=10) -> str:
+        with self._lock:
+            bad = sorted(self.hosts.items(), key=lambda kv: kv[1]["failures"], reverse=True)[:top]
+            blocked = sum(1 for h in self.hosts.values() if h["blocked"])
+            now = time.time()
+            open_now = sum(1 for h in self.hosts.values() if h["open_until"] > now)
+        lines = [f"{len(self.hosts)} hosts seen, {open_now} circuits open, {blocked} on learned blocklist"]
+        for host, h in bad:
+            if not h["failures"]:
+                break
+            lat = f"{h['latency']:.1f}s" if h["latency"] is not None else "n/a"
+            lines.append(f"   {host}: {h['failures']}/{h['attempts']} failed "
+                         f"(timeouts {h['timeouts']}, html {h['html']}, http {h['http']}), latency {lat}")
+        return "\n".join(lines)
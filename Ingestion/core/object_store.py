@@ -0,0 +1,129 @@
+"""
+MinIO helpers for PDFs: content-addressed keys and streaming uploads.
+
+PDFs live in the papers bucket under sha256/<hex>.pdf, so identical files
+reachable from several OpenAlex works (preprint + published version,
+mirrors) are stored once and openalex_works.pdf_key points at the shared
+object. Legacy <short_id>.pdf keys are still readable everywhere.
+
+PdfStream adapts a streamed requests.Response into a read-only file object
+so boto3's managed transfer can push it as a multipart upload, holding at
+most MULTIPART_CHUNK * MAX_PARTS_IN_FLIGHT bytes in memory per download.
+"""
+
+import hashlib
+import io
+import uuid
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+# === Transfer tuning ===
+MULTIPART_CHUNK = 8 * 1024 * 1024   # S3 minimum part size is 5 MiB
+MAX_PARTS_IN_FLIGHT = 2
+PDF_MAGIC = b"%PDF-"
+CONTENT_PREFIX = "sha256/"
+INCOMING_PREFIX = "incoming/"
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_CHUNK,
+    multipart_chunksize=MULTIPART_CHUNK,
+    max_concurrency=MAX_PARTS_IN_FLIGHT,
+)
+
+
+class NotAPdfError(ValueError):
+    pass
+
+
+# === Content addressing ===
+def content_key(sha256_hex: str) -> str:
+    return f"{CONTENT_PREFIX}{sha256_hex}.pdf"
+
+def is_content_key(key: str) -> bool:
+    return key.startswith(CONTENT_PREFIX)
+
+def key_sha256(key: str):
+    """The content hash embedded in a content-addressed key, else None."""
+    if not is_content_key(key):
+        return None
+    return key[len(CONTENT_PREFIX):].rsplit(".", 1)[0]
+
+def file_sha256(path, block_size=1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def object_exists(s3, bucket, key) -> bool:
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+def upload_file_content_addressed(s3, bucket, path):
+    """Upload a local PDF under its content key unless that object already exists. Returns (key, uploaded)."""
+    key = content_key(file_sha256(path))
+    if object_exists(s3, bucket, key):
+        return key, False
+    s3.upload_file(path, bucket, key, Config=TRANSFER_CONFIG)
+    return key, True
+
+def promote_to_content_key(s3, bucket, tmp_key, sha256_hex):
+    """Move an uploaded object to its content key (or drop it if that content is already stored)."""
+    key = content_key(sha256_hex)
+    if not object_exists(s3, bucket, key):
+        s3.copy_object(Bucket=bucket, Key=key, CopySource={"Bucket": bucket, "Key": tmp_key})
+    s3.delete_object(Bucket=bucket, Key=tmp_key)
+    return key
+
+
+class PdfStream(io.RawIOBase):
+    """File-like view over resp.iter_content() that rejects non-PDF bodies up front."""
+
+    def __init__(self, resp, block_size=256 * 1024):
+        self._it = resp.iter_content(block_size)
+        self._buf = b""
+        self.bytes_read = 0
+        self.sha256 = hashlib.sha256()
+        first = b""
+        while len(first) < len(PDF_MAGIC):
+            block = next(self._it, b"")
+            if not block:
+                break
+            first += block
+        if not first.lstrip()[:len(PDF_MAGIC)] == PDF_MAGIC:
+            raise NotAPdfError(f"response is not a PDF (starts with {first[:16]!r})")
+        self._buf = first
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buf:
+            block = next(self._it, None)
+            if block is None:
+                return 0
+            self._buf = block
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self.sha256.update(self._buf[:n])
+        self._buf = self._buf[n:]
+        self.bytes_read += n
+        return n
+
+
+def stream_to_bucket(s3, resp, bucket) -> tuple:
+    """
+    Multipart-upload a streamed HTTP response body, hashing as it goes, then
+    move it to its content key. Returns (pdf_key, bytes_sent).
+    """
+    body = PdfStream(resp)
+    tmp_key = f"{INCOMING_PREFIX}{uuid.uuid4().hex}.pdf"
+    s3.upload_fileobj(body, bucket, tmp_key, Config=TRANSFER_CONFIG)
+    key = promote_to_content_key(s3, bucket, tmp_key, body.sha256.hexdigest())
+    return key, body.bytes_read
@@ -0,0 +1,217 @@
+"""
+OpenAlex /works helpers shared by the harvest controllers.
+
+build_url() is the filter builder from 01__testDownload.py (pass-through
+keys, OR-joined lists, language normalisation, cursor or page paging), with
+aliases so the config-file shorthands used by 01 (concepts, primary_topics,
+open_access) map to their OpenAlex filter names.
+
+PagePrefetcher walks the cursor on a background thread into a bounded
+queue so metadata for the next pages is already fetched while PDFs from
+the current page download. The bounded queue is the backpressure: the
+producer blocks once PREFETCH_PAGES pages are waiting.
+
+work_matches() / iter_snapshot_works() apply the same filters locally to
+OpenAlex snapshot files (JSON Lines, optionally gzipped) for offline
+bulk imports.
+"""
+
+import gzip
+import json
+import os
+import queue
+import threading
+from collections import namedtuple
+from urllib.parse import urlencode
+
+BASE_URL = "https://api.openalex.org/works"
+PER_PAGE = 50
+PREFETCH_PAGES = 4
+
+# Config shorthand -> OpenAlex filter key
+FILTER_ALIASES = {
+    "concepts": "concepts.id",
+    "primary_topics": "primary_topic.id",
+    "open_access": "open_access.is_oa",
+}
+
+
+# === Filter helpers ===
+def _to_oa_value(v):
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    return str(v)
+
+def _normalize_kv(key, val):
+    key = FILTER_ALIASES.get(key, key)
+    # language: allow "en" → "languages/en", for one value or a list
+    if key == "language":
+        def prefixed(v):
+            return v if str(v).startswith("languages/") else f"languages/{v}"
+        return key, [prefixed(v) for v in val] if isinstance(val, list) else prefixed(val)
+    return key, val
+
+def build_filter(filters):
+    parts = []
+    # pass-through keys with normalization and OR for lists
+    for key, val in filters.items():
+        if key in ("from_date", "to_date"):
+            continue  # mapped below
+        key, val = _normalize_kv(key, val)
+        if isinstance(val, list):
+            joined = "|".join(_to_oa_value(x) for x in val)
+            parts.append(f"{key}:{joined}")
+        else:
+            parts.append(f"{key}:{_to_oa_value(val)}")
+    # map convenience date keys
+    if "from_date" in filters:
+        parts.append(f"from_publication_date:{filters['from_date']}")
+    if "to_date" in filters:
+        parts.append(f"to_publication_date:{filters['to_date']}")
+    return ",".join(parts)
+
+def build_url(config, filters, cursor="*", page=None):
+    params = {
+        "filter": build_filter(filters),
+        "per_page": config.get("per_page", PER_PAGE),
+        "mailto": config["email"],
+    }
+    if sort := config.get("sort"):
+        params["sort"] = sort
+    if config.get("use_cursor", True):
+        params["cursor"] = cursor
+    else:
+        params["page"] = config.get("page", page or 1)
+    return f"{BASE_URL}?{urlencode(params)}"
+
+
+# === Prefetching producer ===
+Page = namedtuple("Page", "cursor data error")
+
+class PagePrefetcher:
+    """
+    Iterate Page(cursor, data, error) in cursor order. fetch_page(cursor)
+    must return the decoded JSON for that cursor. Iteration ends after the
+    last page or after yielding a page whose error is set.
+    """
+
+    def __init__(self, fetch_page, start_cursor="*", max_ahead=PREFETCH_PAGES):
+        self._fetch_page = fetch_page
+        self._start = start_cursor
+        self._queue = queue.Queue(maxsize=max_ahead)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, name="openalex-prefetch", daemon=True)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        cursor = self._start
+        while cursor and not self._stop.is_set():
+            try:
+                data = self._fetch_page(cursor)
+            except Exception as e:
+                self._put(Page(cursor, None, e))
+                return
+            if not self._put(Page(cursor, data, None)):
+                return
+            if not data.get("results"):
+                break
+            cursor = data.get("meta", {}).get("next_cursor")
+        self._put(None)
+
+    def __iter__(self):
+        self._thread.start()
+        while True:
+            page = self._queue.get()
+            if page is None:
+                return
+            yield page
+            if page.error is not None:
+                return
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+
+# === Offline snapshot source ===
+SNAPSHOT_SUFFIXES = (".gz", ".jsonl", ".json")
+
+def _short(v):
+    return str(v).rsplit("/", 1)[-1].lower()
+
+def _as_list(v):
+    return v if isinstance(v, list) else [v]
+
+def _match_filter(work, key, val):
+    if key == "concepts.id":
+        wanted = {_short(v) for v in _as_list(val)}
+        return any(_short(c.get("id", "")) in wanted for c in work.get("concepts") or [])
+    if key == "primary_topic.id":
+        pt = work.get("primary_topic") or {}
+        return _short(pt.get("id", "")) in {_short(v) for v in _as_list(val)}
+    if key == "type":
+        return work.get("type") in _as_list(val)
+    if key == "open_access.is_oa":
+        wanted = {_to_oa_value(v).lower() for v in _as_list(val)}
+        return _to_oa_value(bool((work.get("open_access") or {}).get("is_oa"))) in wanted
+    if key == "language":
+        # Works carry "en" (snapshot) or "languages/en"; compare the bare code either way
+        lang = work.get("language")
+        return lang is not None and _short(lang) in {_short(v) for v in _as_list(val)}
+    raise ValueError(f"Filter '{key}' can't be applied offline")
+
+def work_matches(work, filters):
+    """Evaluate the same filters build_filter() sends to the API against a local work dict."""
+    for key, val in filters.items():
+        if key in ("from_date", "to_date"):
+            continue
+        key, val = _normalize_kv(key, val)
+        if not _match_filter(work, key, val):
+            return False
+    pub = work.get("publication_date") or ""
+    if "from_date" in filters and pub < str(filters["from_date"]):
+        return False
+    if "to_date" in filters and (not pub or pub > str(filters["to_date"])):
+        return False
+    return True
+
+def snapshot_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith(SNAPSHOT_SUFFIXES):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def iter_snapshot_works(paths, filters=None):
+    """Stream works from OpenAlex snapshot files (gzipped or plain JSON Lines)."""
+    for path in snapshot_files(paths):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                work = json.loads(line)
+                if filters is None or work_matches(work, filters):
+                    yield work
+
+def snapshot_pages(paths, filters, per_page=PER_PAGE):
+    """Yield Page tuples from local snapshot files, shaped like API pages (no cursor)."""
+    batch = []
+    for work in iter_snapshot_works(paths, filters):
+        batch.append(work)
+        if len(batch) >= per_page:
+            yield Page(None, {"results": batch, "meta": {}}, None)
+            batch = []
+    if batch:
+        yield Page(None, {"results": batch, "meta": {}}, None)
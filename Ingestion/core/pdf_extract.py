@@ -0,0 +1,174 @@
+"""
+Page-level PDF text extraction with time and memory limits.
+
+PageExtractor runs PyMuPDF in a small pool of child processes, never in
+the caller. The document is written once to a temp file (in /dev/shm when
+available). Its pages are split into PAGES_PER_TASK ranges that the pool
+extracts in parallel, so a 900-page proceedings volume costs its pages
+divided by EXTRACT_PROCS, not the whole volume in one call.
+
+Every document has a DOC_TIMEOUT deadline covering open + all page ranges.
+MuPDF calls can't be interrupted, so on a timeout the pool's processes are
+killed and the pool is rebuilt for the next document. Each child runs
+under an address-space limit (MEM_LIMIT_MB); a file that blows it fails
+with ExtractionError instead of taking the VM down.
+
+Documents slower than SLOW_SECONDS, timed out or failed are appended to
+SLOW_LOG with their page count, size and timing.
+"""
+
+import csv
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+# === Limits ===
+EXTRACT_PROCS = int(os.getenv("EXTRACT_PROCS", "2"))   # extraction processes per chunking worker
+PAGES_PER_TASK = 40
+DOC_TIMEOUT = int(os.getenv("EXTRACT_TIMEOUT", "120"))  # seconds per document
+MEM_LIMIT_MB = int(os.getenv("EXTRACT_MEM_MB", "2048")) # address space per extraction process (0 = unlimited)
+SLOW_SECONDS = 20
+SLOW_LOG = os.path.expanduser("~/staging/logs/slow_pdfs.csv")
+TMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Outcomes recorded in SLOW_LOG
+OK = "ok"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+
+class ExtractionError(RuntimeError):
+    pass
+
+
+class ExtractionTimeout(ExtractionError):
+    pass
+
+
+# === Pool tasks (run in the extraction processes) ===
+def _limit_memory(mb):
+    if mb:
+        limit = mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def _page_count(path):
+    import fitz  # PyMuPDF
+    with fitz.open(path) as doc:
+        if doc.needs_pass:
+            raise ValueError("Encrypted PDF")
+        return doc.page_count
+
+def _extract_range(path, first, last):
+    import fitz  # PyMuPDF
+    with fitz.open(path) as doc:
+        return [doc[i].get_text().replace("\x00", "") for i in range(first, last)]
+
+
+class PageExtractor:
+    def __init__(self, procs=EXTRACT_PROCS, pages_per_task=PAGES_PER_TASK, timeout=DOC_TIMEOUT,
+                 mem_limit_mb=MEM_LIMIT_MB, slow_seconds=SLOW_SECONDS, slow_log=SLOW_LOG):
+        self.procs = procs
+        self.pages_per_task = pages_per_task
+        self.timeout = timeout
+        self.mem_limit_mb = mem_limit_mb
+        self.slow_seconds = slow_seconds
+        self.slow_log = slow_log
+        self.pool = None
+        self.counts = {OK: 0, TIMEOUT: 0, ERROR: 0, "slow": 0}
+
+    # === Pool lifecycle ===
+    def _pool(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.procs, initializer=_limit_memory,
+                                            initargs=(self.mem_limit_mb,))
+        return self.pool
+
+    def _kill_pool(self):
+        """Running MuPDF calls can't be cancelled: terminate the processes and start fresh next time."""
+        pool, self.pool = self.pool, None
+        if pool is None:
+            return
+        for proc in list((pool._processes or {}).values()):
+            proc.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+
+    def _run(self, calls, deadline):
+        """Submit [(fn, args)] and return their results in order, or raise before the deadline passes."""
+        try:
+            futs = [self._pool().submit(fn, *args) for fn, args in calls]
+        except BrokenProcessPool as e:
+            self._kill_pool()
+            raise ExtractionError("extraction pool broken") from e
+        done, pending = wait(futs, timeout=max(0.0, deadline - time.time()), return_when=FIRST_EXCEPTION)
+        failed = [f for f in done if f.exception() is not None]
+        if pending:
+            self._kill_pool()
+            if not failed:
+                raise ExtractionTimeout(f"extraction exceeded {self.timeout}s")
+        if failed:
+            e = failed[0].exception()
+            if isinstance(e, BrokenProcessPool):
+                self._kill_pool()
+                raise ExtractionError("extraction process died (memory limit?)") from e
+            if isinstance(e, MemoryError):
+                raise ExtractionError(f"extraction exceeded {self.mem_limit_mb} MiB") from e
+            raise ExtractionError(str(e) or type(e).__name__) from e
+        return [f.result() for f in futs]
+
+    # === Extraction ===
+    def extract(self, pdf_bytes, key):
+        """Returns (text, page_starts): pages joined by newlines and the offset where each begins."""
+        start = time.time()
+        deadline = start + self.timeout
+        pages = 0
+        outcome = ERROR
+        try:
+            with tempfile.NamedTemporaryFile(suffix=".pdf", dir=TMP_DIR) as tmp:
+                tmp.write(pdf_bytes)
+                tmp.flush()
+                pages = self._run([(_page_count, (tmp.name,))], deadline)[0]
+                ranges = [(i, min(i + self.pages_per_task, pages)) for i in range(0, pages, self.pages_per_task)]
+                parts = self._run([(_extract_range, (tmp.name, a, b)) for a, b in ranges], deadline)
+            outcome = OK
+        except ExtractionTimeout:
+            outcome = TIMEOUT
+            raise
+        finally:
+            elapsed = time.time() - start
+            self.counts[outcome] += 1
+            if outcome != OK or elapsed >= self.slow_seconds:
+                self.counts["slow"] += outcome == OK
+                self._log_slow(key, pages, len(pdf_bytes), elapsed, outcome)
+
+        texts = [t for part in parts for t in part]
+        page_starts = []
+        pos = 0
+        for t in texts:
+            page_starts.append(pos)
+            pos += len(t) + 1
+        return "\n".join(texts), page_starts
+
+    def _log_slow(self, key, pages, size, elapsed, outcome):
+        try:
+            os.makedirs(os.path.dirname(self.slow_log), exist_ok=True)
+            new = not os.path.exists(self.slow_log)
+            with open(self.slow_log, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if new:
+                    writer.writerow(["logged_at", "pdf_key", "pages", "bytes", "seconds", "outcome"])
+                writer.writerow([datetime.utcnow().isoformat(), key, pages, size, f"{elapsed:.2f}", outcome])
+        except OSError:
+            pass
+
+    def summary(self) -> str:
+        c = self.counts
+        return f"{c[OK]} ok ({c['slow']} slow), {c[TIMEOUT]} timed out, {c[ERROR]} failed"
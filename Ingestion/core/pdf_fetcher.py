@@ -0,0 +1,213 @@
+"""
+Concurrent PDF download engine used by the OpenAlex harvest controllers.
+
+A thread pool keeps many downloads in flight while a per-host semaphore
+stops any single publisher from being hammered. All workers share one
+pooled requests.Session, so TCP/TLS connections are reused across works.
+
+With a HostHealth attached, every attempt is reported to it, hosts with an
+open circuit are refused up front (HostUnavailableError) and the request
+timeout follows the host's observed latency. Only what the publisher did
+counts: HTTP status, transport errors and non-PDF bodies, timed over the
+download alone. Local disk and MinIO errors are raised without touching
+the host's record.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core import host_health
+from core.object_store import NotAPdfError, PDF_MAGIC, stream_to_bucket
+
+# === Defaults ===
+MAX_WORKERS = 16          # total downloads in flight
+PER_HOST_LIMIT = 4        # concurrent downloads against one host
+STREAM_CHUNK = 256 * 1024 # bytes per read when streaming to disk
+
+
+class HostUnavailableError(RuntimeError):
+    """The host's circuit is open; try another location instead of retrying."""
+
+
+def classify_failure(exc):
+    """Host outcome for a failed download, or None if it says nothing about the host."""
+    if isinstance(exc, NotAPdfError):
+        return host_health.HTML
+    if isinstance(exc, (requests.Timeout, requests.ConnectionError)):
+        return host_health.TIMEOUT
+    if isinstance(exc, requests.HTTPError):
+        status = exc.response.status_code if exc.response is not None else None
+        # A 404/410 is about this one work, not the host
+        return None if status in (404, 410) else host_health.HTTP_ERROR
+    if isinstance(exc, requests.RequestException):
+        return host_health.ERROR      # broken chunked body, bad encoding, ...
+    # Disk (ENOSPC), MinIO/botocore and our own bugs aren't the publisher's fault
+    return None
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc.split(":")[0].lower()
+
+
+def make_session(headers=None, pool_size=MAX_WORKERS) -> requests.Session:
+    """Session whose connection pool is sized for the worker count."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+class TimedBody:
+    """resp with iter_content() timed: .seconds is time to headers plus time spent waiting on the body."""
+
+    def __init__(self, resp, started):
+        self.resp = resp
+        self.seconds = time.time() - started
+
+    def iter_content(self, size):
+        it = self.resp.iter_content(size)
+        while True:
+            t = time.time()
+            block = next(it, None)
+            self.seconds += time.time() - t
+            if block is None:
+                return
+            yield block
+
+
+# === Per-host concurrency cap ===
+class HostLimiter:
+    def __init__(self, per_host=PER_HOST_LIMIT):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._sems = {}
+
+    def _sem(self, host):
+        with self._lock:
+            sem = self._sems.get(host)
+            if sem is None:
+                sem = self._sems[host] = threading.BoundedSemaphore(self.per_host)
+            return sem
+
+    def hold(self, url):
+        return self._sem(host_of(url))
+
+
+# === Throughput counters ===
+class Throughput:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.files = 0
+        self.failed = 0
+        self.bytes = 0
+        self.by_host = defaultdict(int)
+
+    def record(self, url, nbytes=0, ok=True):
+        with self._lock:
+            if ok:
+                self.files += 1
+                self.bytes += nbytes
+                self.by_host[host_of(url)] += 1
+            else:
+                self.failed += 1
+
+    def summary(self) -> str:
+        elapsed = max(time.time() - self.started, 1e-6)
+        mb = self.bytes / (1024 * 1024)
+        return (f"{self.files} PDFs ({mb:.1f} MiB), {self.failed} failed attempts in {elapsed:.1f}s — "
+                f"{self.files / elapsed:.2f} files/s, {mb / elapsed:.2f} MiB/s")
+
+
+# === Engine ===
+class PdfFetcher:
+    def __init__(self, headers=None, max_workers=MAX_WORKERS, per_host=PER_HOST_LIMIT, timeout=30, health=None):
+        self.timeout = timeout
+        self.health = health
+        self.session = make_session(headers, pool_size=max_workers)
+        self.limiter = HostLimiter(per_host)
+        self.stats = Throughput()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pdf")
+
+    # === Health bookkeeping ===
+    def _check_host(self, url):
+        if self.health and not self.health.allow(url):
+            raise HostUnavailableError(f"circuit open for {host_of(url)}")
+
+    def _timeout(self, url):
+        return self.health.timeout_for(url, self.timeout) if self.health else self.timeout
+
+    def _report(self, url, seconds, exc=None):
+        if not self.health:
+            return
+        kind = host_health.OK if exc is None else classify_failure(exc)
+        if kind is not None:
+            self.health.record(url, kind, seconds)
+
+    def fetch(self, url, dest_path) -> int:
+        """Stream url to dest_path (via a .part file). Returns bytes written; raises on failure."""
+        self._check_host(url)
+        tmp_path = dest_path + ".part"
+        with self.limiter.hold(url):
+            started = time.time()
+            body = None
+            try:
+                with self.session.get(url, timeout=self._timeout(url), stream=True) as resp:
+                    body = TimedBody(resp, started)
+                    resp.raise_for_status()
+                    written = 0
+                    with open(tmp_path, "wb") as f:
+                        for block in body.iter_content(STREAM_CHUNK):
+                            if written == 0 and not block.lstrip()[:len(PDF_MAGIC)] == PDF_MAGIC:
+                                raise NotAPdfError(f"response is not a PDF (starts with {block[:16]!r})")
+                            f.write(block)
+                            written += len(block)
+            except Exception as e:
+                self.stats.record(url, ok=False)
+                self._report(url, body.seconds if body else time.time() - started, e)
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        os.replace(tmp_path, dest_path)
+        self.stats.record(url, written)
+        self._report(url, body.seconds)
+        return written
+
+    def fetch_to_bucket(self, url, s3, bucket) -> str:
+        """Stream url straight into a MinIO multipart upload. Returns the content-addressed pdf_key."""
+        self._check_host(url)
+        with self.limiter.hold(url):
+            started = time.time()
+            body = None
+            try:
+                with self.session.get(url, timeout=self._timeout(url), stream=True) as resp:
+                    body = TimedBody(resp, started)
+                    resp.raise_for_status()
+                    key, written = stream_to_bucket(s3, body, bucket)
+            except Exception as e:
+                self.stats.record(url, ok=False)
+                self._report(url, body.seconds if body else time.time() - started, e)
+                raise
+        self.stats.record(url, written)
+        self._report(url, body.seconds)
+        return key
+
+    def map(self, fn, items):
+        """Run fn(item) across the pool; yield (item, result) as each completes."""
+        futures = {self._pool.submit(fn, item): item for item in items}
+        for fut in as_completed(futures):
+            yield futures[fut], fut.result()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        self.session.close()
@@ -0,0 +1,95 @@
+"""
+Extracted-text cache for the chunker.
+
+PDF text is extracted once and stored in MinIO (TEXT_BUCKET, separate
+from the PDFs so orphan checks on the papers bucket are unaffected) as
+zstd-compressed JSON:
+
+    {"pdf_key", "extractor", "text", "pages": [char offset where each page starts]}
+
+Objects are keyed by the PDF's content hash and EXTRACTOR version:
+
+    <EXTRACTOR>/<sha256>.json.zst       content-addressed PDFs
+    <EXTRACTOR>/key-<sha256 of pdf_key>.json.zst    legacy <short_id>.pdf keys
+
+Re-chunking (new token budget, DeleteChunks.py + re-run, --retry-failed)
+then reads cached text instead of downloading and re-parsing every PDF.
+Bump EXTRACTOR whenever extraction output changes; old entries are then
+simply never read again.
+"""
+
+import hashlib
+
+import orjson
+import zstandard
+from botocore.exceptions import ClientError
+
+from core.object_store import key_sha256
+
+EXTRACTOR = "pymupdf-text-v1"
+ZSTD_LEVEL = 6                     # text compresses ~4x; written once, read many times
+
+_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+_decompressor = zstandard.ZstdDecompressor()
+
+
+def cache_key(pdf_key, extractor=EXTRACTOR) -> str:
+    sha = key_sha256(pdf_key)
+    if sha is None:
+        sha = "key-" + hashlib.sha256(pdf_key.encode("utf-8")).hexdigest()
+    return f"{extractor}/{sha}.json.zst"
+
+
+class TextCache:
+    def __init__(self, s3, bucket, extractor=EXTRACTOR):
+        self.s3 = s3
+        self.bucket = bucket
+        self.extractor = extractor
+        self.hits = 0
+        self.misses = 0
+        self.corrupt = 0           # entries that failed to decode (counted as misses too)
+
+    def ensure_bucket(self):
+        try:
+            self.s3.head_bucket(Bucket=self.bucket)
+        except ClientError:
+            self.s3.create_bucket(Bucket=self.bucket)
+        return self
+
+    def get(self, pdf_key):
+        """(text, page_starts) for pdf_key, or None if not cached for this extractor."""
+        try:
+            body = self.s3.get_object(Bucket=self.bucket, Key=cache_key(pdf_key, self.extractor))["Body"].read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                self.misses += 1
+                return None
+            raise
+        try:
+            entry = orjson.loads(_decompressor.decompress(body))
+            text, pages = entry["text"], entry["pages"]
+        except (zstandard.ZstdError, ValueError, KeyError, TypeError) as e:
+            # Truncated or corrupt entry: treat as a miss; re-extraction overwrites it
+            print(f"⚠️ Corrupt text cache entry for {pdf_key}, re-extracting: {e}")
+            self.corrupt += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return text, pages
+
+    def put(self, pdf_key, text, page_starts):
+        blob = _compressor.compress(orjson.dumps({
+            "pdf_key": pdf_key,
+            "extractor": self.extractor,
+            "text": text,
+            "pages": page_starts,
+        }))
+        self.s3.put_object(Bucket=self.bucket, Key=cache_key(pdf_key, self.extractor), Body=blob,
+                           ContentType="application/json", ContentEncoding="zstd")
+        return len(blob)
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        if not total:
+            return "no lookups"
+        return f"{self.hits}/{total} cache hits" + (f", {self.corrupt} corrupt" if self.corrupt else "")
@@ -0,0 +1,134 @@
+"""
+Token-aware chunking with the embedding model's own tokenizer.
+
+Each document is tokenized once (encode_batch over a whole claim batch,
+parallel in Rust) with offset mapping. Chunks are then cut straight from
+the token stream: each window holds at most chunk_budget() tokens and
+ends at the best break in its back half (paragraph > line > sentence >
+word). Offsets come from the tokenizer, so char_start/char_end are exact
+positions in the extracted text, and token_count is the real count. The
+budget is MAX_SEQ_LEN minus the special tokens the model adds, so the
+embed server never truncates a chunk.
+
+Consecutive chunks share about OVERLAP_TOKENS tokens, snapped to a word
+start. The module defaults describe the current model; a chunking profile
+(core/chunking_profiles.py) passes its own tokenizer, budget and overlap.
+"""
+
+import os
+import threading
+
+# === Model / budget ===
+TOKENIZER_NAME = os.getenv("EMBED_TOKENIZER", "nomic-ai/nomic-embed-text-v1")
+MAX_SEQ_LEN = int(os.getenv("EMBED_MAX_SEQ_LEN", "512"))   # sequence length the embed server runs at
+OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))
+MIN_CHUNK_TOKENS = 16         # trailing scraps shorter than this merge into the previous chunk
+
+# Break ranks (higher is a better place to end a chunk)
+_NONE, _WORD, _SENTENCE, _LINE, _PARAGRAPH = range(5)
+_SENTENCE_END = (".", "!", "?", ":", ";")
+
+_lock = threading.Lock()
+_tokenizers = {}              # name -> (tokenizer, special tokens added per sequence)
+
+
+def _load(name):
+    with _lock:
+        if name not in _tokenizers:
+            from tokenizers import Tokenizer
+
+            tok = Tokenizer.from_pretrained(name)
+            tok.no_truncation()
+            tok.no_padding()
+            special = tok.post_processor.num_special_tokens_to_add(False) if tok.post_processor else 0
+            _tokenizers[name] = (tok, special)
+        return _tokenizers[name]
+
+
+def get_tokenizer(name=TOKENIZER_NAME):
+    """Fast (Rust) tokenizer for name; loaded once per process."""
+    return _load(name)[0]
+
+
+def chunk_budget(max_seq_len=MAX_SEQ_LEN, name=TOKENIZER_NAME):
+    """Tokens of text per chunk once the model's [CLS]/[SEP] are added."""
+    return max_seq_len - _load(name)[1]
+
+
+def _break_rank(text, offsets, i):
+    """How good a chunk end just before token i is (i = exclusive end index)."""
+    prev_end = offsets[i - 1][1]
+    gap = text[prev_end:offsets[i][0]]
+    if not gap:
+        return _NONE                       # inside a word or glued punctuation
+    if "\n\n" in gap:
+        return _PARAGRAPH
+    if "\n" in gap:
+        return _LINE
+    if text[prev_end - 1] in _SENTENCE_END:
+        return _SENTENCE
+    return _WORD
+
+
+def _best_cut(text, offsets, start, end, n):
+    """Exclusive end index for a window [start, end): latest best-ranked break in its back half."""
+    if end >= n:
+        return n
+    best_rank, best = _NONE, end
+    for i in range(end, start + (end - start) // 2, -1):
+        rank = _break_rank(text, offsets, i)
+        if rank > best_rank:
+            best_rank, best = rank, i
+            if rank == _PARAGRAPH:
+                break
+    return best
+
+
+def _word_start(text, offsets, i, floor):
+    """Move i back to the first token of its word (never below floor)."""
+    while i > floor and offsets[i][0] == offsets[i - 1][1]:
+        i -= 1
+    return i
+
+
+def windows(text, offsets, budget, overlap=OVERLAP_TOKENS):
+    """Yield (first_token, end_token) windows over one document's offsets."""
+    n = len(offsets)
+    start = 0
+    while start < n:
+        end = _best_cut(text, offsets, start, min(start + budget, n), n)
+        if n - end < MIN_CHUNK_TOKENS and end - start + (n - end) <= budget:
+            end = n
+        yield start, end
+        if end >= n:
+            break
+        start = _word_start(text, offsets, max(end - overlap, start + 1), start + 1)
+
+
+def chunk_encoding(text, encoding, budget, overlap=OVERLAP_TOKENS):
+    offsets = encoding.offsets
+    chunks = []
+    for first, last in windows(text, offsets, budget, overlap):
+        start, end = offsets[first][0], offsets[last - 1][1]
+        chunks.append({
+            "text": text[start:end],
+            "start": start,
+            "end": end,
+            "tokens": last - first,
+        })
+    return chunks
+
+
+def chunk_texts(texts, budget=None, overlap=OVERLAP_TOKENS, tokenizer=TOKENIZER_NAME):
+    """
+    Chunk several documents with one batched tokenizer call.
+    Returns one list of {"text", "start", "end", "tokens"} per input text.
+    """
+    tok = get_tokenizer(tokenizer)
+    budget = budget or chunk_budget(name=tokenizer)
+    encodings = tok.encode_batch(list(texts), add_special_tokens=False)
+    return [chunk_encoding(text, enc, budget, overlap) for text, enc in zip(texts, encodings)]
+
+
+def chunk_text(text, budget=None, overlap=OVERLAP_TOKENS, tokenizer=TOKENIZER_NAME):
+    return chunk_texts([text], budget, overlap, tokenizer)[0]
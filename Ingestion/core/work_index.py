@@ -0,0 +1,132 @@
+"""
+Local dedup index of OpenAlex work IDs that already have a PDF in openalex_works.
+
+IDs are stored as a sorted uint64 array of the numeric part of the
+OpenAlex key (https://openalex.org/W123 -> 123), persisted to a local
+.npy file. ~1M works costs ~8 MB of RAM and a page of results is answered
+with a single vectorised searchsorted call.
+
+Refresh is incremental: writers on this VM call add_many() for the IDs
+they insert, and the DB is only re-read in full when its fingerprint no
+longer matches the snapshot (e.g. after a purge or reset). The fingerprint
+is (count, sum, sum of squares) of the numeric keys. Postgres computes it
+in one aggregate, and add_many() keeps it in step locally, so a delete
+plus an insert between runs is caught as well as a change in row count.
+"""
+
+import json
+import os
+
+import numpy as np
+
+INDEX_PATH = os.path.expanduser("~/staging/work_index.npy")
+
+
+FINGERPRINT_SQL = """
+    SELECT COUNT(k), COALESCE(SUM(k), 0), COALESCE(SUM(k * k), 0)
+    FROM (SELECT (regexp_match(id, '(?:^|/)[Ww]([0-9]+)$'))[1]::numeric AS k
+          FROM openalex_works WHERE pdf_key IS NOT NULL) ids;
+"""
+
+
+def fingerprint(keys):
+    """[count, sum, sum of squares] of integer keys, as FINGERPRINT_SQL computes it."""
+    keys = [int(k) for k in keys]
+    return [len(keys), sum(keys), sum(k * k for k in keys)]
+
+
+def work_key(work_id: str):
+    """Numeric key for an OpenAlex work ID, or None if it isn't W<digits>."""
+    short = work_id.rsplit("/", 1)[-1]
+    if short[:1] in ("W", "w") and short[1:].isdigit():
+        return int(short[1:])
+    return None
+
+
+class WorkIndex:
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.meta_path = os.path.splitext(path)[0] + ".json"
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.db_print = None       # fingerprint of the IDs with a pdf_key at last sync
+        self._pending = []         # keys added since last merge
+        self._dirty = False
+
+    # === Persistence ===
+    def load(self):
+        if os.path.exists(self.path) and os.path.exists(self.meta_path):
+            self.keys = np.load(self.path)
+            with open(self.meta_path) as f:
+                self.db_print = json.load(f).get("fingerprint")     # absent in old snapshots: rebuilt once
+        return self
+
+    def save(self):
+        self._merge()
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, self.keys)
+        os.replace(tmp, self.path)
+        with open(self.meta_path, "w") as f:
+            json.dump({"fingerprint": self.db_print, "size": int(self.keys.size)}, f)
+        self._dirty = False
+
+    # === Sync with Postgres ===
+    def refresh(self, pg_conn):
+        """Re-read every ID from Postgres only if the DB's fingerprint has drifted from the snapshot's."""
+        with pg_conn.cursor() as cur:
+            cur.execute(FINGERPRINT_SQL)
+            db_print = [int(v) for v in cur.fetchone()]
+        self._merge()
+        if db_print == self.db_print:
+            return False
+        with pg_conn.cursor(name="work_index_sync") as cur:
+            cur.itersize = 50_000
+            cur.execute("SELECT id FROM openalex_works WHERE pdf_key IS NOT NULL;")
+            keys = [k for (wid,) in cur if (k := work_key(wid)) is not None]
+        self.keys = np.unique(np.fromiter(keys, dtype=np.uint64, count=len(keys)))
+        self._pending = []
+        self.db_print = fingerprint(self.keys.tolist())
+        self._dirty = True
+        self.save()
+        return True
+
+    # === Membership ===
+    def contains_many(self, work_ids):
+        """Return a list of booleans, one per work ID, in a single lookup."""
+        self._merge()
+        keys = [work_key(w) for w in work_ids]
+        probe = np.fromiter((k or 0 for k in keys), dtype=np.uint64, count=len(keys))
+        if self.keys.size == 0:
+            return [False] * len(keys)
+        pos = np.searchsorted(self.keys, probe)
+        pos = np.minimum(pos, self.keys.size - 1)
+        hits = self.keys[pos] == probe
+        return [bool(h) and k is not None for h, k in zip(hits, keys)]
+
+    def __contains__(self, work_id):
+        return self.contains_many([work_id])[0]
+
+    def add_many(self, work_ids, created=True):
+        """
+        Record IDs that have a PDF row. created=True (the insert's RETURNING
+        said this writer created it) also folds them into the fingerprint;
+        rows that were already in the DB only join the lookup.
+        """
+        keys = [k for w in work_ids if (k := work_key(w)) is not None]
+        if not keys:
+            return
+        self._pending.extend(keys)
+        if created and self.db_print is not None:
+            n, total, squares = fingerprint(keys)
+            self.db_print = [self.db_print[0] + n, self.db_print[1] + total, self.db_print[2] + squares]
+
+    def _merge(self):
+        if not self._pending:
+            return
+        added = np.asarray(self._pending, dtype=np.uint64)
+        self.keys = np.union1d(self.keys, added)
+        self._pending = []
+        self._dirty = True
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+List, create, activate and drop chunking profiles (core/chunking_profiles.py).
+
+Once after migration 004, point the retrieval alias at the legacy collection:
+
+  python utils/ChunkingProfiles.py init
+
+A new chunk size is built next to the live one and switched to when ready:
+
+  python utils/ChunkingProfiles.py list
+  python utils/ChunkingProfiles.py create --max-tokens 384 --overlap 48
+  python controllers/09_chunk_pdfs_and_insert_chunks.py --profile <id>
+  python controllers/10_CreateEmbeddings.py --profile <id>
+  python utils/ChunkingProfiles.py activate <id>        # retrieval now reads <id>
+  python utils/ChunkingProfiles.py drop <old id>        # once you won't switch back
+"""
+
+import sys
+import argparse
+
+from core import chunking_profiles, token_chunker
+from core.clients import QDRANT_ALIAS, pg_connection
+
+def cmd_list(args):
+    with pg_connection() as conn, conn.cursor() as cur:
+        profiles = chunking_profiles.list_profiles(cur)
+        print(f"🔗 Qdrant alias '{QDRANT_ALIAS}' → {chunking_profiles.alias_target() or '(not set)'}")
+        for p in profiles:
+            status = chunking_profiles.profile_status(cur, p.id)
+            sizes = f"{p.max_tokens} tokens, overlap {p.overlap_tokens}" if p.splitter == "tokens" else "900/200 chars"
+            works = ", ".join(f"{k} {v}" for k, v in sorted(status["works"].items()))
+            print(f"{'⭐' if p.active else '  '} {p.id}  [{sizes}; {p.extractor}; collection {p.qdrant_collection}]")
+            print(f"     chunks {status['chunks']} ({status['unembedded']} unembedded); works: {works}")
+
+def cmd_init(args):
+    with pg_connection() as conn, conn.cursor() as cur:
+        target = chunking_profiles.ensure_alias(cur)
+    print(f"🔗 Qdrant alias '{QDRANT_ALIAS}' → {target}")
+
+def cmd_create(args):
+    with pg_connection() as conn, conn.cursor() as cur:
+        p = chunking_profiles.create_profile(cur, args.tokenizer, args.max_tokens, args.overlap, args.id)
+    print(f"🆕 Profile '{p.id}' ({p.tokenizer}, {p.max_tokens} tokens, overlap {p.overlap_tokens}, {p.extractor})")
+    print(f"   Build it with: 09_chunk_pdfs_and_insert_chunks.py --profile {p.id}; "
+          f"10_CreateEmbeddings.py --profile {p.id}")
+
+def cmd_activate(args):
+    with pg_connection() as conn:
+        p = chunking_profiles.activate(conn, args.profile, force=args.force)
+    print(f"✅ Active profile is now '{p.id}' (alias '{QDRANT_ALIAS}' → {p.qdrant_collection})")
+
+def cmd_drop(args):
+    confirm = input(f"⚠️  This will DELETE every chunk, queue row and vector of profile '{args.profile}'.\n"
+                    "Type 'YES' to proceed: ")
+    if confirm.strip().upper() != "YES":
+        print("❌ Aborted.")
+        return
+    with pg_connection() as conn:
+        deleted = chunking_profiles.drop_profile(conn, args.profile)
+    print(f"🗑️  Dropped profile '{args.profile}' ({deleted} chunks)")
+
+def main():
+    ap = argparse.ArgumentParser(description="Manage chunking profiles.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="Profiles with build progress").set_defaults(fn=cmd_list)
+    sub.add_parser("init", help="Create the retrieval alias on the active profile if missing "
+                                "(once after migration 004)").set_defaults(fn=cmd_init)
+
+    c = sub.add_parser("create", help="Register a token profile to build")
+    c.add_argument("--tokenizer", default=token_chunker.TOKENIZER_NAME)
+    c.add_argument("--max-tokens", type=int, default=token_chunker.MAX_SEQ_LEN,
+                   help="Model sequence length, special tokens included")
+    c.add_argument("--overlap", type=int, default=token_chunker.OVERLAP_TOKENS)
+    c.add_argument("--id", help="Profile ID (default: derived from the settings)")
+    c.set_defaults(fn=cmd_create)
+
+    a = sub.add_parser("activate", help="Point retrieval at a profile")
+    a.add_argument("profile")
+    a.add_argument("--force", action="store_true", help="Switch even if the profile isn't fully built")
+    a.set_defaults(fn=cmd_activate)
+
+    d = sub.add_parser("drop", help="Delete an inactive profile's chunks and vectors")
+    d.add_argument("profile")
+    d.set_defaults(fn=cmd_drop)
+
+    args = ap.parse_args()
+    args.fn(args)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
@@ -2,13 +2,14 @@
 import os
 import sys
 import argparse
-import psycopg2
 from psycopg2.extras import execute_values
 
 # pip install qdrant-client
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qm
 
+from core.clients import pg_connection
+
 # ---------- CLI ----------
 parser = argparse.ArgumentParser(description="Delete partial embeddings from Qdrant and reset flags in Postgres.")
 parser.add_argument("--collection", required=True, help="Qdrant collection name (e.g., papers_chunks_v1_2048c_512o)")
@@ -19,21 +20,7 @@ parser.add_argument("--batch-size", type=int, default=200, help="How many work_i
 parser.add_argument("--dry-run", action="store_true", help="List what would be deleted/updated without doing it.")
 args = parser.parse_args()
 
-# ---------- Postgres config ----------
-PG_CONFIG = {
-    "host": os.getenv("PG_HOST", "192.168.0.11"),
-    "dbname": os.getenv("PG_DB", "raglab"),
-    "user": os.getenv("PG_USER", "mike"),
-    "password": os.getenv("PG_PASSWORD"),
-}
-if not PG_CONFIG["password"]:
-    print("❌ PG_PASSWORD not set.", file=sys.stderr)
-    sys.exit(1)
-
 # ---------- Helpers ----------
-def pg_connect():
-    return psycopg2.connect(**PG_CONFIG)
-
 def fetch_partial_work_ids():
     """
     Partials = work_ids with at least one embedded chunk and not all embedded.
@@ -45,7 +32,7 @@ def fetch_partial_work_ids():
         HAVING SUM(CASE WHEN embedded THEN 1 ELSE 0 END) > 0
            AND   SUM(CASE WHEN embedded THEN 1 ELSE 0 END) < COUNT(*);
     """
-    with pg_connect() as conn:
+    with pg_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(sql)
             rows = cur.fetchall()
@@ -58,7 +45,7 @@ def reset_embedded_flags(partial_ids):
     if not partial_ids:
         return 0
     sql = "UPDATE chunks SET embedded = FALSE WHERE work_id = ANY(%s);"
-    with pg_connect() as conn:
+    with pg_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (partial_ids,))
         conn.commit()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Convert staged pretty-printed metadata (<short_id>.json) to minified,
+zstd-compressed <short_id>.json.zst, and report the savings.
+
+  python utils/CompactMetadata.py                 # size + parse-time report only
+  python utils/CompactMetadata.py --execute       # convert the staging dir
+  python utils/CompactMetadata.py --db            # full_raw size/type + parse time in Postgres
+
+Run --db before and after Database/migrations/001_openalex_works_full_raw_jsonb.sql
+to compare the text and jsonb columns.
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+
+from adapters.metadata_io import JSON_SUFFIX, ZSTD_SUFFIX, encode, decode, write_metadata
+
+META_DIR = os.path.expanduser("~/staging/metadata")
+SAMPLE_SIZE = 500           # files timed for the parse report
+
+def human_bytes(n):
+    for unit in ["B", "KiB", "MiB", "GiB", "TiB"]:
+        if n < 1024 or unit == "TiB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n} {unit}"
+        n /= 1024
+
+# === Staging ===
+def staging_report(meta_dir, sample_size):
+    legacy = sorted(f for f in os.listdir(meta_dir) if f.endswith(JSON_SUFFIX))
+    compact = [f for f in os.listdir(meta_dir) if f.endswith(ZSTD_SUFFIX)]
+    print(f"📂 {meta_dir}: {len(legacy)} legacy .json, {len(compact)} .json.zst")
+    if not legacy:
+        return legacy
+
+    sample = random.sample(legacy, min(sample_size, len(legacy)))
+    before = after = 0
+    t_before = t_after = 0.0
+    for name in sample:
+        with open(os.path.join(meta_dir, name), "rb") as f:
+            raw = f.read()
+        t0 = time.perf_counter()
+        work = json.loads(raw)
+        t_before += time.perf_counter() - t0
+
+        blob = encode(work)
+        t0 = time.perf_counter()
+        decode(blob)
+        t_after += time.perf_counter() - t0
+
+        before += len(raw)
+        after += len(blob)
+
+    scale = len(legacy) / len(sample)
+    print(f"📊 Sample of {len(sample)} files:")
+    print(f"   • Size:  {human_bytes(before)} → {human_bytes(after)} "
+          f"({after / max(before, 1):.0%}; est. total {human_bytes(before * scale)} → {human_bytes(after * scale)})")
+    print(f"   • Parse: {t_before * 1000 / len(sample):.3f} ms → {t_after * 1000 / len(sample):.3f} ms per work")
+    return legacy
+
+def convert(meta_dir, legacy):
+    converted = failed = 0
+    for name in legacy:
+        path = os.path.join(meta_dir, name)
+        try:
+            with open(path, "rb") as f:
+                work = json.loads(f.read())
+            write_metadata(meta_dir, name[:-len(JSON_SUFFIX)], work)  # also removes the .json
+            converted += 1
+        except Exception as e:
+            failed += 1
+            print(f"❌ {name}: {e}")
+    print(f"✅ Converted: {converted} — failed: {failed}")
+
+# === Postgres ===
+def db_report():
+    from core.clients import pg_connection
+
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'openalex_works' AND column_name = 'full_raw';
+        """)
+        col_type = cur.fetchone()[0]
+        cur.execute("""
+            SELECT COUNT(*), COALESCE(SUM(pg_column_size(full_raw)), 0),
+                   pg_total_relation_size('openalex_works')
+            FROM openalex_works;
+        """)
+        rows, col_bytes, table_bytes = cur.fetchone()
+
+        # Same shape as the concept/topic reports: touch a nested key in every row
+        t0 = time.perf_counter()
+        cur.execute("""
+            SELECT COUNT(*) FROM openalex_works
+            WHERE (full_raw)::jsonb->'primary_topic'->>'id' IS NOT NULL;
+        """)
+        cur.fetchone()
+        elapsed = time.perf_counter() - t0
+
+    print(f"🧠 openalex_works.full_raw ({col_type}): {rows} rows")
+    print(f"   • Column size (stored): {human_bytes(col_bytes)}")
+    print(f"   • Table total (incl. TOAST + indexes): {human_bytes(table_bytes)}")
+    print(f"   • primary_topic scan: {elapsed:.2f}s ({elapsed * 1e6 / max(rows, 1):.1f} µs/row)")
+
+def main():
+    ap = argparse.ArgumentParser(description="Compact staged metadata and report size/parse savings.")
+    ap.add_argument("--meta-dir", default=META_DIR)
+    ap.add_argument("--sample", type=int, default=SAMPLE_SIZE)
+    ap.add_argument("--execute", action="store_true", help="Rewrite legacy .json files as .json.zst")
+    ap.add_argument("--db", action="store_true", help="Report on openalex_works.full_raw instead")
+    args = ap.parse_args()
+
+    if args.db:
+        db_report()
+        return
+
+    legacy = staging_report(args.meta_dir, args.sample)
+    if args.execute and legacy:
+        convert(args.meta_dir, legacy)
+    elif legacy:
+        print("\n[WHATIF] No changes made. Use --execute to convert.")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
-import requests
 import argparse
 
+from core.clients import QDRANT_URL, http_session
+
 def count_distinct_work_ids(qdrant_url, collection, batch_size=1000):
     unique_ids = set()
     scroll_payload = {
@@ -13,8 +14,8 @@ def count_distinct_work_ids(qdrant_url, collection, batch_size=1000):
     while True:
         if next_page:
             scroll_payload["offset"] = next_page
-        r = requests.post(f"{qdrant_url}/collections/{collection}/points/scroll",
-                          json=scroll_payload, timeout=30)
+        r = http_session().post(f"{qdrant_url}/collections/{collection}/points/scroll",
+                                json=scroll_payload, timeout=30)
         r.raise_for_status()
         data = r.json()["result"]
 
@@ -31,7 +32,7 @@ def count_distinct_work_ids(qdrant_url, collection, batch_size=1000):
 
 def main():
     parser = argparse.ArgumentParser(description="Count distinct PDFs (work_ids) in Qdrant collection.")
-    parser.add_argument("--host", default="http://192.168.0.11:6333", help="Qdrant host:port")
+    parser.add_argument("--host", default=QDRANT_URL, help="Qdrant host:port")
     parser.add_argument("--collection", required=True, help="Collection name")
     parser.add_argument("--batch-size", type=int, default=1000, help="Scroll batch size")
     args = parser.parse_args()
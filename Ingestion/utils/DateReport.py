@@ -1,13 +1,5 @@
 #!/usr/bin/env python3
-import os
-import psycopg2
-
-PG = dict(
-    host=os.getenv("PG_HOST", "192.168.0.11"),
-    dbname=os.getenv("PG_DB", "raglab"),
-    user=os.getenv("PG_USER", "mike"),
-    password=os.getenv("PG_PASSWORD"),
-)
+from core.clients import pg_connection
 
 TABLE = "openalex_works"
 DATE_COL_CANDIDATES = ["publication_date", "published_date"]
@@ -20,10 +12,7 @@ def q(cur, sql):
     return cur.fetchall()
 
 def main():
-    if not PG["password"]:
-        raise RuntimeError("PG_PASSWORD not set")
-
-    with psycopg2.connect(**PG) as conn, conn.cursor() as cur:
+    with pg_connection() as conn, conn.cursor() as cur:
         # discover columns
         cur.execute("""
             SELECT column_name, data_type
@@ -1,48 +1,57 @@
 #!/usr/bin/env python3
-import psycopg2
-import os
-import sys
-
-PG_CONFIG = dict(
-    host="192.168.0.11",
-    dbname="raglab",
-    user="mike",
-    password=os.getenv("PG_PASSWORD"),
-)
-
-if not PG_CONFIG["password"]:
-    print("❌ PG_PASSWORD not set.")
-    sys.exit(1)
-
-def get_counts(conn):
+"""
+Delete one chunking profile's chunks, queue state and vectors so 09 and
+10 rebuild it from scratch. Other profiles (and the one retrieval reads,
+unless it is the one named) are untouched. The profile's Qdrant collection
+is recreated empty with the same vector size: rebuilt chunks get new IDs,
+so old points would never be overwritten. Drop the whole profile with
+utils/ChunkingProfiles.py drop instead if you won't rebuild it.
+
+  python utils/DeleteChunks.py --profile <id>
+"""
+
+import argparse
+
+from core.chunking_profiles import empty_collection, get_profile
+from core.clients import pg_connection
+
+def get_counts(conn, profile_id):
     with conn.cursor() as cur:
-        cur.execute("SELECT COUNT(*) FROM chunks;")
+        cur.execute("SELECT COUNT(*) FROM chunks WHERE profile_id = %s;", (profile_id,))
         chunk_count = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM openalex_works WHERE chunking_status != 'pending';")
-        non_pending = cur.fetchone()[0]
-    return chunk_count, non_pending
+        cur.execute("SELECT COUNT(*) FROM work_chunk_status WHERE profile_id = %s;", (profile_id,))
+        queued = cur.fetchone()[0]
+    return chunk_count, queued
 
 def main():
-    conn = psycopg2.connect(**PG_CONFIG)
-    chunk_count, non_pending = get_counts(conn)
+    ap = argparse.ArgumentParser(description="Delete one chunking profile's chunks for a rebuild.")
+    ap.add_argument("--profile", required=True, help="Chunking profile ID (utils/ChunkingProfiles.py list)")
+    args = ap.parse_args()
+
+    with pg_connection() as conn:
+        with conn.cursor() as cur:
+            profile = get_profile(cur, args.profile)
+        chunk_count, queued = get_counts(conn, profile.id)
 
-    print(f"📊 Current state:")
-    print(f"   • Chunks in table: {chunk_count}")
-    print(f"   • Papers with chunking_status != 'pending': {non_pending}")
+    print(f"📊 Current state of profile '{profile.id}'{' (ACTIVE — retrieval reads it)' if profile.active else ''}:")
+    print(f"   • Chunks: {chunk_count}")
+    print(f"   • Works with queue state: {queued}")
 
-    confirm = input("\n⚠️  This will DELETE all chunks and reset chunking_status to 'pending'.\n"
+    confirm = input(f"\n⚠️  This will DELETE the chunks, queue state and Qdrant vectors "
+                    f"('{profile.qdrant_collection}') of profile '{profile.id}'.\n"
                     "Type 'YES' to proceed: ")
     if confirm.strip().upper() != "YES":
         print("❌ Aborted.")
         return
 
-    with conn.cursor() as cur:
-        cur.execute("TRUNCATE TABLE chunks;")
-        cur.execute("UPDATE openalex_works SET chunking_status = 'pending';")
-    conn.commit()
-    conn.close()
+    # Qdrant is emptied inside the Postgres transaction: if it fails, the chunks stay
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM chunks WHERE profile_id = %s;", (profile.id,))
+        cur.execute("DELETE FROM work_chunk_status WHERE profile_id = %s;", (profile.id,))
+        if empty_collection(profile):
+            print(f"🗑️  Qdrant collection '{profile.qdrant_collection}' recreated empty.")
 
-    print("✅ All chunks deleted and chunking_status reset to 'pending'. Ready for re-chunking.")
+    print(f"✅ Profile '{profile.id}' emptied. Ready for re-chunking (09 --profile {profile.id}).")
 
 if __name__ == "__main__":
     main()
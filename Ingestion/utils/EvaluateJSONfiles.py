@@ -1,13 +1,8 @@
 #!/usr/bin/env python3
-import os
 import csv
 import argparse
-import psycopg2
 
-PG_HOST = os.getenv("PG_HOST", "192.168.0.11")
-PG_DB   = os.getenv("PG_DB", "raglab")
-PG_USER = os.getenv("PG_USER", "mike")
-PG_PASS = os.getenv("PG_PASSWORD")
+from core.clients import PG_HOST, PG_DB, PG_USER, PG_PASSWORD as PG_PASS, pg_connect
 
 # mode: "any" (uses concepts[] with score >= threshold; multi-label)
 #    or "primary" (uses primary_topic only; single label per work)
@@ -104,7 +99,7 @@ def main():
     if not args.password:
         raise RuntimeError("❌ PG_PASSWORD not set (env) or --password not provided.")
 
-    conn = psycopg2.connect(host=args.host, dbname=args.db, user=args.user, password=args.password)
+    conn = pg_connect(host=args.host, dbname=args.db, user=args.user, password=args.password)
     try:
         rows, cols = run_query(conn, args.mode, args.threshold)
 
@@ -1,8 +1,5 @@
 #!/usr/bin/env python3
-import requests
-
-QDRANT_URL = "http://192.168.0.11:6333"
-COLL = "openalex"
+from core.clients import QDRANT_URL, QDRANT_COLLECTION as COLL, http_session
 
 def get_vector_size():
     # If you already know the embed size, hardcode it (e.g., 768) and skip this probe.
@@ -12,10 +9,10 @@ def get_vector_size():
 base = f"{QDRANT_URL}/collections/{COLL}"
 
 # 1) Delete collection if exists
-r = requests.get(base, timeout=10)
+r = http_session().get(base, timeout=10)
 if r.status_code == 200:
     print(f"🗑️  Deleting existing collection '{COLL}'...")
-    rd = requests.delete(base, timeout=30)
+    rd = http_session().delete(base, timeout=30)
     rd.raise_for_status()
     print("✅ Deleted.")
 elif r.status_code != 404:
@@ -24,6 +21,6 @@ elif r.status_code != 404:
 # 2) Recreate collection
 vec_size = get_vector_size()
 print(f"🆕 Creating '{COLL}' with size={vec_size}, distance=Cosine...")
-rc = requests.put(base, json={"vectors": {"size": vec_size, "distance": "Cosine"}}, timeout=30)
+rc = http_session().put(base, json={"vectors": {"size": vec_size, "distance": "Cosine"}}, timeout=30)
 rc.raise_for_status()
 print("✅ Created fresh collection.")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Move legacy <short_id>.pdf objects in MinIO to content-addressed keys
+(sha256/<hex>.pdf) and point openalex_works.pdf_key at them.
+
+Works whose PDFs are byte-identical end up sharing one object; the legacy
+object is deleted once every row that referenced it has been re-pointed.
+Run 09 afterwards (duplicates are marked 'shared' in work_chunk_status).
+
+  python utils/RekeyPDFsByHash.py            # dry run
+  python utils/RekeyPDFsByHash.py --execute
+"""
+
+import sys
+import hashlib
+import argparse
+
+from core.clients import MINIO_BUCKET, pg_connect, s3_client
+from core.object_store import content_key, is_content_key, object_exists
+
+s3 = s3_client()
+
+def object_sha256(key):
+    h = hashlib.sha256()
+    body = s3.get_object(Bucket=MINIO_BUCKET, Key=key)["Body"]
+    for block in iter(lambda: body.read(1024 * 1024), b""):
+        h.update(block)
+    return h.hexdigest()
+
+def main():
+    ap = argparse.ArgumentParser(description="Rekey legacy PDF objects by SHA-256 content hash.")
+    ap.add_argument("--execute", action="store_true", help="Copy objects, update Postgres, delete legacy keys.")
+    ap.add_argument("--limit", type=int, default=None, help="Only rekey the first N legacy keys")
+    args = ap.parse_args()
+
+    conn = pg_connect()
+    cur = conn.cursor()
+    cur.execute("SELECT pdf_key, COUNT(*) FROM openalex_works WHERE pdf_key IS NOT NULL GROUP BY pdf_key;")
+    legacy = sorted(k for k, _ in cur.fetchall() if not is_content_key(k))
+    if args.limit:
+        legacy = legacy[:args.limit]
+    print(f"🔍 Legacy pdf_keys to rekey: {len(legacy)}")
+
+    rekeyed = merged = failed = 0
+    seen_hashes = set()
+    for key in legacy:
+        try:
+            sha = object_sha256(key)
+            new_key = content_key(sha)
+            exists = sha in seen_hashes or object_exists(s3, MINIO_BUCKET, new_key)
+            seen_hashes.add(sha)
+            if exists:
+                merged += 1
+            if not args.execute:
+                print(f"[WHATIF] {key} → {new_key}" + (" (duplicate)" if exists else ""))
+                rekeyed += 1
+                continue
+
+            if not exists:
+                s3.copy_object(Bucket=MINIO_BUCKET, Key=new_key,
+                               CopySource={"Bucket": MINIO_BUCKET, "Key": key})
+            cur.execute("UPDATE openalex_works SET pdf_key = %s WHERE pdf_key = %s;", (new_key, key))
+            conn.commit()
+            s3.delete_object(Bucket=MINIO_BUCKET, Key=key)
+            rekeyed += 1
+            print(f"✅ {key} → {new_key}" + (" (shared)" if exists else ""))
+        except Exception as e:
+            conn.rollback()
+            failed += 1
+            print(f"❌ {key}: {e}")
+
+    cur.close()
+    conn.close()
+    print(f"\n📊 Rekeyed: {rekeyed} — duplicates merged: {merged} — failed: {failed}")
+    if not args.execute:
+        print("[WHATIF] No changes made. Use --execute to rekey.")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
@@ -1,45 +1,23 @@
 #!/usr/bin/env python3
 import os
-import boto3
-import psycopg2
-import requests
 
-# === CONFIG ===
-PG_CONFIG = dict(
-    host="192.168.0.11",
-    dbname="raglab",
-    user="mike",
-    password=os.getenv("PG_PASSWORD"),
-)
-MINIO_ENDPOINT = "http://192.168.0.17:9000"
-MINIO_ACCESS_KEY = "admin"
-MINIO_SECRET_KEY = "adminsecret"
-MINIO_BUCKET = "papers"
-QDRANT_URL = "http://192.168.0.11:6333"
-QDRANT_COLLECTION = "openalex"
+from core.clients import (MINIO_BUCKET, QDRANT_URL, QDRANT_COLLECTION,
+                          pg_connection, s3_client, http_session)
 
 # === Helpers ===
-def pg_conn():
-    return psycopg2.connect(**PG_CONFIG)
 
 def fetch_pg_works():
-    with pg_conn() as conn, conn.cursor() as cur:
+    with pg_connection() as conn, conn.cursor() as cur:
         cur.execute("SELECT id FROM openalex_works;")
         return set(r[0] for r in cur.fetchall())
 
 def fetch_pg_chunks():
-    with pg_conn() as conn, conn.cursor() as cur:
+    with pg_connection() as conn, conn.cursor() as cur:
         cur.execute("SELECT DISTINCT work_id FROM chunks;")
         return set(r[0] for r in cur.fetchall())
 
 def fetch_minio_ids():
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=MINIO_ENDPOINT,
-        aws_access_key_id=MINIO_ACCESS_KEY,
-        aws_secret_access_key=MINIO_SECRET_KEY,
-    )
-    paginator = s3.get_paginator("list_objects_v2")
+    paginator = s3_client().get_paginator("list_objects_v2")
     ids = set()
     for page in paginator.paginate(Bucket=MINIO_BUCKET):
         for obj in page.get("Contents", []):
@@ -59,7 +37,7 @@ def fetch_qdrant_ids():
         }
         if offset:
             payload["offset"] = offset
-        r = requests.post(f"{QDRANT_URL}/collections/{QDRANT_COLLECTION}/points/scroll", json=payload)
+        r = http_session().post(f"{QDRANT_URL}/collections/{QDRANT_COLLECTION}/points/scroll", json=payload)
         r.raise_for_status()
         data = r.json().get("result", {})
         points = data.get("points", [])
@@ -7,7 +7,8 @@
 #
 # Notes:
 # - Requires: psql and (optionally) the pg_stat_statements extension
-# - Set CHUNKS_TABLE (default: chunks) and FETCH_LIMIT (default: 1000) for the EXPLAIN
+# - Set CHUNKS_TABLE (default: chunks), FETCH_LIMIT (default: 1000) and PROFILE_ID
+#   (default: the active chunking profile) for the EXPLAIN
 
 set -euo pipefail
 
@@ -18,6 +19,7 @@ PGDATABASE="${PGDATABASE:-raglab}"
 PGUSER="${PGUSER:-postgres}"
 FETCH_LIMIT="${FETCH_LIMIT:-1000}"
 CHUNKS_TABLE="${CHUNKS_TABLE:-chunks}"
+PROFILE_ID="${PROFILE_ID:-}"
 
 # ---- Flags ----
 while getopts ":h:p:d:U:" opt; do
@@ -97,14 +99,38 @@ else
 fi
 hr
 
-# 6) Chunk fetch query — EXPLAIN ANALYZE (adjust CHUNKS_TABLE/FETCH_LIMIT as needed)
-echo ">> EXPLAIN ANALYZE (BUFFERS) for chunk fetch"
+# 6) Embedding queue claim (Ingestion/core/embed_queue.py) — EXPLAIN ANALYZE of its SELECT
+#    (without FOR UPDATE, so the report takes no row locks). Expect an Index Scan on
+#    chunks_unembedded_idx with buffers that stay flat as the backlog shrinks.
+if [[ -n "$PROFILE_ID" ]]; then
+  PROFILE_SQL="'${PROFILE_ID}'"
+else
+  PROFILE_SQL="(SELECT id FROM chunking_profiles WHERE active)"
+fi
+echo ">> EXPLAIN ANALYZE (BUFFERS) for embedding queue claim"
 $PSQL -c "EXPLAIN (ANALYZE, BUFFERS, WAL, SUMMARY)
-          SELECT id, work_id, text
+          SELECT id
           FROM ${CHUNKS_TABLE}
-          WHERE embedded = FALSE
-          ORDER BY created_at
+          WHERE profile_id = ${PROFILE_SQL} AND NOT embedded
+            AND (embed_lease_expires IS NULL OR embed_lease_expires < now())
+          ORDER BY id
           LIMIT ${FETCH_LIMIT};"
+$PSQL -c "SELECT profile_id, COUNT(*) AS unembedded, COUNT(embed_lease_owner) AS leased
+          FROM ${CHUNKS_TABLE} WHERE NOT embedded GROUP BY profile_id;"
+hr
+
+# 7) Connections by client (Ingestion scripts tag themselves application_name=ingestion:<script>)
+echo ">> Connections by application_name / state"
+$PSQL -c "SELECT COALESCE(NULLIF(application_name,''),'(none)') AS application_name,
+                 state,
+                 COUNT(*) AS conns,
+                 MAX(now() - state_change)::interval(0) AS longest_in_state
+          FROM pg_stat_activity
+          WHERE datname = current_database() AND pid <> pg_backend_pid()
+          GROUP BY 1, 2
+          ORDER BY conns DESC;"
+$PSQL -Atqc "SELECT 'total ' || COUNT(*) || ' / max_connections ' || current_setting('max_connections')
+             FROM pg_stat_activity;"
 hr
 
 echo "Done."
@@ -15,7 +15,9 @@ class SearchRequest(BaseModel):
 @app.post("/search")
 def search(req: SearchRequest):
     # TODO: wire to Qdrant + Postgres using env vars:
-    # QDRANT_URL, PG_DSN, EMBED_ENDPOINT
+    # QDRANT_URL, QDRANT_COLLECTION, PG_DSN, EMBED_ENDPOINT
+    # QDRANT_COLLECTION is the active-profile alias; chunk text comes from
+    # chunks rows with profile_id = (SELECT id FROM chunking_profiles WHERE active)
     return {
         "query": req.query,
         "top_k": req.top_k,